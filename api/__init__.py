@@ -2,16 +2,27 @@ import os
 
 from flask import Flask
 from flask import request
-from flask_bcrypt import Bcrypt
 from flask_jwt import JWT
 from flask_sqlalchemy import SQLAlchemy
+from werkzeug.contrib.fixers import ProxyFix
 
+from api.admission import AdmissionControl
+from api.cache import ResponseCache, TTLCache
+from api.compression import compress_response
 from api.config import config_by_name
+from api.hashing import PooledBcrypt
+from api.instrumentation import SQLInstrumentation
+from api.revocation import RevocationList, decode_token
+from api.search import SearchIndex
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 db = SQLAlchemy()
-bcrypt = Bcrypt()
+bcrypt = PooledBcrypt()
 jwt = JWT()
+search = SearchIndex()
+response_cache = ResponseCache()
+instrumentation = SQLInstrumentation()
+admission = AdmissionControl()
 
 
 def add_cors_headers(response, ):
@@ -27,12 +38,28 @@ def add_cors_headers(response, ):
 def create_app(config_name):
     app = Flask(__name__)
     app.config.from_object(config_by_name[config_name])
+    if app.config.get('TRUSTED_PROXIES'):
+        # request.remote_addr is the client's address rather than the
+        # proxy's, so anonymous clients are rate limited separately
+        app.wsgi_app = ProxyFix(app.wsgi_app,
+                                num_proxies=app.config['TRUSTED_PROXIES'])
 
     db.init_app(app)
     bcrypt.init_app(app)
-    from api.models import User
+    from api.models import User, Bucketlist, BucketlistItem
     global jwt
     jwt = JWT(app, User.authenticate, User.identity)
+    app.extensions['identity_cache'] = TTLCache(
+        app.config.get('IDENTITY_CACHE_SIZE'),
+        app.config.get('IDENTITY_CACHE_TTL'))
+    app.extensions['revocation'] = RevocationList(
+        app.config.get('REVOCATION_SYNC_INTERVAL'),
+        app.config.get('REVOCATION_REBUILD_INTERVAL'),
+        app.config.get('REVOCATION_SYNC_OVERLAP'))
+    jwt.jwt_decode_handler(decode_token)
+    search.init_app(app, [Bucketlist, BucketlistItem])
+    response_cache.init_app(app)
+    admission.init_app(app)
 
     # Configure version1 blueprint urls
     from api.v1.main import main as main_blueprint
@@ -44,4 +71,9 @@ def create_app(config_name):
     from api.v1.bucketlists import bucketlists as bucketlists_blueprint
     app.register_blueprint(bucketlists_blueprint, url_prefix='/api/v1/bucketlists')
 
+    # Registered first so the compression is included in the request time,
+    # since after_request functions run in reverse order
+    instrumentation.init_app(app)
+    app.after_request(compress_response)
+
     return app
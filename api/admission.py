@@ -0,0 +1,165 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g, request
+from flask_jwt import JWTError, _default_jwt_decode_handler
+from jwt import InvalidTokenError
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# WSGI environ key of the requests whose admission was decided before they
+# reached the Flask app, by api.asgi.AsyncAPI: True when they were admitted,
+# or the RateLimited or Overloaded error to answer them with
+ADMISSION_KEY = 'api.admission'
+
+
+class RateLimited(TooManyRequests):
+    """
+    Raised when a client has used up its request budget
+    """
+    description = "Too many requests. Try again later"
+
+    def __init__(self, retry_after=1):
+        super(RateLimited, self).__init__()
+        self.retry_after = retry_after
+
+    def get_headers(self, environ=None):
+        headers = super(RateLimited, self).get_headers(environ)
+        return headers + [('Retry-After', str(self.retry_after))]
+
+
+class Overloaded(ServiceUnavailable):
+    """
+    Raised when MAX_CONCURRENT_REQUESTS requests are already being handled
+    """
+    description = "The server is too busy. Try again shortly"
+
+    def __init__(self, retry_after=1):
+        super(Overloaded, self).__init__()
+        self.retry_after = retry_after
+
+    def get_headers(self, environ=None):
+        headers = super(Overloaded, self).get_headers(environ)
+        return headers + [('Retry-After', str(self.retry_after))]
+
+
+class RateLimiter(object):
+    """
+    Token buckets of burst requests per key, refilled at rate requests per
+    second. The buckets of at most maxsize keys are kept, the least recently
+    used one is dropped first, which only gives its client a full bucket.
+    """
+    def __init__(self, rate, burst, maxsize=10000):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def acquire(self, key):
+        """
+        Take a request from the key's bucket
+        :return: 0 if the request is admitted, or the seconds until it
+        would be
+        :rtype: float
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class AdmissionControl(object):
+    """
+    Rate limits per user, with separate budgets for reads and writes, and a
+    cap on the requests each process handles at once.
+
+    Requests beyond RATE_LIMIT_READS or RATE_LIMIT_WRITES per second, after
+    a burst of RATE_LIMIT_READ_BURST or RATE_LIMIT_WRITE_BURST, are answered
+    with 429. Requests are counted against the user of a valid token, or
+    the client's address. Requests that find MAX_CONCURRENT_REQUESTS others
+    in progress wait up to ADMISSION_QUEUE_TIMEOUT seconds and are then
+    answered with 503, instead of waiting for a database connection. Both
+    carry a Retry-After header. A rate or cap of 0 disables it.
+
+    Under api.asgi.AsyncAPI, requests are admitted there instead, once for
+    the requests it answers and those it passes to the Flask app.
+    """
+    def init_app(self, app):
+        config = app.config
+        limiters = {}
+        for name, rate, burst in (
+                ('read', 'RATE_LIMIT_READS', 'RATE_LIMIT_READ_BURST'),
+                ('write', 'RATE_LIMIT_WRITES', 'RATE_LIMIT_WRITE_BURST')):
+            if config.get(rate):
+                limiters[name] = RateLimiter(
+                    config[rate], config.get(burst, 1),
+                    config.get('RATE_LIMIT_MAX_CLIENTS', 10000))
+        slots = config.get('MAX_CONCURRENT_REQUESTS')
+        app.extensions['admission'] = (
+            limiters, threading.BoundedSemaphore(slots) if slots else None)
+
+    @staticmethod
+    def client_key():
+        """
+        The user id of the request's token, or the client's address when it
+        has no valid token. Behind a proxy, the address is only the
+        client's when TRUSTED_PROXIES is set.
+        """
+        try:
+            token = current_app.extensions['jwt'].request_callback()
+            if token is not None:
+                return 'user', _default_jwt_decode_handler(token)['id']
+        except (JWTError, InvalidTokenError, KeyError):
+            pass
+        return 'address', request.remote_addr
+
+    @staticmethod
+    def rate_limit(key, method):
+        """
+        Count a request against the key's budget for the method
+        :raises RateLimited:
+        """
+        limiters, slots = current_app.extensions['admission']
+        limiter = limiters.get('read' if method in READ_METHODS else 'write')
+        if limiter is None:
+            return
+        wait = limiter.acquire(key)
+        if wait:
+            raise RateLimited(retry_after=int(math.ceil(wait)))
+
+    def admit(self):
+        admitted = request.environ.get(ADMISSION_KEY)
+        if isinstance(admitted, Exception):
+            raise admitted
+        if admitted:
+            return
+        limiters, slots = current_app.extensions['admission']
+        if limiters:
+            self.rate_limit(self.client_key(), request.method)
+        if slots is not None:
+            if not slots.acquire(
+                    timeout=current_app.config.get('ADMISSION_QUEUE_TIMEOUT')):
+                raise Overloaded()
+            g.admission_slot = slots
+
+    @staticmethod
+    def release(exception=None):
+        slots = g.pop('admission_slot', None)
+        if slots is not None:
+            slots.release()
@@ -0,0 +1,617 @@
+import asyncio
+import io
+import math
+import re
+import sys
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import json, url_for
+from flask_jwt import JWTError, _jwt_required, current_identity
+from flask_restful.representations.json import output_json
+from jwt import InvalidTokenError
+from sqlalchemy import and_, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine.url import make_url
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import quote_etag
+from werkzeug.urls import url_decode
+
+from api import admission, bcrypt
+from api.admission import ADMISSION_KEY, Overloaded, RateLimited
+from api.hashing import HashingBusy
+from api.message_formatter import ErrorFormatter
+from api.models import User, Bucketlist, BucketlistItem
+from api.pagination import Page, decode_cursor, encode_cursor
+
+err = ErrorFormatter()
+
+
+class AsyncDatabase(object):
+    """
+    Connections of an asyncio driver to the application's database, asyncpg
+    for PostgreSQL and aiosqlite for SQLite. Statements are SQLAlchemy Core
+    expressions on the models' tables, compiled for the driver, and rows are
+    returned as named tuples.
+    """
+    def __init__(self, url, pool_size=10):
+        self.url = make_url(url)
+        self.backend = self.url.get_backend_name()
+        self.pool_size = pool_size
+        if self.backend == 'postgresql':
+            self.dialect = postgresql.dialect(paramstyle='numeric')
+        elif self.backend == 'sqlite':
+            self.dialect = sqlite.dialect()
+        else:
+            raise ValueError("No asyncio driver for {}".format(self.backend))
+        self._pool = None
+        self._connecting = None
+        self._row_types = {}
+
+    async def connect(self):
+        if self._pool is not None:
+            return
+        if self._connecting is None:
+            self._connecting = asyncio.ensure_future(self._connect())
+        await self._connecting
+
+    async def _connect(self):
+        if self.backend == 'postgresql':
+            import asyncpg
+            url = make_url(str(self.url))
+            url.drivername = 'postgresql'
+            self._pool = await asyncpg.create_pool(
+                str(url), min_size=1, max_size=self.pool_size)
+        else:
+            import aiosqlite
+            pool = asyncio.Queue()
+            for _ in range(self.pool_size):
+                connection = await aiosqlite.connect(
+                    self.url.database or ':memory:')
+                pool.put_nowait(connection)
+            self._pool = pool
+
+    async def close(self):
+        if self._pool is None:
+            return
+        if self.backend == 'postgresql':
+            await self._pool.close()
+        else:
+            while not self._pool.empty():
+                await self._pool.get_nowait().close()
+        self._pool = self._connecting = None
+
+    def compile(self, statement):
+        """
+        Return the SQL of a statement in the driver's parameter style, and
+        its parameters in order
+        :rtype: tuple
+        """
+        compiled = statement.compile(dialect=self.dialect)
+        params = compiled.construct_params()
+        values = [params[name] for name in compiled.positiontup]
+        sql = str(compiled)
+        if self.backend == 'postgresql':
+            sql = re.sub(r'(?<!:):(\d+)', r'$\1', sql)
+        return sql, values
+
+    def row_type(self, names):
+        names = tuple(names)
+        row_type = self._row_types.get(names)
+        if row_type is None:
+            row_type = self._row_types[names] = namedtuple('Row', names)
+        return row_type
+
+    async def fetch(self, statement):
+        """
+        Execute a query
+        :return: The rows
+        :rtype: list
+        """
+        sql, values = self.compile(statement)
+        await self.connect()
+        if self.backend == 'postgresql':
+            async with self._pool.acquire() as connection:
+                records = await connection.fetch(sql, *values)
+            if not records:
+                return []
+            row_type = self.row_type(records[0].keys())
+            return [row_type(*record) for record in records]
+        connection = await self._pool.get()
+        try:
+            async with connection.execute(sql, values) as cursor:
+                rows = await cursor.fetchall()
+                names = [column[0] for column in cursor.description]
+        finally:
+            self._pool.put_nowait(connection)
+        row_type = self.row_type(names)
+        return [row_type(*row) for row in rows]
+
+    async def fetchrow(self, statement):
+        rows = await self.fetch(statement)
+        return rows[0] if rows else None
+
+    async def fetchval(self, statement):
+        row = await self.fetchrow(statement)
+        return row[0] if row else None
+
+
+def build_environ(scope, body):
+    """
+    Build the WSGI environ of an ASGI HTTP request
+    :param scope: ASGI connection scope
+    :type scope: dict
+    :param body: Request body
+    :type body: bytes
+    :rtype: dict
+    """
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = \
+            scope['client'][0], str(scope['client'][1])
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = name
+        else:
+            key = 'HTTP_' + name
+        if key in environ and key.startswith('HTTP_'):
+            value = environ[key] + ',' + value
+        environ[key] = value
+    return environ
+
+
+async def read_body(receive):
+    body = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        body.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    return b''.join(body)
+
+
+class AsyncAPI(object):
+    """
+    ASGI application serving the bucketlist API under the same routes as the
+    Flask application.
+
+    Listing bucketlists and their items, fetching an item and logging in are
+    answered here, awaiting an asyncio database driver instead of holding a
+    thread while the database works. Input is validated with the same
+    schemas, and output built with the same serializer, ETags, compression
+    and headers as the Flask views.
+
+    Every other request is passed to the Flask application in a pool of
+    threads: writes have to go through the models, whose session events keep
+    the counters, search indexes and caches up to date, and SQLAlchemy has
+    no asyncio session to run them in. So are the requests the Flask views
+    answer with an error, full text searches, the rare login that rehashes
+    a password and the requests refused by the admission control, so that
+    their responses stay identical.
+
+    The admission control of the Flask app's blueprints is applied here,
+    before either answers, so each request is rate limited once and holds
+    one of MAX_CONCURRENT_REQUESTS slots until its response is sent. Tokens
+    are verified in the threads, since the first token a process checks
+    has it read the revoked tokens from the database.
+    """
+    def __init__(self, app, database_url=None, threads=None):
+        self.app = app
+        config = app.config
+        self.database = AsyncDatabase(
+            database_url or config.get('SQLALCHEMY_DATABASE_URI'),
+            config.get('SQLALCHEMY_POOL_SIZE') or 10)
+        self.executor = ThreadPoolExecutor(
+            threads or config.get('SERVER_THREADS', 4))
+        self.handlers = {
+            ('bucketlists.bucketlists', 'GET'): self.bucketlists,
+            ('bucketlists.bucketlistdetails', 'GET'): self.bucketlist,
+            ('bucketlists.bucketlistitemdetails', 'GET'): self.bucketlist_item,
+            ('auth.login', 'POST'): self.login,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        environ = build_environ(scope, b'')
+        try:
+            endpoint, args = self.app.url_map.bind_to_environ(
+                environ).match()
+        except HTTPException:
+            endpoint, args = None, {}
+        handler = self.handlers.get((endpoint, scope['method']))
+        body = b''
+        if handler is None or scope['method'] == 'POST':
+            body = await read_body(receive)
+            environ = build_environ(scope, body)
+        slots = admitted = None
+        if self.admission_applies(endpoint):
+            try:
+                slots = await self.admit(environ)
+                admitted = True
+            except (RateLimited, Overloaded) as error:
+                # Answered by the Flask app, like its own refusals
+                handler, admitted = None, error
+        try:
+            response = None
+            if handler is not None:
+                response = await handler(environ, body, **args)
+            if response is None:
+                environ = build_environ(scope, body)
+                if admitted is not None:
+                    environ[ADMISSION_KEY] = admitted
+                response = await self.call_wsgi(environ)
+            await self.send_response(response, send)
+        finally:
+            if slots is not None:
+                slots.release()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.database.close()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def request_context(self, environ, identity=None):
+        """
+        Push a request context for the synchronous parts of a request. It
+        must be popped before the next await, since other requests run
+        between awaits on the same thread.
+        """
+        context = self.app.request_context(environ)
+        context.current_identity = identity
+        return context
+
+    def admission_applies(self, endpoint):
+        """
+        Whether the Flask app admits the requests to endpoint, as it does
+        those of the blueprints that registered AdmissionControl.admit
+        """
+        blueprint = (endpoint or '').rpartition('.')[0]
+        return admission.admit in self.app.before_request_funcs.get(
+            blueprint or None, ())
+
+    async def admit(self, environ):
+        """
+        Count the request against its client's rate limit, and wait up to
+        ADMISSION_QUEUE_TIMEOUT seconds for a free slot, without holding
+        the event loop
+        :return: The slots to release once the response is sent, or None
+        :raises RateLimited, Overloaded:
+        """
+        with self.request_context(environ):
+            limiters, slots = self.app.extensions['admission']
+            if limiters:
+                admission.rate_limit(admission.client_key(),
+                                     environ['REQUEST_METHOD'])
+        if slots is None:
+            return None
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + (
+            self.app.config.get('ADMISSION_QUEUE_TIMEOUT') or 0)
+        while not slots.acquire(blocking=False):
+            if loop.time() >= deadline:
+                raise Overloaded()
+            await asyncio.sleep(0.005)
+        return slots
+
+    def verify_token(self, environ):
+        with self.request_context(environ):
+            try:
+                _jwt_required(self.app.config['JWT_DEFAULT_REALM'])
+            except (JWTError, InvalidTokenError):
+                return None
+            return current_identity._get_current_object()
+
+    async def authenticate(self, environ):
+        """
+        Verify the JWT token of the request, in the threads since the first
+        check of a process reads the revoked tokens from the database
+        :return: The identity, or None when the Flask app must answer
+        :rtype: UserIdentity
+        """
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executor, self.verify_token, environ)
+
+    def respond(self, environ, identity, render):
+        """
+        Build the response in a request context, and apply the Flask app's
+        after request functions to it
+        :param render: Returns a Flask response, or the data, status and
+        headers of a JSON one
+        :rtype: flask.Response
+        """
+        with self.request_context(environ, identity):
+            response = render()
+            if isinstance(response, tuple):
+                # As flask_restful.Api.make_response does
+                response = output_json(*response)
+                response.headers['Content-Type'] = 'application/json'
+            return self.app.process_response(response)
+
+    async def paginate(self, table, criterion, key, page, limit, cursor):
+        """
+        Fetch a page of the rows of table matching criterion, like
+        api.pagination.paginate
+        :return: The page, or None for the arguments the Flask app answers
+        with an error
+        :rtype: api.pagination.Page
+        """
+        query = select([table]).where(criterion).order_by(key)
+        count = select([func.count()]).select_from(table).where(criterion)
+        if cursor is None:
+            if page < 1 or limit < 1:
+                return None
+            items = await self.database.fetch(
+                query.limit(limit).offset((page - 1) * limit))
+            if page == 1 and len(items) < limit:
+                total = len(items)
+            else:
+                total = await self.database.fetchval(count)
+            has_next = page < int(math.ceil(total / float(limit)))
+            result = Page(items, total, has_next, page > 1, page=page,
+                          prev_num=page - 1 if page > 1 else None)
+        else:
+            try:
+                last_id = decode_cursor(cursor)
+            except ValueError:
+                return None
+            limit = max(limit, 1)
+            items = await self.database.fetch(
+                query.where(key > last_id).limit(limit + 1))
+            has_next = len(items) > limit
+            items = items[:limit]
+            result = Page(items, None, has_next, True)
+        if has_next and items:
+            result.next_cursor = encode_cursor(items[-1].id)
+        return result
+
+    def page_args(self, environ):
+        args = url_decode(environ['QUERY_STRING'])
+        return (args.get('page', default=1, type=int),
+                min(args.get('limit', default=10, type=int),
+                    self.app.config['MAX_PAGE_LIMIT']),
+                args.get('cursor', default=None, type=str),
+                args.get('q', default='', type=str))
+
+    async def bucketlists(self, environ, body):
+        from api.v1.bucketlists.views import (LinkTemplates, make_etag,
+                                              not_modified, pagination_data,
+                                              serializer)
+        page, limit, cursor, q = self.page_args(environ)
+        # Searches, multi-gets and embedded items are answered by the Flask
+        # view
+        args = url_decode(environ['QUERY_STRING'])
+        if q or 'ids' in args or 'include' in args:
+            return None
+        identity = await self.authenticate(environ)
+        if identity is None:
+            return None
+        table = Bucketlist.__table__
+        bucketlists = await self.paginate(
+            table, table.c.user_id == identity.id, table.c.id, page, limit,
+            cursor)
+        if bucketlists is None:
+            return None
+
+        def render():
+            etag = make_etag(bucketlists.total, [
+                (row.id, row.version) for row in bucketlists.items])
+            response = not_modified(etag)
+            if response:
+                return response
+            links = LinkTemplates()
+            data = {"data": [[
+                serializer.bucketlist_row(row, links,
+                                          serializer.bucketlist_fields,
+                                          user=identity)
+                for row in bucketlists.items], {}]}
+            data.update(pagination_data(
+                bucketlists, url_for("bucketlists.bucketlists"), limit=limit,
+                q=q))
+            return data, 200, {'ETag': quote_etag(etag)}
+        return self.respond(environ, identity, render)
+
+    async def bucketlist(self, environ, body, id):
+        from api.v1.bucketlists.views import (LinkTemplates, make_etag,
+                                              not_modified, pagination_data,
+                                              serializer)
+        identity = await self.authenticate(environ)
+        if identity is None:
+            return None
+        table = Bucketlist.__table__
+        bucketlist = await self.database.fetchrow(
+            select([table]).where(table.c.id == id))
+        if bucketlist is None or bucketlist.user_id != identity.id:
+            return None
+        # The items are only fetched when the client's copy is out of date
+        with self.request_context(environ, identity):
+            etag = make_etag(bucketlist.id, bucketlist.version)
+            unchanged = not_modified(etag) is not None
+        if unchanged:
+            return self.respond(environ, identity,
+                                lambda: not_modified(etag))
+        page, limit, cursor, q = self.page_args(environ)
+        if q:
+            return None
+        items_table = BucketlistItem.__table__
+        items = await self.paginate(
+            items_table, items_table.c.bucketlist_id == id, items_table.c.id,
+            page, limit, cursor)
+        if items is None:
+            return None
+
+        def render():
+            links = LinkTemplates()
+            data = {'bucketlist': serializer.bucketlist_row(
+                bucketlist, links, serializer.bucketlist_fields,
+                user=identity)}
+            data['bucketlist']['items'] = [serializer.item_row(item, links)
+                                           for item in items.items]
+            data = {"data": data}
+            data.update(pagination_data(
+                items, url_for("bucketlists.bucketlistdetails", id=id),
+                limit=limit, q=q))
+            return data, 200, {'ETag': quote_etag(etag)}
+        return self.respond(environ, identity, render)
+
+    async def bucketlist_item(self, environ, body, id, item_id):
+        from api.v1.bucketlists.views import LinkTemplates, serializer
+        identity = await self.authenticate(environ)
+        if identity is None:
+            return None
+        bucketlists = Bucketlist.__table__
+        items = BucketlistItem.__table__
+        row = await self.database.fetchrow(
+            select([bucketlists.c.user_id] + list(items.c)).select_from(
+                bucketlists.outerjoin(items, and_(
+                    items.c.bucketlist_id == bucketlists.c.id,
+                    items.c.id == item_id))).where(bucketlists.c.id == id))
+        if row is None or row.user_id != identity.id or row.id is None:
+            return None
+        return self.respond(environ, identity, lambda: (
+            serializer.item_row(row, LinkTemplates()), 200))
+
+    async def login(self, environ, body):
+        from api.v1.auth.views import login_schema
+        try:
+            post_data = json.loads(body.decode())
+        except ValueError:
+            return None
+        if not isinstance(post_data, dict):
+            return None
+        with self.app.app_context():
+            user_data, error = login_schema.load(post_data)
+        if error:
+            return None
+        users = User.__table__
+        if 'email' in post_data:
+            column = users.c.email
+        elif 'username' in post_data:
+            column = users.c.username
+        else:
+            return None
+        user = await self.database.fetchrow(select([
+            users.c.id, users.c.username, users.c.email,
+            users.c._password.label('password_hash')]).where(
+            column == post_data[column.name]))
+        if user is None or bcrypt.needs_rehash(user.password_hash):
+            return None
+        try:
+            valid = await asyncio.get_event_loop().run_in_executor(
+                self.executor, bcrypt.check_password_hash,
+                user.password_hash, post_data['password'])
+        except HashingBusy:
+            return None
+        if not valid:
+            return self.respond(environ, None, lambda: (
+                err.format_general_errors(
+                    "Login failed. Invalid credentials")))
+        token = User(id=user.id, username=user.username,
+                     email=user.email).generate_auth_token(
+            self.app.config.get('SECRET_KEY'))
+        return self.respond(environ, None, lambda: ({"token": token}, 200))
+
+    async def call_wsgi(self, environ):
+        """
+        Run the Flask application in the thread pool. Streamed bodies are
+        passed on chunk by chunk, with at most a few chunks buffered.
+        :return: The status, headers and an async iterator of the body
+        :rtype: tuple
+        """
+        loop = asyncio.get_event_loop()
+        started = loop.create_future()
+        chunks = asyncio.Queue(maxsize=8)
+        done = object()
+
+        def start(result=None, error=None):
+            if started.done():
+                return
+            if error is not None:
+                started.set_exception(error)
+            else:
+                started.set_result(result)
+
+        def start_response(status, headers, exc_info=None):
+            loop.call_soon_threadsafe(start, (status, headers))
+
+        def run():
+            try:
+                iterable = self.app(environ, start_response)
+                try:
+                    for chunk in iterable:
+                        if chunk:
+                            asyncio.run_coroutine_threadsafe(
+                                chunks.put(chunk), loop).result()
+                finally:
+                    if hasattr(iterable, 'close'):
+                        iterable.close()
+            except Exception as error:
+                loop.call_soon_threadsafe(start, None, error)
+                raise
+            finally:
+                asyncio.run_coroutine_threadsafe(
+                    chunks.put(done), loop).result()
+
+        future = loop.run_in_executor(self.executor, run)
+        status, headers = await started
+
+        async def body():
+            while True:
+                chunk = await chunks.get()
+                if chunk is done:
+                    break
+                yield chunk
+            await future
+        return int(status.split(' ', 1)[0]), headers, body()
+
+    @staticmethod
+    async def send_response(response, send):
+        if isinstance(response, tuple):
+            status, headers, body = response
+        else:
+            status, headers = response.status_code, response.headers.items()
+
+            async def body():
+                for chunk in response.response:
+                    yield chunk
+            body = body()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode('latin-1'),
+                         value.encode('latin-1'))
+                        for name, value in headers],
+        })
+        async for chunk in body:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            await send({'type': 'http.response.body', 'body': chunk,
+                        'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
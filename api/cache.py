@@ -0,0 +1,155 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from werkzeug.utils import import_string
+
+
+class CacheBackend(object):
+    """
+    Interface of the stores behind ResponseCache. Implementations are
+    created with the maximum number of entries and their time to live, and
+    must be safe to use from several threads. shared is True when the
+    entries are seen by every process using the same backend.
+    """
+    shared = False
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class TTLCache(CacheBackend):
+    """
+    Thread safe in-process cache holding at most maxsize entries, each for at
+    most ttl seconds. The least recently used entry is evicted first.
+    """
+    def __init__(self, maxsize=1024, ttl=300):
+        super(TTLCache, self).__init__(maxsize, ttl)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ResponseCache(object):
+    """
+    Cache of response data per user, stored in the RESPONSE_CACHE_BACKEND
+    class and disabled when it is not set or RESPONSE_CACHE_SIZE is 0.
+
+    Every key includes a generation token of its user. Invalidating a user
+    replaces the token once the session commits, which makes all of their
+    entries unreachable at once, in every process sharing the backend. The
+    unreachable entries are evicted as the least recently used ones.
+    """
+    def __init__(self):
+        event.listen(Session, 'after_commit', self.write_invalidations)
+        event.listen(Session, 'after_rollback', self.discard_invalidations)
+
+    @staticmethod
+    def init_app(app):
+        backend = None
+        if (app.config.get('RESPONSE_CACHE_BACKEND') and
+                app.config.get('RESPONSE_CACHE_SIZE')):
+            backend = import_string(app.config['RESPONSE_CACHE_BACKEND'])(
+                app.config.get('RESPONSE_CACHE_SIZE'),
+                app.config.get('RESPONSE_CACHE_TTL', 60))
+        app.extensions['response_cache'] = backend
+
+    @staticmethod
+    def backend():
+        if not has_app_context():
+            return None
+        return current_app.extensions.get('response_cache')
+
+    def key(self, user_id, *parts):
+        """
+        Build the key of a response of the user. It must be built before
+        the data is read, so that data read before an invalidation cannot
+        be stored under the newer generation.
+        :param user_id: Id of the user the response belongs to
+        :type user_id: int
+        :param parts: Hashable values identifying the response
+        :return: The key, or None when caching is disabled
+        :rtype: tuple
+        """
+        backend = self.backend()
+        if backend is None:
+            return None
+        generation = backend.get(('generation', user_id))
+        if generation is None:
+            generation = uuid.uuid4().hex
+            backend.set(('generation', user_id), generation)
+        return (user_id, generation) + parts
+
+    def get(self, key):
+        if key is None:
+            return None
+        return self.backend().get(key)
+
+    def set(self, key, value):
+        if key is not None:
+            self.backend().set(key, value)
+
+    @staticmethod
+    def invalidate(session, user_id):
+        """
+        Drop the cached responses of the user once the session commits
+        """
+        session.info.setdefault('cache_invalidations', set()).add(user_id)
+
+    def write_invalidations(self, session):
+        user_ids = session.info.pop('cache_invalidations', None)
+        backend = self.backend()
+        if not user_ids or backend is None:
+            return
+        for user_id in user_ids:
+            backend.set(('generation', user_id), uuid.uuid4().hex)
+
+    @staticmethod
+    def discard_invalidations(session):
+        session.info.pop('cache_invalidations', None)
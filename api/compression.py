@@ -0,0 +1,66 @@
+import gzip
+import zlib
+
+from flask import current_app, request
+
+# Content codings the responses can be compressed with, most preferred first
+ENCODINGS = ('gzip', 'deflate')
+
+
+def compress(data, encoding, level):
+    """
+    Compress a response body
+    :param data: The body
+    :type data: bytes
+    :param encoding: gzip or deflate
+    :type encoding: str
+    :param level: Compression level, from 1 (fastest) to 9 (smallest)
+    :type level: int
+    :return: The compressed body
+    :rtype: bytes
+    """
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level)
+    return zlib.compress(data, level)
+
+
+def etag_variants(etag):
+    """
+    Return the ETags of the representations of a response: the identity one
+    and one per content coding, which compress_response sets
+    :param etag: ETag of the uncompressed response, unquoted
+    :type etag: str
+    :rtype: list
+    """
+    return [etag] + ['{}-{}'.format(etag, encoding) for encoding in ENCODINGS]
+
+
+def compress_response(response):
+    """
+    Compress the response with the best content coding the client accepts.
+    Skipped for bodies smaller than COMPRESS_MIN_SIZE, streamed and already
+    encoded bodies, 304 and 204 responses and other media types than
+    COMPRESS_MIMETYPES. A strong ETag gets the coding appended, so that
+    each representation has its own.
+    """
+    config = current_app.config
+    if response.status_code in (204, 304) or response.direct_passthrough \
+            or response.is_streamed \
+            or 'Content-Encoding' in response.headers \
+            or response.mimetype not in config.get('COMPRESS_MIMETYPES', ()):
+        return response
+    data = response.get_data()
+    if len(data) < config.get('COMPRESS_MIN_SIZE', 500):
+        return response
+    # The body depends on Accept-Encoding even when it is not compressed
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        return response
+    response.set_data(compress(data, encoding,
+                               config.get('COMPRESS_LEVEL', 6)))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag('{}-{}'.format(etag, encoding))
+    return response
@@ -9,16 +9,121 @@ class Config(object):
     DEBUG = False
     HOST = 'localhost'
     # PORT = 5000
+    # Password hashing work factor. Hashes made with another work factor are
+    # replaced when their user logs in.
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    # Processes hashing and checking passwords, how many more calls may wait
+    # for them, and for how many seconds, before answering 503
+    BCRYPT_POOL_SIZE = int(os.getenv('BCRYPT_POOL_SIZE', os.cpu_count()))
+    BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING',
+                                       4 * os.cpu_count()))
+    BCRYPT_QUEUE_TIMEOUT = 5
+    # Identities of recently seen users, so authenticating a request does
+    # not need a database query
+    IDENTITY_CACHE_SIZE = 10000
+    IDENTITY_CACHE_TTL = 300
+    # Revoked tokens are checked in memory. A thread of each process reads
+    # the revocations made by the others every REVOCATION_SYNC_INTERVAL
+    # seconds, and drops the expired ones every REVOCATION_REBUILD_INTERVAL
+    # seconds.
+    REVOCATION_SYNC_INTERVAL = int(os.getenv('REVOCATION_SYNC_INTERVAL', 30))
+    REVOCATION_REBUILD_INTERVAL = 3600
+    # Ids below the last one read that are read again by each sync, for the
+    # rows committed after rows with higher ids
+    REVOCATION_SYNC_OVERLAP = 1000
+    # Responses of the list endpoints, cached per user until one of their
+    # bucketlists changes. The backend must implement api.cache.CacheBackend
+    # and be shared by all the server processes, since each invalidates
+    # only the backend it uses. api.cache.TTLCache is kept in each process
+    # and only fits a single worker. Unset disables the cache.
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND')
+    RESPONSE_CACHE_SIZE = 10000
+    RESPONSE_CACHE_TTL = 60
+    # Responses of these media types and at least COMPRESS_MIN_SIZE bytes
+    # are compressed when the client accepts gzip or deflate, at
+    # COMPRESS_LEVEL from 1 (fastest) to 9 (smallest)
+    COMPRESS_MIMETYPES = ['application/json', 'text/html', 'text/plain']
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 500))
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+    # Requests per second allowed to each user, or each address without a
+    # valid token, after a burst of up to *_BURST requests. Reads are GET,
+    # HEAD and OPTIONS requests. 0 disables the limit.
+    RATE_LIMIT_READS = float(os.getenv('RATE_LIMIT_READS', 20))
+    RATE_LIMIT_READ_BURST = 100
+    RATE_LIMIT_WRITES = float(os.getenv('RATE_LIMIT_WRITES', 5))
+    RATE_LIMIT_WRITE_BURST = 20
+    RATE_LIMIT_MAX_CLIENTS = 100000
+    # Number of proxies in front of the application, such as Heroku's
+    # router, whose X-Forwarded-For entries are trusted for the client's
+    # address. 0 uses the address of the connection.
+    TRUSTED_PROXIES = int(os.getenv('TRUSTED_PROXIES', 0))
+    # Requests handled at once per process. The database pool holds 5
+    # connections plus 10 overflow ones, so further requests are answered
+    # with 503 after ADMISSION_QUEUE_TIMEOUT seconds instead of queueing
+    # for a connection.
+    MAX_CONCURRENT_REQUESTS = int(os.getenv('MAX_CONCURRENT_REQUESTS', 15))
+    ADMISSION_QUEUE_TIMEOUT = 0.1
+    # Largest page size of the list endpoints
+    MAX_PAGE_LIMIT = int(os.getenv('MAX_PAGE_LIMIT', 500))
+    # Most bucketlists fetched at once with GET /bucketlists/?ids=1,2,3
+    MULTI_GET_MAX_IDS = 100
+    # Rows per INSERT statement when adding many items at once
+    BULK_INSERT_CHUNK_SIZE = 500
+    # Bucketlists and items inserted per commit while importing
+    IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 5000))
+    # Rows fetched from the database at a time while exporting
+    EXPORT_BATCH_SIZE = 1000
+    # manage.py serve: worker processes and threads per worker. Threads let
+    # a worker overlap database waits, processes use every CPU.
+    SERVER_WORKERS = int(os.getenv('WEB_CONCURRENCY', os.cpu_count() + 1))
+    SERVER_THREADS = int(os.getenv('SERVER_THREADS',
+                                   min(2 * os.cpu_count(), 8)))
+    # Workers are replaced after SERVER_MAX_REQUESTS requests, plus up to
+    # SERVER_MAX_REQUESTS_JITTER more, and when a request takes longer than
+    # SERVER_TIMEOUT seconds. On shutdown, running requests are given
+    # SERVER_GRACEFUL_TIMEOUT seconds to finish.
+    SERVER_MAX_REQUESTS = int(os.getenv('SERVER_MAX_REQUESTS', 1000))
+    SERVER_MAX_REQUESTS_JITTER = 100
+    SERVER_TIMEOUT = 30
+    SERVER_GRACEFUL_TIMEOUT = 30
+    SERVER_KEEPALIVE = 2
+    # Serve api.asgi.AsyncAPI, which answers the list, item and login
+    # requests with an asyncio database driver, instead of the Flask app
+    SERVER_ASGI = os.getenv('SERVER_ASGI', '').lower() in ('1', 'true')
+    # Return the X-Query-Count and X-DB-Time (ms) headers
+    SQL_STATS_HEADERS = False
+    # Requests taking at least this many seconds are logged with their
+    # first SLOW_REQUEST_MAX_STATEMENTS statements to the api.slow_requests
+    # logger, and to the SLOW_REQUEST_LOG file when it is set
+    SLOW_REQUEST_THRESHOLD = float(os.getenv('SLOW_REQUEST_THRESHOLD', 0.5))
+    SLOW_REQUEST_MAX_STATEMENTS = 50
+    SLOW_REQUEST_LOG = os.getenv('SLOW_REQUEST_LOG')
+    # Directory of the full text search indexes. Writes only update it on
+    # the host that makes them, so every host must share it.
+    WHOOSH_BASE = os.getenv('WHOOSH_BASE', os.path.join(
+        os.path.dirname(basedir), 'whoosh_index'))
 
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    SQL_STATS_HEADERS = True
     SQLALCHEMY_DATABASE_URI = os.getenv(
         'DATABASE_URL', 'postgresql://localhost/bucketlist_dev')
 
 
 class TestingConfig(Config):
     TESTING = True
+    BCRYPT_LOG_ROUNDS = 4
+    BCRYPT_POOL_SIZE = 0
+    # Keep the search indexes in memory
+    WHOOSH_BASE = None
+    SLOW_REQUEST_THRESHOLD = None
+    RATE_LIMIT_READS = 0
+    RATE_LIMIT_WRITES = 0
+    # The views are tested against the database
+    RESPONSE_CACHE_BACKEND = None
+    # Revocations are read when the tests sync them
+    REVOCATION_SYNC_INTERVAL = 0
     SQLALCHEMY_DATABASE_URI = os.getenv(
         'DATABASE_URL', 'postgresql://localhost/bucketlist_test')
 
@@ -26,6 +131,7 @@ class TestingConfig(Config):
 class ProductionConfig(Config):
     DEBUG = False
     HOST = '0.0.0.0'
+    TRUSTED_PROXIES = int(os.getenv('TRUSTED_PROXIES', 1))
     SQLALCHEMY_DATABASE_URI = os.getenv(
         'DATABASE_URL', 'postgresql://localhost/bucketlist')
 
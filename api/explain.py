@@ -0,0 +1,150 @@
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy import event
+
+from api import db
+from api.models import User
+from api.pagination import encode_cursor
+
+
+@contextmanager
+def captured_queries(engine):
+    """
+    Record the SELECT statements executed on engine, with their parameters
+    :return: List the (statement, parameters) tuples are appended to
+    :rtype: list
+    """
+    queries = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            queries.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield queries
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+
+def explain(engine, statement, parameters):
+    """
+    Return the query plan of a statement, one line per step
+    :param engine: Engine the statement was executed on
+    :param statement: SQL as it was sent to the database driver
+    :type statement: str
+    :param parameters: Parameters it was sent with
+    :return: The plan
+    :rtype: list
+    """
+    if engine.dialect.name == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        prefix = 'EXPLAIN '
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+    finally:
+        connection.close()
+    # SQLite returns (id, parent, notused, detail) rows, PostgreSQL one
+    # column of text
+    return [str(row[-1]) for row in rows]
+
+
+def derived_tables(plan):
+    """
+    Names of the subqueries a SQLite query plan computes before reading
+    them, such as "numbered" for "CO-ROUTINE numbered"
+    :type plan: list
+    :rtype: set
+    """
+    return set(step.strip().split(' ', 1)[1] for step in plan
+               if step.strip().startswith(('CO-ROUTINE ', 'MATERIALIZE ')))
+
+
+def is_sequential_scan(step, derived=()):
+    """
+    Whether a step of a query plan reads every row of a table
+    :type step: str
+    :param derived: Names of the plan's subqueries, whose scans read their
+    results rather than a table
+    :rtype: bool
+    """
+    step = step.strip()
+    if 'Seq Scan on ' in step:
+        return True
+    # SQLite: "SCAN bucketlist" or "SCAN TABLE bucketlist", without an index
+    return step.startswith('SCAN ') and ' USING ' not in step \
+        and not step.startswith(('SCAN CONSTANT ROW', 'SCAN SUBQUERY',
+                                 'SCAN (')) \
+        and step[len('SCAN '):] not in derived
+
+
+def endpoint_requests(bucketlist, item):
+    """
+    The GET requests whose queries are explained, built around the user's
+    largest bucketlist and one of its items
+    :return: (name, url) tuples
+    :rtype: list
+    """
+    bucketlists = '/api/v1/bucketlists/'
+    details = '{}{}'.format(bucketlists, bucketlist.id)
+    requests = [
+        ('List bucketlists', bucketlists),
+        ('List bucketlists with their items',
+         '{}?include=items'.format(bucketlists)),
+        ('List bucketlists after a cursor',
+         '{}?cursor={}'.format(bucketlists, encode_cursor(bucketlist.id))),
+        ('Bucketlist details', details),
+        ('Bucketlists by id', '{}?ids={}'.format(bucketlists, bucketlist.id)),
+        ('Export bucketlists', bucketlists + 'export'),
+    ]
+    if item is not None:
+        requests.extend([
+            ('Bucketlist items after a cursor',
+             '{}?cursor={}'.format(details, encode_cursor(item.id))),
+            ('Bucketlist item', '{}/{}'.format(details, item.id)),
+        ])
+    return requests
+
+
+def explain_endpoints(user, bucketlist, item):
+    """
+    Run the GET endpoints for the user, and the login lookups, and explain
+    every query they make
+    :param user: User to make the requests as
+    :param bucketlist: One of the user's bucketlists, preferably large
+    :param item: One of the bucketlist's items, or None
+    :return: (name, statement, plan) tuples
+    :rtype: list
+    """
+    engine = db.engine
+    token = user.generate_auth_token(current_app.config.get('SECRET_KEY'))
+    headers = {'Authorization': 'JWT {}'.format(token)}
+    client = current_app.test_client()
+    captured = []
+    # The first sync reads the whole table, the later ones the new rows
+    revocation = current_app.extensions['revocation']
+    revocation.sync()
+    with captured_queries(engine) as queries:
+        revocation.sync()
+    captured.extend(('Sync revoked tokens', statement, parameters)
+                    for statement, parameters in queries)
+    for name, url in endpoint_requests(bucketlist, item):
+        with captured_queries(engine) as queries:
+            # The whole export is only read while its body is consumed
+            client.get(url, headers=headers).get_data()
+        captured.extend((name, statement, parameters)
+                        for statement, parameters in queries)
+    for name, method in (('Log in by email', 'email'),
+                         ('Log in by username', 'username')):
+        with captured_queries(engine) as queries:
+            User.query.filter_by(
+                **{method: getattr(user, method)}).first()
+        captured.extend((name, statement, parameters)
+                        for statement, parameters in queries)
+    return [(name, statement, explain(engine, statement, parameters))
+            for name, statement, parameters in captured]
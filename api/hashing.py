@@ -0,0 +1,118 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+from flask_bcrypt import Bcrypt
+from werkzeug.exceptions import ServiceUnavailable
+
+
+class HashingBusy(ServiceUnavailable):
+    """
+    Raised when every password hashing slot stays taken for longer than
+    BCRYPT_QUEUE_TIMEOUT
+    """
+    description = "Too many password checks in progress. Try again shortly"
+
+    def __init__(self, retry_after=1):
+        super(HashingBusy, self).__init__()
+        self.retry_after = retry_after
+
+    def get_headers(self, environ=None):
+        headers = super(HashingBusy, self).get_headers(environ)
+        return headers + [('Retry-After', str(self.retry_after))]
+
+
+def to_bytes(value):
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    return value
+
+
+def hash_password(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def check_password(password, pw_hash):
+    return bcrypt.checkpw(password, pw_hash)
+
+
+def hash_rounds(pw_hash):
+    """
+    Return the work factor a bcrypt hash was computed with
+    :param pw_hash: Hash such as $2b$12$...
+    :type pw_hash: str
+    :return: The log rounds, or None if the hash is not a bcrypt hash
+    :rtype: int
+    """
+    try:
+        return int(to_bytes(pw_hash).split(b'$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PooledBcrypt(Bcrypt):
+    """
+    Bcrypt extension that hashes and checks passwords in a pool of
+    BCRYPT_POOL_SIZE worker processes instead of the request thread, so a
+    burst of logins cannot occupy every request worker.
+
+    At most BCRYPT_POOL_SIZE + BCRYPT_MAX_PENDING calls are accepted at once.
+    Further calls wait up to BCRYPT_QUEUE_TIMEOUT seconds for a slot and then
+    raise HashingBusy, which is answered with 503 and a Retry-After header.
+    With a pool size of 0, passwords are hashed in the calling thread.
+    """
+    _pool_size = 0
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        super(PooledBcrypt, self).__init__(app)
+
+    def init_app(self, app):
+        super(PooledBcrypt, self).init_app(app)
+        self._pool_size = app.config.get('BCRYPT_POOL_SIZE', 0)
+        self._queue_timeout = app.config.get('BCRYPT_QUEUE_TIMEOUT', 5)
+        self._slots = threading.BoundedSemaphore(
+            max(self._pool_size + app.config.get('BCRYPT_MAX_PENDING', 0), 1))
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def executor(self):
+        # The pool is created lazily, and again in every forked server
+        # worker, since its processes and threads do not survive a fork
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(self._pool_size)
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, func, *args):
+        if not self._pool_size:
+            return func(*args)
+        if not self._slots.acquire(timeout=self._queue_timeout):
+            raise HashingBusy(retry_after=int(self._queue_timeout) or 1)
+        try:
+            return self.executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def generate_password_hash(self, password, rounds=None):
+        if not password:
+            raise ValueError('Password must be non-empty.')
+        if rounds is None:
+            rounds = self._log_rounds
+        return self.run(hash_password, to_bytes(password), rounds)
+
+    def check_password_hash(self, pw_hash, password):
+        return self.run(check_password, to_bytes(password), to_bytes(pw_hash))
+
+    def needs_rehash(self, pw_hash):
+        """
+        Check whether a hash was computed with a different work factor than
+        the configured BCRYPT_LOG_ROUNDS
+        """
+        return hash_rounds(pw_hash) != self._log_rounds
@@ -0,0 +1,124 @@
+import logging
+import time
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+slow_request_log = logging.getLogger('api.slow_requests')
+
+
+class RequestStats(object):
+    """
+    The SQL statements executed while handling a request and their durations.
+    Only the number of their parameters is kept, as they hold emails and
+    password hashes.
+    """
+    def __init__(self, max_statements=50):
+        self.start = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.slowest = None
+        self.max_statements = max_statements
+        self.statements = []
+
+    def record(self, statement, parameters, duration):
+        self.query_count += 1
+        self.db_time += duration
+        if self.slowest is None or duration > self.slowest[1]:
+            self.slowest = (statement, duration)
+        if len(self.statements) < self.max_statements:
+            self.statements.append(
+                (statement, len(parameters or ()), duration))
+
+
+class SQLInstrumentation(object):
+    """
+    Records the number of queries, the time spent in the database and the
+    slowest statement of every request.
+
+    With SQL_STATS_HEADERS set, they are returned in the X-Query-Count and
+    X-DB-Time headers. Requests taking SLOW_REQUEST_THRESHOLD seconds or
+    more are logged to the api.slow_requests logger with their statements,
+    and to the SLOW_REQUEST_LOG file when it is set. The queries of a
+    streamed body run after the response is returned and are not counted.
+    """
+    def __init__(self):
+        event.listen(Engine, 'before_cursor_execute', self.before_execute)
+        event.listen(Engine, 'after_cursor_execute', self.after_execute)
+
+    def init_app(self, app):
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        app.teardown_request(self.discard_request)
+        path = app.config.get('SLOW_REQUEST_LOG')
+        if path and not any(getattr(handler, 'baseFilename', None) == path
+                            for handler in slow_request_log.handlers):
+            handler = logging.FileHandler(path)
+            handler.setFormatter(logging.Formatter(
+                '%(asctime)s %(process)d %(message)s'))
+            slow_request_log.addHandler(handler)
+
+    @staticmethod
+    def stats():
+        """
+        The statistics of the current request, or None outside of requests
+        :rtype: RequestStats
+        """
+        if not has_app_context():
+            return None
+        return g.get('sql_stats')
+
+    @staticmethod
+    def before_execute(conn, cursor, statement, parameters, context,
+                       executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def after_execute(self, conn, cursor, statement, parameters, context,
+                      executemany):
+        duration = time.perf_counter() - conn.info['query_start'].pop()
+        stats = self.stats()
+        if stats is not None:
+            stats.record(statement, parameters, duration)
+
+    @staticmethod
+    def start_request():
+        g.sql_stats = RequestStats(
+            current_app.config.get('SLOW_REQUEST_MAX_STATEMENTS', 50))
+
+    def finish_request(self, response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        config = current_app.config
+        if config.get('SQL_STATS_HEADERS'):
+            response.headers['X-Query-Count'] = str(stats.query_count)
+            response.headers['X-DB-Time'] = '{:.3f}'.format(
+                stats.db_time * 1000)
+        threshold = config.get('SLOW_REQUEST_THRESHOLD')
+        duration = time.perf_counter() - stats.start
+        if threshold is not None and duration >= threshold:
+            self.log_slow_request(stats, duration, response)
+        return response
+
+    @staticmethod
+    def discard_request(exception=None):
+        # after_request is skipped when the request failed
+        g.pop('sql_stats', None)
+
+    @staticmethod
+    def log_slow_request(stats, duration, response):
+        lines = ["{} {} {} took {:.1f}ms, {} queries in {:.1f}ms".format(
+            request.method, request.full_path.rstrip('?'),
+            response.status_code, duration * 1000, stats.query_count,
+            stats.db_time * 1000)]
+        if stats.slowest is not None:
+            lines.append("Slowest query, {:.1f}ms: {}".format(
+                stats.slowest[1] * 1000, stats.slowest[0]))
+        for statement, parameter_count, query_duration in stats.statements:
+            lines.append("{:.1f}ms: {} ({} parameters)".format(
+                query_duration * 1000, statement, parameter_count))
+        if stats.query_count > len(stats.statements):
+            lines.append("{} more queries".format(
+                stats.query_count - len(stats.statements)))
+        slow_request_log.warning('\n'.join(lines))
@@ -0,0 +1,63 @@
+import codecs
+import json
+
+WHITESPACE = ' \t\r\n'
+
+
+def iter_records(stream, chunk_size=65536):
+    """
+    Parse the JSON values of a request body while it is read, either from
+    a JSON array or as newline delimited JSON, so that only the value being
+    parsed is held in memory
+    :param stream: File like object to read the UTF-8 body from
+    :param chunk_size: Number of bytes read at a time
+    :type chunk_size: int
+    :return: The parsed values, raise ValueError on malformed JSON
+    :rtype: generator
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer, pos, eof = '', 0, False
+    array = None
+    closed = False
+    count = 0
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in WHITESPACE:
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                break
+            data = stream.read(chunk_size)
+            eof = not data
+            buffer, pos = buffer[pos:] + utf8.decode(data, final=eof), 0
+            continue
+        char = buffer[pos]
+        if closed:
+            raise ValueError("Unexpected data after the end of the array")
+        if array is None:
+            array = char == '['
+            if array:
+                pos += 1
+                continue
+        if array and char in ',]':
+            closed = char == ']'
+            pos += 1
+            continue
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except ValueError as error:
+            if eof:
+                raise ValueError("Invalid JSON in record {}: {}".format(
+                    count, error))
+            # The value continues in the next chunk. Read at least as much as
+            # is buffered, so a long value is not parsed again too often.
+            data = stream.read(max(chunk_size, len(buffer) - pos))
+            eof = not data
+            buffer, pos = buffer[pos:] + utf8.decode(data, final=eof), 0
+            continue
+        pos = end
+        count += 1
+        yield value
+    if array and not closed:
+        raise ValueError("Unterminated array")
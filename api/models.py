@@ -1,22 +1,136 @@
+import time
+import uuid
+from collections import namedtuple
 from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import object_session
 from sqlalchemy.ext.hybrid import hybrid_property
 from validate_email import validate_email
 import jwt
-from api import db, bcrypt
+from api import db, bcrypt, search, response_cache
+
+
+# Seconds a JWT token is valid for
+TOKEN_EXPIRATION = 30000
+
+# Items inserted by BucketlistItem.create_bucketlist_items
+CreatedItem = namedtuple('CreatedItem', 'id bucketlist_id description')
+
+# Full size multi-row INSERT statements by table and columns, and their
+# compiled forms, so each is only compiled once
+bulk_insert_statements = {}
+bulk_insert_compiled = {}
+
+
+def bulk_insert(table, rows):
+    """
+    Insert rows with multi-row INSERT statements of BULK_INSERT_CHUNK_SIZE
+    rows each. Compiling a statement with hundreds of rows costs more than
+    executing it, so the values of full chunks are bound as parameters of a
+    statement that is compiled once and reused.
+    :param table: Table to insert into
+    :type table: sqlalchemy.Table
+    :param rows: Rows, as dicts with the same keys
+    :type rows: list
+    """
+    if not rows:
+        return
+    columns = tuple(sorted(rows[0]))
+    chunk_size = current_app.config.get('BULK_INSERT_CHUNK_SIZE', 500)
+    connection = db.session.connection().execution_options(
+        compiled_cache=bulk_insert_compiled)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        if len(chunk) < chunk_size:
+            connection.execute(table.insert().values(chunk))
+            continue
+        key = (table.name, columns, chunk_size)
+        statement = bulk_insert_statements.get(key)
+        if statement is None:
+            statement = table.insert().values([
+                dict((column, db.bindparam('{}_{}'.format(column, index),
+                                           type_=table.c[column].type))
+                     for column in columns)
+                for index in range(chunk_size)])
+            bulk_insert_statements[key] = statement
+        params = {}
+        for index, row in enumerate(chunk):
+            for column in columns:
+                params['{}_{}'.format(column, index)] = row[column]
+        connection.execute(statement, params)
 
 
 class UserToken(db.Model):
     """
-    JWT token model generated when a user logs in
+    Revocation of a user's JWT tokens: the token with the id jti, or, when
+    not_before is set, every token issued before then. Rows are loaded by
+    api.revocation.RevocationList, and are no longer needed after expires.
+    The row revoking the tokens of a deleted user outlives the user, so
+    user_id is not a foreign key.
     """
     id = db.Column(db.Integer, primary_key=True)
-    token = db.Column(db.String(300))
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False,
-                        unique=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    jti = db.Column(db.String(32), unique=True)
+    not_before = db.Column(db.DateTime)
+    expires = db.Column(db.DateTime)
 
     def __repr__(self):
         return "<User Token '{}': '{}'".format(
-            self.user, self.token)
+            self.user_id, self.jti or self.not_before)
+
+    @staticmethod
+    def revoke(user_id, jti=None, expires=None):
+        """
+        Revoke the token with the id jti, or all the user's tokens issued
+        until now when jti is None. A token revoked at the same time by
+        another request is left as it is.
+        :param user_id: Id of the user the tokens were issued to
+        :type user_id: int
+        :param jti: Id of the token
+        :type jti: str
+        :param expires: Expiry time of the token, as seconds since the epoch
+        :type expires: int
+        :return: The revocation
+        :rtype: UserToken
+        """
+        if jti is not None:
+            token = UserToken(user_id=user_id, jti=jti,
+                              expires=datetime.utcfromtimestamp(expires))
+        else:
+            # Replaces the user's earlier revocations, which it covers
+            UserToken.query.filter(UserToken.user_id == user_id, db.or_(
+                UserToken.not_before.isnot(None),
+                UserToken.expires <= datetime.utcnow())).delete(
+                synchronize_session=False)
+            token = UserToken(user_id=user_id, not_before=datetime.utcnow())
+        db.session.add(token)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            if jti is None:
+                raise
+        current_app.extensions['revocation'].add([token], synced=False)
+        return token
+
+
+class UserIdentity(object):
+    """
+    Identity of the user making a request, kept in the identity cache so
+    most requests do not load the user from the database
+    """
+    __slots__ = ('id', 'username', 'email', 'deleted')
+
+    def __init__(self, id, username, email, deleted=False):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.deleted = deleted
+
+    def __repr__(self):
+        return "<UserIdentity %r>" % self.username
 
 
 class User(db.Model):
@@ -27,7 +141,8 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True)
     email = db.Column(db.String(120), unique=True)
     _password = db.Column(db.String(), nullable=False)
-    bucketlists = db.relationship('Bucketlist', backref='user',
+    bucketlists = db.relationship('Bucketlist',
+                                  backref=db.backref('user', lazy='joined'),
                                   lazy='dynamic', cascade="all, delete-orphan")
 
     @hybrid_property
@@ -67,8 +182,10 @@ class User(db.Model):
             raise False
 
     def validate_user(self):
-        if self.username_exists(self.username) or self.email_exists(
-                self.email):
+        # Check both unique fields with a single query
+        existing = User.query.filter(db.or_(
+            User.username == self.username, User.email == self.email)).first()
+        if existing:
             return False
         else:
             return self
@@ -94,7 +211,7 @@ class User(db.Model):
             db.session.commit()
         return valid_user
 
-    def generate_auth_token(self, secret_key, expiration=30000):
+    def generate_auth_token(self, secret_key, expiration=TOKEN_EXPIRATION):
         """
         Generate the JWT token used to authenticate the user
         :param secret_key:
@@ -109,8 +226,12 @@ class User(db.Model):
             'email': self.email,
             'username': self.username,
             'exp': datetime.utcnow() + timedelta(seconds=expiration),
-            'iat': datetime.utcnow(),
-            'nbf': datetime.utcnow()
+            # With its fraction of a second, so tokens issued right after
+            # all the user's tokens were revoked are valid
+            'iat': time.time(),
+            'nbf': datetime.utcnow(),
+            # Identifies the token when it is revoked
+            'jti': uuid.uuid4().hex
         }, secret_key, algorithm='HS256')
         if token:
             return token.decode()
@@ -126,6 +247,10 @@ class User(db.Model):
             return "Internal Error. Invalid identification method"
         if user:
             if bcrypt.check_password_hash(user.password, password):
+                if bcrypt.needs_rehash(user.password):
+                    # The work factor changed since the hash was made
+                    user.password = password
+                    db.session.commit()
                 return user
             else:
                 return "Invalid credentials"
@@ -134,21 +259,51 @@ class User(db.Model):
 
     @staticmethod
     def identity(payload):
-        user_id = payload['id']
-        return User.query.filter_by(id=user_id).first()
+        """
+        Return the identity of the user the token was issued to, built from
+        the verified claims of the token without querying the database.
+        Identities are cached per user id, and replaced when this process
+        updates or deletes the user. The tokens of a deleted user are
+        revoked in every process by the revocation list, while other
+        processes only see a new username or email in the tokens issued
+        after the change.
+        :param payload: Verified claims of the JWT token
+        :type payload: dict
+        :return: The user's identity, or None if the user was deleted
+        :rtype: UserIdentity
+        """
+        cache = current_app.extensions['identity_cache']
+        identity = cache.get(payload['id'])
+        if identity is None:
+            identity = UserIdentity(payload['id'], payload['username'],
+                                    payload['email'])
+            cache.set(identity.id, identity)
+        if identity.deleted:
+            return None
+        return identity
 
     def __repr__(self):
         return "<User %r>" % self.username
 
 
 class Bucketlist(db.Model):
-    __searchable__ = ['description', 'items']
+    __searchable__ = ['description']
+    # Lists and pages of a user's bucketlists, in id order
+    __table_args__ = (db.Index('ix_bucketlist_user_id_id', 'user_id', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime, default=datetime.utcnow)
     description = db.Column(db.String(300), nullable=False)
     items = db.relationship('BucketlistItem', backref='bucketlist',
                             lazy='dynamic', cascade="all, delete-orphan")
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Denormalized counters, kept in sync by the BucketlistItem events below
+    item_count = db.Column(db.Integer, default=0, server_default='0',
+                           nullable=False)
+    done_count = db.Column(db.Integer, default=0, server_default='0',
+                           nullable=False)
+    # Bumped by every write to the bucketlist or its items, for ETags
+    version = db.Column(db.Integer, default=0, server_default='0',
+                        nullable=False)
 
     def __repr__(self):
         return "<Bucketlist '{}': '{}'>".format(self.description, self.user.id)
@@ -175,11 +330,142 @@ class Bucketlist(db.Model):
         return valid_bucketlist
 
     def delete_bucketlist(self):
+        # Remove the items with one statement rather than letting the ORM
+        # cascade load and delete them one by one
+        BucketlistItem.query.filter_by(bucketlist_id=self.id).delete(
+            synchronize_session='evaluate')
+        search.delete_by(db.session, BucketlistItem, 'bucketlist_id', self.id)
         db.session.delete(self)
         db.session.commit()
 
     def get_item_count(self):
-        return self.items.count()
+        return self.item_count
+
+    def get_done_count(self):
+        return self.done_count
+
+    @staticmethod
+    def update_counters(bucketlist_id, items=0, done=0):
+        """
+        Build the statement that shifts the counters of a bucketlist and
+        bumps its version
+        :param bucketlist_id: Id of the bucketlist to update
+        :type bucketlist_id: int
+        :param items: Amount to add to the item count
+        :type items: int
+        :param done: Amount to add to the done count
+        :type done: int
+        :return: The update statement
+        :rtype: sqlalchemy.sql.Update
+        """
+        table = Bucketlist.__table__
+        return table.update().where(table.c.id == bucketlist_id).values(
+            item_count=table.c.item_count + items,
+            done_count=table.c.done_count + done,
+            version=table.c.version + 1)
+
+    @staticmethod
+    def check_counters(repair=False):
+        """
+        Compare the stored counters against the actual item rows
+        :param repair: Overwrite the drifted counters with the actual values
+        :type repair: bool
+        :return: (id, item_count, actual items, done_count, actual done)
+        for every bucketlist whose counters have drifted
+        :rtype: list
+        """
+        actual = db.session.query(
+            BucketlistItem.bucketlist_id.label('bucketlist_id'),
+            db.func.count(BucketlistItem.id).label('item_count'),
+            db.func.sum(db.case([(BucketlistItem.done, 1)], else_=0)).label(
+                'done_count')).group_by(
+            BucketlistItem.bucketlist_id).subquery()
+        actual_items = db.func.coalesce(actual.c.item_count, 0)
+        actual_done = db.func.coalesce(actual.c.done_count, 0)
+        drifted = db.session.query(
+            Bucketlist.id, Bucketlist.item_count, actual_items,
+            Bucketlist.done_count, actual_done).outerjoin(
+            actual, actual.c.bucketlist_id == Bucketlist.id).filter(
+            db.or_(Bucketlist.item_count != actual_items,
+                   Bucketlist.done_count != actual_done)).order_by(
+            Bucketlist.id).all()
+        if repair and drifted:
+            for bucketlist_id, _, item_count, _, done_count in drifted:
+                Bucketlist.query.filter_by(id=bucketlist_id).update(
+                    {'item_count': item_count, 'done_count': done_count},
+                    synchronize_session=False)
+            db.session.commit()
+        return drifted
+
+    @staticmethod
+    def import_bucketlists(user_id, bucketlists):
+        """
+        Add bucketlists with their items, with their counters already set,
+        and commit once. The items are added with multi-row INSERT
+        statements.
+        :param user_id: Id of the user to add the bucketlists to
+        :type user_id: int
+        :param bucketlists: Validated (description, items) pairs, with items
+        as dicts with description and done
+        :type bucketlists: list
+        :return: Number of added bucketlists and items
+        :rtype: tuple
+        """
+        now = datetime.utcnow()
+        table = Bucketlist.__table__
+        ids = []
+        item_rows = []
+        for description, items in bucketlists:
+            done = [bool(item.get('done', False)) for item in items]
+            # One statement per bucketlist, for its generated id
+            bucketlist_id = db.session.execute(table.insert().values(
+                user_id=user_id, description=description, date=now,
+                item_count=len(items), done_count=sum(done),
+                version=0)).inserted_primary_key[0]
+            ids.append(bucketlist_id)
+            item_rows.extend({'bucketlist_id': bucketlist_id,
+                              'description': item['description'],
+                              'done': item_done,
+                              'date': now}
+                             for item, item_done in zip(items, done))
+        bulk_insert(BucketlistItem.__table__, item_rows)
+        if ids:
+            search.add(db.session, Bucketlist, db.session.query(
+                Bucketlist.id, Bucketlist.user_id,
+                Bucketlist.description).filter(Bucketlist.id.in_(ids)))
+        if item_rows:
+            search.add(db.session, BucketlistItem, db.session.query(
+                BucketlistItem.id, BucketlistItem.bucketlist_id,
+                BucketlistItem.description).filter(
+                BucketlistItem.bucketlist_id.in_(ids)))
+        response_cache.invalidate(db.session, user_id)
+        db.session.commit()
+        return len(ids), len(item_rows)
+
+    @staticmethod
+    def export_rows(user_id, batch_size=1000):
+        """
+        Query every bucketlist of a user joined with its items, fetched
+        batch_size rows at a time, as plain column rows rather than objects.
+        The rows of a bucketlist are consecutive, and bucketlists without
+        items have a single row whose item columns are None.
+        :param user_id: Id of the user whose bucketlists to export
+        :type user_id: int
+        :param batch_size: Number of rows fetched at a time
+        :type batch_size: int
+        :return: Rows of id, description, item_count, item_id,
+        item_description and item_done
+        :rtype: sqlalchemy.orm.Query
+        """
+        return db.session.query(
+            Bucketlist.id, Bucketlist.description, Bucketlist.item_count,
+            BucketlistItem.id.label('item_id'),
+            BucketlistItem.description.label('item_description'),
+            BucketlistItem.done.label('item_done')).outerjoin(
+            BucketlistItem,
+            BucketlistItem.bucketlist_id == Bucketlist.id).filter(
+            Bucketlist.user_id == user_id).order_by(
+            Bucketlist.id, BucketlistItem.id).yield_per(batch_size)
 
     @staticmethod
     def get_bucketlist(bucketlist_id):
@@ -187,9 +473,30 @@ class Bucketlist(db.Model):
             id=bucketlist_id).first()
         return bucketlist
 
+    @staticmethod
+    def get_bucketlist_rows(bucketlist_ids):
+        """
+        Query the bucketlists with the given ids, of any user, as plain
+        column rows
+        :param bucketlist_ids: Ids of the bucketlists
+        :type bucketlist_ids: list
+        :return: Rows of id, user_id, description, item_count and version
+        :rtype: list
+        """
+        if not bucketlist_ids:
+            return []
+        return db.session.query(
+            Bucketlist.id, Bucketlist.user_id, Bucketlist.description,
+            Bucketlist.item_count, Bucketlist.version).filter(
+            Bucketlist.id.in_(bucketlist_ids)).all()
+
 
 class BucketlistItem(db.Model):
     __searchable__ = ['description']
+    # Lists and pages of a bucketlist's items, in id order, and the lookups
+    # and counts by bucketlist
+    __table_args__ = (db.Index('ix_bucketlist_item_bucketlist_id_id',
+                               'bucketlist_id', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     done = db.Column(db.Boolean, default=False, nullable=False)
     date = db.Column(db.DateTime, default=datetime.utcnow)
@@ -229,8 +536,261 @@ class BucketlistItem(db.Model):
         db.session.delete(self)
         db.session.commit()
 
+    @staticmethod
+    def first_items(bucketlist_ids, limit):
+        """
+        Query the first limit items of each of the bucketlists, in id order,
+        with a single statement. The items are numbered per bucketlist with
+        ROW_NUMBER() OVER (PARTITION BY bucketlist_id ORDER BY id), and read
+        in that order from the bucketlist_id, id index.
+        :param bucketlist_ids: Ids of the bucketlists
+        :type bucketlist_ids: list
+        :param limit: Maximum number of items per bucketlist
+        :type limit: int
+        :return: Rows of id, bucketlist_id, description and done, by
+        bucketlist id
+        :rtype: dict
+        """
+        if not bucketlist_ids or limit < 1:
+            return {}
+        table = BucketlistItem.__table__
+        numbered = db.select([
+            table.c.id, table.c.bucketlist_id, table.c.description,
+            table.c.done, db.func.row_number().over(
+                partition_by=table.c.bucketlist_id,
+                order_by=table.c.id).label('position')]).where(
+            table.c.bucketlist_id.in_(bucketlist_ids)).alias('numbered')
+        rows = db.session.execute(db.select([
+            numbered.c.id, numbered.c.bucketlist_id, numbered.c.description,
+            numbered.c.done]).where(numbered.c.position <= limit).order_by(
+            numbered.c.bucketlist_id, numbered.c.id))
+        items = {}
+        for row in rows:
+            items.setdefault(row.bucketlist_id, []).append(row)
+        return items
+
+    @staticmethod
+    def create_bucketlist_items(bucketlist_id, items):
+        """
+        Add several items to a bucketlist with multi-row INSERT statements,
+        and a single commit
+        :param bucketlist_id: Id of the bucketlist to add the items to
+        :type bucketlist_id: int
+        :param items: Validated items, as dicts with description and done
+        :type items: list
+        :return: Ids of the created items
+        :rtype: list
+        """
+        now = datetime.utcnow()
+        rows = [{'bucketlist_id': bucketlist_id,
+                 'description': item['description'],
+                 'done': bool(item.get('done', False)),
+                 'date': now} for item in items]
+        if not rows:
+            return []
+        table = BucketlistItem.__table__
+        # Updating the counters first locks the bucketlist row, or the whole
+        # database on SQLite, until the commit, so concurrent batches for the
+        # bucketlist cannot insert between the reads below
+        db.session.execute(Bucketlist.update_counters(
+            bucketlist_id, items=len(rows),
+            done=sum(row['done'] for row in rows)))
+        invalidate_owner(db.session, bucketlist_id)
+        if db.engine.dialect.name == 'postgresql':
+            ids = []
+            chunk_size = current_app.config.get('BULK_INSERT_CHUNK_SIZE', 500)
+            for start in range(0, len(rows), chunk_size):
+                ids.extend(row.id for row in db.session.execute(
+                    table.insert().values(
+                        rows[start:start + chunk_size]).returning(
+                        table.c.id)))
+            created = [CreatedItem(item_id, bucketlist_id, row['description'])
+                       for item_id, row in zip(ids, rows)]
+        else:
+            last_id = db.session.query(
+                db.func.max(BucketlistItem.id)).filter(
+                BucketlistItem.bucketlist_id == bucketlist_id).scalar() or 0
+            bulk_insert(table, rows)
+            # The rows bypassed the ORM, so fetch them back for their ids
+            created = db.session.query(
+                BucketlistItem.id, BucketlistItem.bucketlist_id,
+                BucketlistItem.description).filter(
+                BucketlistItem.bucketlist_id == bucketlist_id,
+                BucketlistItem.id > last_id).order_by(BucketlistItem.id).all()
+        # Replaces any document a concurrent writer indexed for the same id
+        search.update(db.session, BucketlistItem, created)
+        db.session.commit()
+        return [row.id for row in created]
+
+    @staticmethod
+    def update_bucketlist_items(bucketlist_id, values, ids=None,
+                                criteria=None):
+        """
+        Change the fields of many items of a bucketlist with a single UPDATE
+        statement, and a single commit
+        :param bucketlist_id: Id of the bucketlist whose items to update
+        :type bucketlist_id: int
+        :param values: New values of the fields to change
+        :type values: dict
+        :param ids: Ids of the items to update
+        :type ids: list
+        :param criteria: Field values the items to update must have
+        :type criteria: dict
+        :return: Number of updated items
+        :rtype: int
+        """
+        query = BucketlistItem.query.filter(
+            BucketlistItem.bucketlist_id == bucketlist_id)
+        if ids is not None:
+            query = query.filter(BucketlistItem.id.in_(ids))
+        if criteria:
+            query = query.filter_by(**criteria)
+        changed = None
+        if 'description' in values:
+            # The rows may no longer match the criteria once updated, so
+            # find the ones to reindex beforehand
+            changed = [row.id for row in query.with_entities(
+                BucketlistItem.id)]
+            if not changed:
+                return 0
+            query = BucketlistItem.query.filter(
+                BucketlistItem.id.in_(changed))
+        count = query.update(values, synchronize_session=False)
+        if not count:
+            db.session.commit()
+            return count
+        # Query.update bypasses the item events, so bump the version and
+        # recount the done items here instead
+        table = Bucketlist.__table__
+        counters = {'version': table.c.version + 1}
+        if 'done' in values:
+            items = BucketlistItem.__table__
+            counters['done_count'] = db.select(
+                [db.func.count(items.c.id)]).where(db.and_(
+                    items.c.bucketlist_id == bucketlist_id,
+                    items.c.done == db.true())).as_scalar()
+        db.session.execute(table.update().where(
+            table.c.id == bucketlist_id).values(**counters))
+        invalidate_owner(db.session, bucketlist_id)
+        if changed:
+            search.update(db.session, BucketlistItem, db.session.query(
+                BucketlistItem.id, BucketlistItem.bucketlist_id,
+                BucketlistItem.description).filter(
+                BucketlistItem.id.in_(changed)))
+        db.session.commit()
+        return count
+
+    @staticmethod
+    def get_with_bucketlist(bucketlist_id, bucketlist_item_id):
+        """
+        Fetch a bucketlist and one of its items with a single statement
+        :param bucketlist_id: Id of the bucketlist
+        :type bucketlist_id: int
+        :param bucketlist_item_id: Id of the item
+        :type bucketlist_item_id: int
+        :return: The bucketlist and the item, which is None if the
+        bucketlist has no such item, or None if there is no such bucketlist
+        :rtype: tuple
+        """
+        return db.session.query(Bucketlist, BucketlistItem).outerjoin(
+            BucketlistItem, db.and_(
+                BucketlistItem.bucketlist_id == Bucketlist.id,
+                BucketlistItem.id == bucketlist_item_id)).filter(
+            Bucketlist.id == bucketlist_id).options(
+            db.lazyload(Bucketlist.user)).first()
+
     @staticmethod
     def get_bucketlist_item(bucketlist_item_id):
         bucketlist_item = BucketlistItem.query.filter_by(
             id=bucketlist_item_id).first()
         return bucketlist_item
+
+
+def invalidate_owner(session, bucketlist_id):
+    """
+    Drop the cached responses of the owner of a bucketlist once the session
+    commits. The owner is read from the session when the bucketlist is
+    loaded in it.
+    """
+    bucketlist = session.identity_map.get(
+        session.identity_key(Bucketlist, bucketlist_id))
+    if bucketlist is not None and 'user_id' in inspect(bucketlist).dict:
+        user_id = bucketlist.user_id
+    else:
+        table = Bucketlist.__table__
+        user_id = session.connection().scalar(db.select(
+            [table.c.user_id]).where(table.c.id == bucketlist_id))
+    response_cache.invalidate(session, user_id)
+
+
+@event.listens_for(Bucketlist, 'after_insert')
+@event.listens_for(Bucketlist, 'after_delete')
+def invalidate_bucketlist(mapper, connection, target):
+    response_cache.invalidate(object_session(target), target.user_id)
+
+
+@event.listens_for(Bucketlist, 'after_update')
+def invalidate_updated_bucketlist(mapper, connection, target):
+    session = object_session(target)
+    if session.is_modified(target, include_collections=False):
+        response_cache.invalidate(session, target.user_id)
+
+
+@event.listens_for(Bucketlist, 'before_update')
+def bump_version(mapper, connection, target):
+    if object_session(target).is_modified(target, include_collections=False):
+        # Incremented in SQL, as item writes may have bumped it already
+        target.version = Bucketlist.version + 1
+
+
+@event.listens_for(BucketlistItem, 'after_insert')
+def count_inserted_item(mapper, connection, target):
+    connection.execute(Bucketlist.update_counters(
+        target.bucketlist_id, items=1, done=int(bool(target.done))))
+    invalidate_owner(object_session(target), target.bucketlist_id)
+
+
+@event.listens_for(BucketlistItem, 'after_update')
+def count_updated_item(mapper, connection, target):
+    state = inspect(target)
+    done = state.attrs.done.history
+    if done.has_changes():
+        connection.execute(Bucketlist.update_counters(
+            target.bucketlist_id, done=1 if target.done else -1))
+    elif any(attr.history.has_changes() for attr in state.attrs):
+        connection.execute(Bucketlist.update_counters(target.bucketlist_id))
+    else:
+        return
+    invalidate_owner(object_session(target), target.bucketlist_id)
+
+
+@event.listens_for(BucketlistItem, 'after_delete')
+def count_deleted_item(mapper, connection, target):
+    connection.execute(Bucketlist.update_counters(
+        target.bucketlist_id, items=-1, done=-int(bool(target.done))))
+    invalidate_owner(object_session(target), target.bucketlist_id)
+
+
+@event.listens_for(User, 'after_update')
+def refresh_cached_identity(mapper, connection, target):
+    if has_app_context():
+        current_app.extensions['identity_cache'].set(
+            target.id, UserIdentity(target.id, target.username, target.email))
+    # The username is part of the bucketlist responses
+    response_cache.invalidate(object_session(target), target.id)
+
+
+@event.listens_for(User, 'after_delete')
+def remove_cached_identity(mapper, connection, target):
+    # Replaces the user's revocations with one of every token issued to
+    # them, kept until they have all expired
+    tokens = UserToken.__table__
+    now = datetime.utcnow()
+    connection.execute(tokens.delete().where(tokens.c.user_id == target.id))
+    connection.execute(tokens.insert().values(
+        user_id=target.id, not_before=now,
+        expires=now + timedelta(seconds=TOKEN_EXPIRATION)))
+    if has_app_context():
+        current_app.extensions['identity_cache'].set(
+            target.id, UserIdentity(target.id, target.username, target.email,
+                                    deleted=True))
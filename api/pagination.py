@@ -0,0 +1,96 @@
+import base64
+import json
+
+
+class Page(object):
+    """
+    A page of query results, fetched either by page number or by seeking
+    past the cursor of the previous page. The next page is linked by
+    next_cursor when it is set and by page number otherwise.
+    """
+    def __init__(self, items, total, has_next, has_prev, page=None,
+                 prev_num=None, next_cursor=None):
+        self.items = items
+        self.total = total
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.page = page
+        self.prev_num = prev_num
+        self.next_cursor = next_cursor
+
+    @property
+    def next_num(self):
+        if self.has_next and self.page:
+            return self.page + 1
+        return None
+
+
+def encode_cursor(last_id):
+    """
+    Build the opaque cursor pointing just after the row with id last_id
+    :param last_id: Id of the last row of the current page
+    :type last_id: int
+    :return: The url safe cursor
+    :rtype: str
+    """
+    data = json.dumps({'id': last_id}).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Return the id stored in a cursor, raise ValueError if it is invalid
+    :param cursor: Cursor from the request query string
+    :type cursor: str
+    :return: Id of the last row of the previous page
+    :rtype: int
+    """
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        data = json.loads(
+            base64.urlsafe_b64decode(cursor + padding).decode())
+        last_id = data['id']
+    except (TypeError, ValueError, KeyError):
+        raise ValueError("Invalid cursor '{}'".format(cursor))
+    if not isinstance(last_id, int):
+        raise ValueError("Invalid cursor '{}'".format(cursor))
+    return last_id
+
+
+def paginate(query, key, page=1, limit=10, cursor=None):
+    """
+    Paginate a query ordered by key. With a cursor, seek with
+    WHERE key > :last instead of using OFFSET, so that the cost of a page
+    does not depend on how deep it is. The rows are then not counted, and
+    the page's total is None.
+    :param query: Query to paginate
+    :type query: flask_sqlalchemy.BaseQuery
+    :param key: Unique column to order and seek by
+    :type key: sqlalchemy.Column
+    :param page: Page number, used when there is no cursor
+    :type page: int
+    :param limit: Maximum number of items per page
+    :type limit: int
+    :param cursor: Cursor of the previous page's last item
+    :type cursor: str
+    :return: The requested page
+    :rtype: Page
+    """
+    query = query.order_by(key)
+    if cursor is None:
+        pagination = query.paginate(page, limit, error_out=False)
+        items = pagination.items
+        has_next = pagination.has_next
+        result = Page(items, pagination.total, has_next,
+                      pagination.has_prev, page=pagination.page,
+                      prev_num=pagination.prev_num)
+    else:
+        last_id = decode_cursor(cursor)
+        limit = max(limit, 1)
+        items = query.filter(key > last_id).limit(limit + 1).all()
+        has_next = len(items) > limit
+        items = items[:limit]
+        result = Page(items, None, has_next, True)
+    if has_next and items:
+        result.next_cursor = encode_cursor(items[-1].id)
+    return result
@@ -0,0 +1,173 @@
+import calendar
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from flask_jwt import _default_jwt_decode_handler
+from jwt import InvalidTokenError
+from sqlalchemy import or_
+
+log = logging.getLogger(__name__)
+
+
+class TokenRevoked(InvalidTokenError):
+    pass
+
+
+def timestamp(value):
+    """
+    Seconds since the epoch of a naive UTC datetime, with its microseconds
+    :type value: datetime
+    :rtype: float
+    """
+    return calendar.timegm(value.utctimetuple()) + value.microsecond / 1e6
+
+
+class RevocationList(object):
+    """
+    Revoked token ids (jti) and per user "not before" times, loaded from
+    the user_token table so checking a token does not query it.
+
+    The table is read in full when the first token is checked, and then by
+    a thread every sync_interval seconds, only for the rows added since the
+    last read, and in full every rebuild_interval seconds to drop the
+    tokens that expired. Revocations made by this process apply at once,
+    those made by other processes within sync_interval seconds. With a
+    sync_interval of 0, the table is only read again by calling sync.
+
+    Ids are given out when a row is inserted, not when it is committed, so
+    a row may become visible after rows with higher ids were read. Each
+    read also takes the last sync_overlap ids that were read before, and a
+    row committed later than that is only read by the next rebuild.
+    """
+    def __init__(self, sync_interval=30, rebuild_interval=3600,
+                 sync_overlap=1000):
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.sync_overlap = sync_overlap
+        self._revoked = set()
+        self._not_before = {}
+        self._last_id = 0
+        self._rebuilt = None
+        self._started = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def is_revoked(self, payload):
+        """
+        :param payload: Verified claims of a JWT token
+        :type payload: dict
+        :rtype: bool
+        """
+        if self._started != os.getpid():
+            self.start()
+        if payload.get('jti') in self._revoked:
+            return True
+        not_before = self._not_before.get(payload.get('id'))
+        return not_before is not None and payload.get('iat', 0) < not_before
+
+    def start(self):
+        """
+        Read the table if it has not been read yet, and start the thread
+        syncing it, once per process since threads do not survive a fork
+        """
+        with self._lock:
+            if self._started == os.getpid():
+                return
+            if self._rebuilt is None:
+                self._sync()
+            if self.sync_interval:
+                threading.Thread(
+                    target=self.run, args=(current_app._get_current_object(),),
+                    name='revocation-sync', daemon=True).start()
+            self._started = os.getpid()
+
+    def run(self, app):
+        while not self._stopped.wait(self.sync_interval):
+            try:
+                with app.app_context():
+                    self.sync()
+            except Exception:
+                # Tokens are checked against the data read so far until the
+                # next sync succeeds
+                log.exception("Could not read the revoked tokens")
+
+    def stop(self):
+        """
+        Stop the thread syncing the table
+        """
+        self._stopped.set()
+
+    def sync(self):
+        """
+        Read the rows added to the user_token table since the last read,
+        and the last sync_overlap rows before them again, or the whole
+        table every rebuild_interval seconds
+        """
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        if (self._rebuilt is None or
+                time.monotonic() - self._rebuilt >= self.rebuild_interval):
+            self.rebuild()
+        else:
+            from api.models import UserToken
+            self.add(UserToken.query.filter(
+                UserToken.id > self._last_id - self.sync_overlap
+            ).order_by(UserToken.id))
+
+    def rebuild(self):
+        """
+        Load the revocations of the tokens that have not expired
+        """
+        from api.models import UserToken
+        rows = UserToken.query.filter(or_(
+            UserToken.expires.is_(None),
+            UserToken.expires > datetime.utcnow())).order_by(
+            UserToken.id).all()
+        not_before = {}
+        for row in rows:
+            if row.not_before is not None:
+                not_before[row.user_id] = max(
+                    not_before.get(row.user_id, 0), timestamp(row.not_before))
+        # Replaced at once, since other threads check tokens meanwhile
+        self._revoked = set(row.jti for row in rows if row.jti is not None)
+        self._not_before = not_before
+        self._last_id = max([row.id for row in rows] + [self._last_id])
+        self._rebuilt = time.monotonic()
+
+    def add(self, rows, synced=True):
+        """
+        Apply revocations, as UserToken rows
+        :param synced: Whether the rows were read from the table, rather than
+        just written by this process, which may not have read the rows
+        before them yet
+        """
+        for row in rows:
+            if row.jti is not None:
+                self._revoked.add(row.jti)
+            if row.not_before is not None:
+                self._not_before[row.user_id] = max(
+                    self._not_before.get(row.user_id, 0),
+                    timestamp(row.not_before))
+            if synced:
+                self._last_id = max(self._last_id, row.id)
+
+
+def decode_token(token):
+    """
+    Decode a JWT token, rejecting it when it has been revoked
+    :raises TokenRevoked:
+    :rtype: dict
+    """
+    payload = _default_jwt_decode_handler(token)
+    if current_app.extensions['revocation'].is_revoked(payload):
+        raise TokenRevoked('Token has been revoked')
+    return payload
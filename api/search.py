@@ -0,0 +1,241 @@
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from whoosh.analysis import RegexTokenizer, LowercaseFilter, StemmingAnalyzer
+from whoosh.fields import Schema, ID, TEXT
+from whoosh.filedb.filestore import FileStorage, RamStorage
+from whoosh.query import And, Or, Term, Prefix
+from whoosh.writing import AsyncWriter
+
+from api.pagination import Page
+
+# Splits a search string into the words that are matched as terms and
+# prefixes. The stems are produced by the indexed field's own analyzer.
+query_tokenizer = RegexTokenizer() | LowercaseFilter()
+
+
+class SearchIndex(object):
+    """
+    Whoosh full text index over the __searchable__ columns of the models
+    registered with it. Foreign key columns are indexed too, so that searches
+    can be restricted to a user's bucketlists or to a bucketlist's items.
+
+    Changes are collected whenever a session flushes and are written to the
+    index once its transaction commits, so rolled back changes are never
+    indexed. Only the index files of the committing process's host are
+    updated, so the app must run on a single host, or on hosts sharing
+    WHOOSH_BASE.
+    """
+    def __init__(self):
+        self.models = {}
+        event.listen(Session, 'after_flush', self.collect_changes)
+        event.listen(Session, 'after_commit', self.write_changes)
+        event.listen(Session, 'after_rollback', self.discard_changes)
+
+    def init_app(self, app, models):
+        """
+        Open, or create, the index of each model for the application. The
+        indexes are kept in memory when WHOOSH_BASE is not set.
+        """
+        base = app.config.get('WHOOSH_BASE')
+        if base:
+            storage = FileStorage(base).create()
+        else:
+            storage = RamStorage()
+        indexes = {}
+        for model in models:
+            self.models[model.__name__] = model
+            name = model.__name__
+            if storage.index_exists(name):
+                indexes[name] = storage.open_index(name)
+            else:
+                indexes[name] = storage.create_index(self.schema(model), name)
+        app.extensions['search'] = {'storage': storage, 'indexes': indexes}
+
+    @staticmethod
+    def schema(model):
+        fields = {'id': ID(stored=True, unique=True)}
+        for column in model.__table__.columns:
+            if column.name in model.__searchable__:
+                fields[column.name] = TEXT(
+                    analyzer=StemmingAnalyzer(minsize=1))
+            elif column.foreign_keys:
+                fields[column.name] = ID()
+        return Schema(**fields)
+
+    @staticmethod
+    def index_fields(model):
+        return [column.name for column in model.__table__.columns
+                if column.name in model.__searchable__ or column.foreign_keys]
+
+    def document(self, obj, model=None):
+        model = model or type(obj)
+        document = dict((name, str(getattr(obj, name)))
+                        for name in self.index_fields(model))
+        document['id'] = str(obj.id)
+        return document
+
+    def index(self, model):
+        return current_app.extensions['search']['indexes'][model.__name__]
+
+    def collect_changes(self, session, flush_context):
+        pending = session.info.setdefault('search_pending', [])
+        for obj in session.new:
+            if type(obj).__name__ in self.models:
+                pending.append(('add', type(obj), self.document(obj)))
+        for obj in session.dirty:
+            if type(obj).__name__ in self.models:
+                state = inspect(obj)
+                if any(state.attrs[name].history.has_changes()
+                       for name in self.index_fields(type(obj))):
+                    pending.append(('update', type(obj), self.document(obj)))
+        for obj in session.deleted:
+            if type(obj).__name__ in self.models:
+                pending.append(('delete', type(obj), 'id', str(obj.id)))
+
+    def add(self, session, model, rows):
+        """
+        Index new rows of model once the session commits. Used by writes
+        that bypass the ORM unit of work.
+        :param rows: Objects or result rows with the indexed columns
+        :type rows: list
+        """
+        pending = session.info.setdefault('search_pending', [])
+        for row in rows:
+            pending.append(('add', model, self.document(row, model)))
+
+    def update(self, session, model, rows):
+        """
+        Reindex changed rows of model once the session commits. Used by
+        writes that bypass the ORM unit of work.
+        :param rows: Objects or result rows with the indexed columns
+        :type rows: list
+        """
+        pending = session.info.setdefault('search_pending', [])
+        for row in rows:
+            pending.append(('update', model, self.document(row, model)))
+
+    def delete_by(self, session, model, field, value):
+        """
+        Remove the documents of model whose field matches value once the
+        session commits. Used by writes that bypass the ORM unit of work.
+        """
+        session.info.setdefault('search_pending', []).append(
+            ('delete', model, field, str(value)))
+
+    def write_changes(self, session):
+        pending = session.info.pop('search_pending', [])
+        if not pending or not has_app_context() or \
+                'search' not in current_app.extensions:
+            return
+        writers = {}
+        for change in pending:
+            model = change[1]
+            if model not in writers:
+                writers[model] = AsyncWriter(self.index(model))
+            if change[0] == 'add':
+                # New rows cannot have a document to replace yet
+                writers[model].add_document(**change[2])
+            elif change[0] == 'update':
+                writers[model].update_document(**change[2])
+            else:
+                writers[model].delete_by_term(change[2], change[3])
+        for writer in writers.values():
+            writer.commit()
+
+    @staticmethod
+    def discard_changes(session):
+        session.info.pop('search_pending', None)
+
+    def reindex(self, model, query, batch_size=1000):
+        """
+        Rebuild the index of model from scratch, from the rows of query
+        :return: Number of indexed rows
+        :rtype: int
+        """
+        storage = current_app.extensions['search']['storage']
+        index = storage.create_index(self.schema(model), model.__name__)
+        current_app.extensions['search']['indexes'][model.__name__] = index
+        count = 0
+        writer = index.writer()
+        for obj in query.yield_per(batch_size):
+            writer.add_document(**self.document(obj))
+            count += 1
+        writer.commit()
+        return count
+
+    def index_if_empty(self, model):
+        """
+        Build the index of model from the database when it has no documents,
+        as on a host that has not indexed the rows yet
+        :return: Number of indexed rows
+        :rtype: int
+        """
+        if self.index(model).doc_count():
+            return 0
+        return self.reindex(model, model.query.order_by(model.id))
+
+    def parse(self, model, q):
+        """
+        Build the query matching every word of q in the searchable fields of
+        model, either as a word with the same stem or as a word prefix
+        """
+        schema = self.index(model).schema
+        words = []
+        for token in query_tokenizer(q):
+            word = token.text
+            matches = []
+            for field in model.__searchable__:
+                if field not in schema:
+                    continue
+                stems = list(schema[field].process_text(word))
+                if not stems:
+                    # Stop words are not indexed
+                    continue
+                matches.extend(Term(field, stem) for stem in stems)
+                matches.append(Prefix(field, word))
+            if matches:
+                words.append(Or(matches))
+        return And(words) if words else None
+
+    def paginate(self, query, model, q, page=1, limit=10, **filters):
+        """
+        Return a page of the rows of query that match q, most relevant first
+        :param query: Query to fetch the matching rows with
+        :type query: flask_sqlalchemy.BaseQuery
+        :param model: Model whose index to search
+        :param q: Words to search for
+        :type q: str
+        :param page: Page number
+        :type page: int
+        :param limit: Maximum number of items per page
+        :type limit: int
+        :param filters: Indexed foreign key values the results must have
+        :return: The requested page
+        :rtype: api.pagination.Page
+        """
+        page = max(page, 1)
+        limit = max(limit, 1)
+        search_query = self.parse(model, q)
+        if search_query is None:
+            return Page([], 0, False, page > 1, page=page,
+                        prev_num=page - 1 or None)
+        restrict = None
+        if filters:
+            restrict = And([Term(field, str(value))
+                            for field, value in filters.items()])
+        with self.index(model).searcher() as searcher:
+            results = searcher.search_page(search_query, page, pagelen=limit,
+                                           filter=restrict)
+            ids = [int(hit['id']) for hit in results]
+            if page > results.pagecount:
+                ids = []
+            total = results.total
+            pagecount = results.pagecount
+        rows = {}
+        if ids:
+            rows = dict((row.id, row)
+                        for row in query.filter(model.id.in_(ids)))
+        items = [rows[row_id] for row_id in ids if row_id in rows]
+        return Page(items, total, page < pagecount, page > 1, page=page,
+                    prev_num=page - 1 or None)
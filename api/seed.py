@@ -0,0 +1,154 @@
+import csv
+import io
+import random
+import time
+from datetime import datetime
+
+from api import db, bcrypt
+from api.models import User, Bucketlist, BucketlistItem, bulk_insert
+
+
+def parse_range(value):
+    """
+    Parse a count such as "10", or a range such as "0-20" whose bounds are
+    both included
+    :type value: str
+    :return: The lowest and highest count
+    :rtype: tuple
+    """
+    low, _, high = str(value).partition('-')
+    low = int(low)
+    high = int(high) if high else low
+    if low < 0 or high < low:
+        raise ValueError("Invalid range: {}".format(value))
+    return low, high
+
+
+def insert_rows(table, rows):
+    """
+    Insert rows with the fastest bulk path of the database: COPY on
+    PostgreSQL, executemany on SQLite, which binds rows faster than it
+    parses multi-row INSERT statements, and bulk_insert otherwise
+    :param table: Table to insert into
+    :type table: sqlalchemy.Table
+    :param rows: Rows, as dicts with the same keys
+    :type rows: list
+    """
+    if not rows:
+        return
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        db.session.execute(table.insert(), rows)
+    elif dialect == 'postgresql':
+        columns = sorted(rows[0])
+        data = io.StringIO()
+        csv.writer(data).writerows([row[column] for column in columns]
+                                   for row in rows)
+        data.seek(0)
+        cursor = db.session.connection().connection.cursor()
+        cursor.copy_expert('COPY "{}" ({}) FROM STDIN WITH CSV'.format(
+            table.name, ', '.join('"{}"'.format(column)
+                                  for column in columns)), data)
+    else:
+        bulk_insert(table, rows)
+
+
+def next_id(model):
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+
+def reset_sequences(models):
+    """
+    Move the id sequences of the models past the ids inserted explicitly.
+    Only PostgreSQL needs it, SQLite continues from the highest id.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for model in models:
+        table = model.__tablename__
+        db.session.execute(
+            "SELECT setval(pg_get_serial_sequence('\"{0}\"', 'id'), "
+            "(SELECT max(id) FROM \"{0}\"))".format(table))
+
+
+def seed(users, bucketlists='0-10', items='0-20', done_ratio=0.3,
+         password='password', batch_size=1000, random_seed=None,
+         report=None):
+    """
+    Insert generated users, bucketlists and items in bulk, committing every
+    batch_size users. All the users share one password hash, computed once.
+    The search indexes are not updated, run manage.py reindex afterwards.
+    :param users: Number of users to create
+    :type users: int
+    :param bucketlists: Bucketlists per user, a count or an inclusive range
+    :type bucketlists: str
+    :param items: Items per bucketlist, a count or an inclusive range
+    :type items: str
+    :param done_ratio: Probability of an item being done
+    :type done_ratio: float
+    :param password: Password of every user
+    :type password: str
+    :param batch_size: Users inserted per transaction
+    :type batch_size: int
+    :param random_seed: Seed making the counts reproducible
+    :param report: Called with the row counts after every batch
+    :return: Numbers of users, bucketlists and items created
+    :rtype: tuple
+    """
+    bucketlist_range = parse_range(bucketlists)
+    item_range = parse_range(items)
+    rng = random.Random(random_seed)
+    pw_hash = bcrypt.generate_password_hash(password).decode()
+    now = datetime.utcnow()
+    user_id, bucketlist_id = next_id(User), next_id(Bucketlist)
+    counts = [0, 0, 0]
+
+    for start in range(0, users, batch_size):
+        user_rows, bucketlist_rows, item_rows = [], [], []
+        for _ in range(min(batch_size, users - start)):
+            user_rows.append({
+                'id': user_id, 'username': 'user{}'.format(user_id),
+                'email': 'user{}@example.com'.format(user_id),
+                '_password': pw_hash})
+            for _ in range(rng.randint(*bucketlist_range)):
+                item_count = rng.randint(*item_range)
+                done = [rng.random() < done_ratio for _ in range(item_count)]
+                bucketlist_rows.append({
+                    'id': bucketlist_id, 'date': now, 'user_id': user_id,
+                    'description': 'Bucketlist {}'.format(bucketlist_id),
+                    'item_count': item_count, 'done_count': sum(done),
+                    'version': 0})
+                item_rows.extend({
+                    'bucketlist_id': bucketlist_id, 'date': now,
+                    'description': 'Item {}'.format(index), 'done': is_done}
+                    for index, is_done in enumerate(done))
+                bucketlist_id += 1
+            user_id += 1
+        insert_rows(User.__table__, user_rows)
+        insert_rows(Bucketlist.__table__, bucketlist_rows)
+        insert_rows(BucketlistItem.__table__, item_rows)
+        db.session.commit()
+        counts[0] += len(user_rows)
+        counts[1] += len(bucketlist_rows)
+        counts[2] += len(item_rows)
+        if report is not None:
+            report(*counts)
+    reset_sequences([User, Bucketlist])
+    db.session.commit()
+    return tuple(counts)
+
+
+class RateReport(object):
+    """
+    Prints the rows inserted so far and the rate they were inserted at
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+
+    def rows_per_second(self, rows):
+        return rows / max(time.perf_counter() - self.start, 1e-9)
+
+    def __call__(self, users, bucketlists, items):
+        rows = users + bucketlists + items
+        print("{} users, {} bucketlists, {} items: {:.0f} rows/s".format(
+            users, bucketlists, items, self.rows_per_second(rows)))
@@ -0,0 +1,110 @@
+import os
+
+from flask_script import Command, Option
+from gunicorn.app.base import BaseApplication
+
+from api import db, search
+
+
+class WSGIServer(BaseApplication):
+    """
+    Gunicorn application serving an already created Flask application, or
+    its ASGI wrapper
+    """
+    def __init__(self, app, options):
+        self.application = app
+        self.options = options
+        super(WSGIServer, self).__init__()
+
+    def load_config(self):
+        for name, value in self.options.items():
+            self.cfg.set(name, value)
+
+    def load(self):
+        return self.application
+
+
+class Serve(Command):
+    """
+    Runs the application under gunicorn, a pre-forking WSGI server, or with
+    --asgi under uvicorn workers managed by gunicorn
+    """
+    def __init__(self, host='127.0.0.1', port=5000):
+        self.host = host
+        self.port = port
+
+    def get_options(self):
+        return (
+            Option('-h', '--host', dest='host', default=self.host),
+            Option('-p', '--port', dest='port', type=int,
+                   default=int(os.getenv('PORT', self.port))),
+            Option('-w', '--workers', dest='workers', type=int,
+                   help='worker processes (default: SERVER_WORKERS)'),
+            Option('-t', '--threads', dest='threads', type=int,
+                   help='threads per worker (default: SERVER_THREADS)'),
+            Option('--timeout', dest='timeout', type=int,
+                   help='seconds a request may take before its worker is '
+                        'restarted (default: SERVER_TIMEOUT)'),
+            Option('--asgi', dest='asgi', action='store_true',
+                   help='serve api.asgi.AsyncAPI with asyncio workers '
+                        '(default: SERVER_ASGI)'),
+        )
+
+    def __call__(self, app, host, port, workers, threads, timeout, asgi):
+        # The server must not run in a request context, since the workers
+        # are forked from this process
+        config = app.config
+        workers = workers or config.get('SERVER_WORKERS', 1)
+        cache = app.extensions.get('response_cache')
+        if workers > 1 and cache is not None and not cache.shared:
+            # A write would only invalidate the cache of its own worker
+            raise SystemExit(
+                "{} is kept in each process. Set RESPONSE_CACHE_BACKEND to a "
+                "shared backend, or serve with one worker".format(
+                    config['RESPONSE_CACHE_BACKEND']))
+        threads = threads or config.get('SERVER_THREADS', 1)
+        application, worker_class = app, 'sync'
+        if threads > 1:
+            worker_class = 'gthread'
+        if asgi or config.get('SERVER_ASGI'):
+            from api.asgi import AsyncAPI
+            # The threads run the requests AsyncAPI passes to the Flask app
+            application = AsyncAPI(app, threads=threads)
+            worker_class = 'uvicorn.workers.UvicornWorker'
+
+        # The index files are not deployed with the code, so a new host
+        # starts with empty indexes. They are built once, before forking.
+        with app.app_context():
+            for model in search.models.values():
+                search.index_if_empty(model)
+
+        def post_fork(server, worker):
+            # Pooled connections of the parent process must not be shared
+            # by the workers. Each worker opens its own. The engine may
+            # have been created with the current_app proxy, which needs a
+            # context in the worker.
+            with app.app_context():
+                db.get_engine(app).dispose()
+
+        max_requests = config.get('SERVER_MAX_REQUESTS', 0)
+        WSGIServer(application, {
+            'bind': '{}:{}'.format(host, port),
+            'workers': workers,
+            'threads': threads,
+            'worker_class': worker_class,
+            # Import the application once and fork it, instead of importing
+            # it again in every worker
+            'preload_app': True,
+            'post_fork': post_fork,
+            # Restart every worker after a random number of requests in this
+            # range, so leaks are bounded and workers do not all restart at
+            # once. Gunicorn would still apply the jitter to 0.
+            'max_requests': max_requests,
+            'max_requests_jitter': (
+                config.get('SERVER_MAX_REQUESTS_JITTER', 0)
+                if max_requests else 0),
+            'timeout': timeout or config.get('SERVER_TIMEOUT', 30),
+            'graceful_timeout': config.get('SERVER_GRACEFUL_TIMEOUT', 30),
+            'keepalive': config.get('SERVER_KEEPALIVE', 2),
+            'accesslog': '-',
+        }).run()
@@ -1,8 +1,10 @@
 from flask import Blueprint
 
-from api import add_cors_headers
+from api import add_cors_headers, admission
 
 auth = Blueprint('auth', __name__)
 auth.after_request(add_cors_headers)
+auth.before_request(admission.admit)
+auth.teardown_request(admission.release)
 # Import last to prevent Import Error
 from . import views
@@ -2,6 +2,7 @@ from flask import json
 from flask import request
 from flask_marshmallow import Marshmallow
 from flask import current_app as app
+from flask_jwt import jwt_required, current_identity
 from flask_restful import Api, Resource
 from marshmallow import ValidationError
 from marshmallow import fields
@@ -9,7 +10,7 @@ from marshmallow import pre_load
 from marshmallow import validates
 
 from api.message_formatter import ErrorFormatter
-from api.models import User
+from api.models import User, UserToken
 from . import auth
 
 
@@ -126,7 +127,6 @@ class Login(Resource):
         user_data, error = login_schema.load(post_data)
         if error:
             return err.format_field_errors(error)
-        print("No errors: ", user_data)
 
         if 'email' in post_data:
             user = User.authenticate(post_data['email'], post_data['password'])
@@ -146,5 +146,35 @@ class Login(Resource):
             return err.format_general_errors(
                 "Login failed. {}".format(user))
 
+
+class Logout(Resource):
+    """
+    Revoke the token the request is made with. Tokens issued before tokens
+    had ids can only be revoked with all the user's other tokens.
+    """
+    method_decorators = [jwt_required()]
+
+    @staticmethod
+    def post():
+        jwt = app.extensions['jwt']
+        payload = jwt.jwt_decode_callback(jwt.request_callback())
+        UserToken.revoke(current_identity.id, payload.get('jti'),
+                         payload['exp'])
+        return err.format_success_message("Successfully logged out", 200)
+
+
+class RevokeTokens(Resource):
+    """
+    Revoke all the tokens issued to the user so far
+    """
+    method_decorators = [jwt_required()]
+
+    @staticmethod
+    def post():
+        UserToken.revoke(current_identity.id)
+        return err.format_success_message("All tokens revoked", 200)
+
 api.add_resource(Register, '/register')
 api.add_resource(Login, '/login')
+api.add_resource(Logout, '/logout')
+api.add_resource(RevokeTokens, '/revoke')
@@ -1,8 +1,10 @@
 from flask import Blueprint
 
-from api import add_cors_headers
+from api import add_cors_headers, admission
 
 bucketlists = Blueprint('bucketlists', __name__)
 bucketlists.after_request(add_cors_headers)
+bucketlists.before_request(admission.admit)
+bucketlists.teardown_request(admission.release)
 # Import last to prevent Import Error
 from . import views
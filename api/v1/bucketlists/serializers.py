@@ -0,0 +1,128 @@
+from flask import url_for
+
+
+def dump_fields(schema):
+    """
+    Names of the fields a schema outputs, in the order it outputs them
+    :param schema: Schema instance
+    :type schema: marshmallow.Schema
+    :return: Field names
+    :rtype: list
+    """
+    return [name for name, field in schema.fields.items()
+            if not field.load_only]
+
+
+class LinkTemplates(object):
+    """
+    Prefixes of the _links of bucketlists and items, resolved with url_for
+    once instead of for every row
+    """
+    def __init__(self):
+        self.bucketlists = url_for('bucketlists.bucketlists')
+        # The schemas drop the last path segment of this url and append the
+        # bucketlist id, see BucketlistItemSchema.fix_bucket_item_link
+        self.items = '/'.join(url_for(
+            'bucketlists.bucketlists', id=0).split('/')[:-1]) + '/'
+
+
+class FastSerializer(object):
+    """
+    Produces the same output as dumping with BucketlistSchema,
+    BucketlistItemSchema and BucketlistDetailsSchema, key order included,
+    by building each row dict directly. The schemas remain the reference:
+    the field order is read from them, and they are still used to validate
+    input.
+    """
+    def __init__(self, bucketlist_schema, item_schema, details_schema):
+        self.bucketlist_fields = dump_fields(bucketlist_schema)
+        self.user_fields = dump_fields(bucketlist_schema.fields['user'].schema)
+        self.item_fields = dump_fields(item_schema)
+        self.details_fields = dump_fields(details_schema)
+
+    def bucketlist_row(self, bucketlist, links, fields, items=None,
+                       user=None):
+        user = user or bucketlist.user
+        values = {
+            'id': bucketlist.id,
+            'description': bucketlist.description,
+            'user': dict((name, getattr(user, name))
+                         for name in self.user_fields),
+            'item_count': bucketlist.item_count,
+            '_links': {
+                'self': links.bucketlists + str(bucketlist.id),
+                'collection': links.bucketlists
+            },
+            'items': items
+        }
+        return dict((name, values[name]) for name in fields)
+
+    def item_row(self, item, links):
+        collection = links.items + str(item.bucketlist_id)
+        values = {
+            'id': item.id,
+            'bucketlist_id': item.bucketlist_id,
+            'description': item.description,
+            'done': None if item.done is None else bool(item.done),
+            '_links': {
+                'self': collection + '/' + str(item.id),
+                'collection': collection
+            }
+        }
+        return dict((name, values[name]) for name in self.item_fields)
+
+    def bucketlist(self, bucketlist):
+        """
+        Serialize a bucketlist like bucketlist_schema.dump(bucketlist).data
+        """
+        return self.bucketlist_row(bucketlist, LinkTemplates(),
+                                   self.bucketlist_fields)
+
+    def bucketlists(self, bucketlists):
+        """
+        Serialize bucketlists like bucketlists_schema.dump(bucketlists).data
+        """
+        links = LinkTemplates()
+        fields = self.bucketlist_fields
+        return [self.bucketlist_row(bucketlist, links, fields)
+                for bucketlist in bucketlists]
+
+    def item(self, item):
+        """
+        Serialize an item like bucketlist_item_schema.dump(item).data
+        """
+        return self.item_row(item, LinkTemplates())
+
+    def items(self, items):
+        """
+        Serialize items like bucketlist_items_schema.dump(items).data
+        """
+        links = LinkTemplates()
+        return [self.item_row(item, links) for item in items]
+
+    def details(self, bucketlist, items):
+        """
+        Serialize a bucketlist and the given items like
+        bucketlist_details_schema.dump(bucketlist).data
+        :param items: The items of the bucketlist to include
+        :type items: list
+        """
+        return self.details_row(bucketlist, items, LinkTemplates())
+
+    def details_row(self, bucketlist, items, links, user=None):
+        """
+        Serialize a bucketlist and its items with already resolved links
+        :param bucketlist: Bucketlist, or a row with its id, description
+        and item_count
+        :param items: Items, or rows with their id, bucketlist_id,
+        description and done
+        :type items: list
+        :param links: Link templates of the current request
+        :type links: LinkTemplates
+        :param user: Owner of the bucketlist, when it is a row
+        :return: The serialized bucketlist
+        :rtype: dict
+        """
+        return self.bucketlist_row(
+            bucketlist, links, self.details_fields,
+            items=[self.item_row(item, links) for item in items], user=user)
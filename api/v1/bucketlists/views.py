@@ -1,15 +1,28 @@
+import hashlib
+import re
+from collections import namedtuple
+from urllib.parse import urlencode
+
+from flask import current_app
 from flask import json
 from flask import request
 from flask import url_for
+from flask import Response
+from flask import stream_with_context
 from flask_jwt import jwt_required, current_identity
 from flask_restful import Api, Resource, abort
 from flask_marshmallow import Marshmallow
 from marshmallow import (ValidationError, validates, fields, post_dump,
                          post_load)
-from sqlalchemy import literal
+from werkzeug.http import quote_etag
 
+from api import search, response_cache
+from api.compression import etag_variants
+from api.jsonstream import iter_records
 from api.message_formatter import ErrorFormatter
 from api.models import Bucketlist, BucketlistItem
+from api.pagination import paginate
+from api.v1.bucketlists.serializers import FastSerializer, LinkTemplates
 from api.v1.auth.views import UserSchema
 from . import bucketlists
 
@@ -26,29 +39,125 @@ def is_valid_json(data):
     return True
 
 
-def check_user_permission(user):
-    if user != current_identity:
+def check_user_permission(user_id):
+    if user_id != current_identity.id:
         abort(403, message="Forbidden. You may not view this data")
     return True
 
 
+def paginate_or_abort(query, key, page, limit, cursor):
+    try:
+        return paginate(query, key, page=page, limit=limit, cursor=cursor)
+    except ValueError as error:
+        abort(400, message=str(error))
+
+
+def search_or_paginate(query, model, page, limit, cursor, q, **filters):
+    """
+    Page through the rows of query that match q, or through all of them
+    when q is empty. Search results are paged by page number only.
+    :param filters: Indexed foreign key values the results must have
+    :rtype: api.pagination.Page
+    """
+    if not q:
+        return paginate_or_abort(query, model.id, page, limit, cursor)
+    if cursor:
+        abort(400, message="Search results cannot be paged with a cursor")
+    return search.paginate(query, model, q, page, limit, **filters)
+
+
+def pagination_data(page, url, **args):
+    """
+    Build the pagination fields of a list response. The next page link
+    carries a cursor when the page has one, the previous page link a page
+    number. Past either end, the links are "?page=None", as they have
+    always been. Pages fetched with a cursor have no total.
+    :param page: The page being returned
+    :type page: api.pagination.Page
+    :param url: Url of the list resource
+    :type url: str
+    :param args: Query string arguments to carry over to the page links
+    :type args: dict
+    :return: Pagination fields
+    :rtype: dict
+    """
+    args = dict((key, value) for key, value in args.items() if value)
+    next_page = previous_page = url + "?page=None"
+    if page.next_cursor:
+        next_page = url + "?" + urlencode(dict(args,
+                                               cursor=page.next_cursor))
+    elif page.next_num:
+        next_page = url + "?" + urlencode(dict(args, page=page.next_num))
+    if page.prev_num:
+        previous_page = url + "?" + urlencode(dict(args,
+                                                   page=page.prev_num))
+    return {"current_page": page.page,
+            "has_next": page.has_next,
+            "has_previous": page.has_prev,
+            "next_page": next_page,
+            "previous_page": previous_page,
+            "total": page.total
+            }
+
+
+def make_etag(*parts):
+    """
+    Build a strong ETag from the values a response is computed from. The
+    identity and the query string are always included.
+    :param parts: JSON serializable values, such as (id, version) pairs
+    :return: The ETag, unquoted
+    :rtype: str
+    """
+    parts += (current_identity.id, current_identity.username,
+              sorted(request.args.items(multi=True)))
+    return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+
+def not_modified(etag):
+    """
+    Return a 304 Not Modified response if the client already has etag
+    :param etag: ETag of the current representation
+    :type etag: str
+    :return: The response, or None if the representation must be sent
+    :rtype: flask.Response
+    """
+    for variant in etag_variants(etag):
+        # The client may hold a compressed representation
+        if request.if_none_match.contains(variant):
+            response = Response(status=304)
+            response.set_etag(variant)
+            return response
+    return None
+
+
 def abort_if_bucketlist_doesnt_exist(bucketlist_id):
     bucketlist = Bucketlist.get_bucketlist(bucketlist_id)
     if not bucketlist:
         abort(404, message="Bucketlist '{}' does not exist".format(
             bucketlist_id))
-    elif check_user_permission(bucketlist.user):
+    elif check_user_permission(bucketlist.user_id):
         return bucketlist
 
 
-def abort_if_bucketlist_item_doesnt_exist(bucketlist_item_id):
-    bucketlist_item = BucketlistItem.get_bucketlist_item(bucketlist_item_id)
+def abort_if_bucketlist_item_doesnt_exist(bucketlist_id,
+                                          bucketlist_item_id):
+    """
+    Resolve an item of a bucketlist of the current user, with one query
+    :return: The item
+    :rtype: BucketlistItem
+    """
+    found = BucketlistItem.get_with_bucketlist(bucketlist_id,
+                                               bucketlist_item_id)
+    if not found:
+        abort(404, message="Bucketlist '{}' does not exist".format(
+            bucketlist_id))
+    bucketlist, bucketlist_item = found
+    check_user_permission(bucketlist.user_id)
     if not bucketlist_item:
         abort(404, message="Bucketlist item '{}' does not exist".format(
             bucketlist_item_id
         ))
-    elif check_user_permission(bucketlist_item.bucketlist.user):
-        return bucketlist_item
+    return bucketlist_item
 
 
 class BucketlistSchema(ma.Schema):
@@ -73,7 +182,7 @@ class BucketlistSchema(ma.Schema):
 
     @post_load
     def make_bucketlist(self, data):
-        data['user'] = current_identity
+        data['user_id'] = current_identity.id
         return Bucketlist(**data)
 
     @validates('description')
@@ -111,7 +220,7 @@ class BucketlistItemSchema(ma.Schema):
         'self': ma.URLFor('bucketlists.bucketlists',
                           bucketlist_id='<bucketlist_id>', id='<id>'),
         'collection': ma.URLFor('bucketlists.bucketlists', id='<id>')
-    })
+    }, dump_only=True)
 
     @validates('description')
     def validate_description(self, description):
@@ -151,6 +260,176 @@ bucketlists_schema = BucketlistSchema(many=True)
 bucketlist_details_schema = BucketlistDetailsSchema()
 bucketlist_item_schema = BucketlistItemSchema()
 bucketlist_items_schema = BucketlistItemSchema(many=True)
+serializer = FastSerializer(bucketlist_schema, bucketlist_item_schema,
+                            bucketlist_details_schema)
+
+
+def editable_values(data):
+    """
+    Validate and deserialize the editable bucketlist item fields in data
+    :param data: Field values from the request
+    :type data: dict
+    :return: The deserialized values and the errors
+    :rtype: tuple
+    """
+    if not isinstance(data, dict):
+        return {}, ['Expected an object.']
+    fields = bucketlist_item_schema.editable_fields()
+    unknown = sorted(key for key in data if key not in fields)
+    if unknown:
+        return {}, ['Fields {} cannot be changed.'.format(', '.join(unknown))]
+    item, errors = bucketlist_item_schema.load(data, partial=True)
+    if errors:
+        return {}, errors
+    return dict((key, getattr(item, key)) for key in data), {}
+
+
+def load_bucketlist_items(data):
+    """
+    Validate an array of bucketlist items
+    :param data: Items from the request
+    :type data: list
+    :return: The valid items, as dicts with description and done, and the
+    errors of the invalid ones by their index
+    :rtype: tuple
+    """
+    # Validating does not build a BucketlistItem per item, unlike loading
+    errors = bucketlist_items_schema.validate(data)
+    done = bucketlist_item_schema.fields['done']
+    items = [{'description': item['description'],
+              'done': done.deserialize(item['done'])
+              if 'done' in item else False}
+             for index, item in enumerate(data) if index not in errors]
+    return items, errors
+
+
+def load_import_record(record):
+    """
+    Validate a bucketlist to import and its nested items, with the rules of
+    BucketlistSchema and BucketlistItemSchema
+    :param record: Bucketlist from the request
+    :type record: dict
+    :return: The description and valid items of the bucketlist, or None if
+    the bucketlist is invalid, and the errors
+    :rtype: tuple
+    """
+    if not isinstance(record, dict):
+        return None, {'_schema': ['Expected a bucketlist object.']}
+    errors = bucketlist_schema.validate(record)
+    if errors:
+        return None, errors
+    items = record.get('items', [])
+    if not isinstance(items, list):
+        return None, {'items': ['Expected an array of bucketlist items.']}
+    items, errors = load_bucketlist_items(items)
+    if errors:
+        errors = {'items': errors}
+    return (record['description'], items), errors
+
+
+ExportedItem = namedtuple('ExportedItem',
+                          'id bucketlist_id description done')
+
+
+def export_lines(rows, user):
+    """
+    Serialize the rows of Bucketlist.export_rows as newline delimited JSON,
+    one bucketlist and its items per line, as they are fetched
+    :param rows: Rows ordered by bucketlist
+    :type rows: sqlalchemy.orm.Query
+    :param user: Owner of the bucketlists
+    :return: The lines
+    :rtype: generator
+    """
+    links = LinkTemplates()
+    bucketlist = None
+    items = []
+    for row in rows:
+        if bucketlist is None or row.id != bucketlist.id:
+            if bucketlist is not None:
+                yield json.dumps(serializer.details_row(
+                    bucketlist, items, links, user=user),
+                    sort_keys=False) + '\n'
+            bucketlist = row
+            items = []
+        if row.item_id is not None:
+            items.append(ExportedItem(row.item_id, row.id,
+                                      row.item_description, row.item_done))
+    if bucketlist is not None:
+        yield json.dumps(serializer.details_row(
+            bucketlist, items, links, user=user), sort_keys=False) + '\n'
+
+
+def parse_ids(value):
+    """
+    Parse a comma separated list of bucketlist ids, or abort with 400
+    :param value: The ids, such as "1,2,3"
+    :type value: str
+    :return: The distinct ids, in the order given
+    :rtype: list
+    """
+    ids = []
+    for part in value.split(','):
+        # Not str.isdigit, which also accepts digits int() does not, like
+        # superscripts
+        if not re.match(r'^\s*[0-9]+\s*$', part):
+            abort(400, message="Invalid bucketlist id '{}'".format(part))
+        if int(part) not in ids:
+            ids.append(int(part))
+    max_ids = current_app.config.get('MULTI_GET_MAX_IDS')
+    if len(ids) > max_ids:
+        abort(400, message="At most {} bucketlists may be requested at "
+                           "once".format(max_ids))
+    return ids
+
+
+def items_limit_arg():
+    """
+    The number of items to include per bucketlist, from the items_limit
+    argument
+    :rtype: int
+    """
+    return min(request.args.get('items_limit', default=10, type=int),
+               current_app.config['MAX_PAGE_LIMIT'])
+
+
+def get_bucketlists_by_id(ids):
+    """
+    Get several bucketlists of the user with their first items_limit items,
+    in the layout of BucketlistDetailsSchema, with two queries whatever the
+    number of bucketlists. The ids that do not exist or belong to another
+    user are reported in errors, and the other bucketlists are returned.
+    :param ids: Comma separated bucketlist ids
+    :type ids: str
+    :return: The bucketlists, in the order of the ids, and the errors
+    :rtype: JSON
+    """
+    ids = parse_ids(ids)
+    items_limit = items_limit_arg()
+    rows = dict((row.id, row) for row in Bucketlist.get_bucketlist_rows(ids))
+    bucketlists, errors = [], {}
+    for bucketlist_id in ids:
+        row = rows.get(bucketlist_id)
+        if row is None:
+            errors[str(bucketlist_id)] = (
+                "Bucketlist '{}' does not exist".format(bucketlist_id))
+        elif row.user_id != current_identity.id:
+            errors[str(bucketlist_id)] = (
+                "Forbidden. You may not view this data")
+        else:
+            bucketlists.append(row)
+    etag = make_etag([(row.id, row.version) for row in bucketlists],
+                     sorted(errors))
+    response = not_modified(etag)
+    if response:
+        return response
+    items = BucketlistItem.first_items([row.id for row in bucketlists],
+                                       items_limit)
+    links = LinkTemplates()
+    data = {"data": [serializer.details_row(
+        row, items.get(row.id, []), links, user=current_identity)
+        for row in bucketlists], "errors": errors}
+    return data, 200, {'ETag': quote_etag(etag)}
 
 
 class Bucketlists(Resource):
@@ -159,30 +438,62 @@ class Bucketlists(Resource):
     @staticmethod
     def get():
         """
-        Get a list of bucketlists from the database
+        Get a list of bucketlists from the database, or the bucketlists
+        with the ids given in the ids argument. With include=items, each
+        bucketlist has its first items_limit items, in the layout of
+        BucketlistDetailsSchema.
         :return:
         :rtype:
         """
+        if 'ids' in request.args:
+            return get_bucketlists_by_id(request.args['ids'])
         page = request.args.get('page', default=1, type=int)
-        limit = request.args.get('limit', default=10, type=int)
-        page_base_url = url_for("bucketlists.bucketlists") + "?"
+        limit = min(request.args.get('limit', default=10, type=int),
+                    current_app.config['MAX_PAGE_LIMIT'])
+        cursor = request.args.get('cursor', default=None, type=str)
         q = request.args.get('q', default='', type=str)
-
-        bucket_lists = Bucketlist.query.filter_by(user=current_identity)
-        if q:
-            bucket_lists = bucket_lists.filter(Bucketlist.description.ilike(
-                "%" + literal(q) + "%"))
-        bucket_lists = bucket_lists.paginate(page, limit, error_out=False)
-        return {"data": bucketlists_schema.dump(bucket_lists.items),
-                "current_page": bucket_lists.page,
-                "has_next": bucket_lists.has_next,
-                "has_previous": bucket_lists.has_prev,
-                "next_page": page_base_url + "page=" +
-                str(bucket_lists.next_num),
-                "previous_page": page_base_url + "page=" +
-                str(bucket_lists.prev_num),
-                "total": bucket_lists.total
-                }
+        include = request.args.get('include', default='', type=str)
+        if include not in ('', 'items'):
+            abort(400, message="Unknown include '{}'".format(include))
+        items_limit = items_limit_arg() if include else None
+
+        cache_key = response_cache.key(current_identity.id, 'bucketlists',
+                                       page, cursor, limit, q, items_limit)
+        cached = response_cache.get(cache_key)
+        if cached:
+            data, etag = cached
+            return not_modified(etag) or (data, 200,
+                                          {'ETag': quote_etag(etag)})
+
+        bucket_lists = search_or_paginate(
+            Bucketlist.query.filter_by(user_id=current_identity.id),
+            Bucketlist, page, limit, cursor, q, user_id=current_identity.id)
+        etag = make_etag(bucket_lists.total, [
+            (bucketlist.id, bucketlist.version)
+            for bucketlist in bucket_lists.items])
+        response = not_modified(etag)
+        if response:
+            return response
+        if include:
+            # The items of the whole page, with one query
+            items = BucketlistItem.first_items(
+                [bucketlist.id for bucketlist in bucket_lists.items],
+                items_limit)
+            links = LinkTemplates()
+            rows = [serializer.details_row(bucketlist,
+                                           items.get(bucketlist.id, []),
+                                           links)
+                    for bucketlist in bucket_lists.items]
+        else:
+            rows = serializer.bucketlists(bucket_lists.items)
+        # Same layout as the (data, errors) pair that
+        # bucketlists_schema.dump returns
+        data = {"data": [rows, {}]}
+        data.update(pagination_data(
+            bucket_lists, url_for("bucketlists.bucketlists"), limit=limit,
+            q=q, include=include, items_limit=items_limit))
+        response_cache.set(cache_key, (data, etag))
+        return data, 200, {'ETag': quote_etag(etag)}
 
     @staticmethod
     def post():
@@ -205,6 +516,80 @@ class Bucketlists(Resource):
             "An error occurred while creating the bucketlist")
 
 
+class BucketlistsExport(Resource):
+    method_decorators = [jwt_required()]
+
+    @staticmethod
+    def get():
+        """
+        Stream every bucketlist of the user and its items, as newline
+        delimited JSON in the layout of BucketlistDetailsSchema. The rows are
+        fetched and serialized in batches, so the memory used does not
+        depend on the size of the account.
+        :return: The streamed bucketlists
+        :rtype: flask.Response
+        """
+        rows = Bucketlist.export_rows(
+            current_identity.id, current_app.config.get('EXPORT_BATCH_SIZE'))
+        return Response(stream_with_context(
+            export_lines(rows, current_identity)),
+            mimetype='application/x-ndjson')
+
+
+class BucketlistsImport(Resource):
+    method_decorators = [jwt_required()]
+
+    @staticmethod
+    def post():
+        """
+        Add bucketlists with their nested items, from a JSON array or newline
+        delimited JSON such as the export. The body is parsed as it is read,
+        and the bucketlists are inserted and committed in chunks of
+        IMPORT_CHUNK_SIZE rows. Invalid bucketlists and items are reported by
+        the index of their record and do not prevent the others from being
+        imported.
+        :return: Number of imported bucketlists and items, and the errors
+        :rtype: JSON
+        """
+        chunk_size = current_app.config.get('IMPORT_CHUNK_SIZE')
+        summary = {"bucketlists": 0, "items": 0, "chunks": 0}
+        errors = {}
+        chunk = []
+        rows = 0
+
+        def import_chunk():
+            bucketlists, items = Bucketlist.import_bucketlists(
+                current_identity.id, chunk)
+            summary['bucketlists'] += bucketlists
+            summary['items'] += items
+            summary['chunks'] += 1
+            current_app.logger.info(
+                "Imported %d bucketlists and %d items for user %d",
+                summary['bucketlists'], summary['items'],
+                current_identity.id)
+
+        try:
+            records = iter_records(request.stream)
+            for index, record in enumerate(records):
+                bucketlist, error = load_import_record(record)
+                if error:
+                    errors[index] = error
+                if bucketlist is None:
+                    continue
+                chunk.append(bucketlist)
+                rows += 1 + len(bucketlist[1])
+                if rows >= chunk_size:
+                    import_chunk()
+                    chunk, rows = [], 0
+        except ValueError as error:
+            summary['message'] = str(error)
+        if chunk:
+            import_chunk()
+        summary['field_errors'] = errors
+        status = 400 if 'message' in summary else 201
+        return summary, status
+
+
 class BucketlistDetails(Resource):
     method_decorators = [jwt_required()]
 
@@ -218,41 +603,30 @@ class BucketlistDetails(Resource):
         :rtype: JSON
         """
         bucketlist = abort_if_bucketlist_doesnt_exist(id)
+        # Every write to the items bumps the bucketlist version, so the
+        # items need not be loaded to tell whether they changed
+        etag = make_etag(bucketlist.id, bucketlist.version)
+        response = not_modified(etag)
+        if response:
+            return response
         page = request.args.get('page', default=1, type=int)
-        limit = request.args.get('limit', default=10, type=int)
+        limit = min(request.args.get('limit', default=10, type=int),
+                    current_app.config['MAX_PAGE_LIMIT'])
+        cursor = request.args.get('cursor', default=None, type=str)
         q = request.args.get('q', default='', type=str)
 
-        bucketlist_items = BucketlistItem.query.filter_by(
-            bucketlist_id=id)
-        if q:
-            bucketlist_items = bucketlist_items.filter(
-                BucketlistItem.description.ilike("%" + literal(q) + "%"))
-
-        bucketlist_items = bucketlist_items.paginate(page, limit,
-                                                     error_out=False)
-        page_base_url = url_for("bucketlists.bucketlists") + str(id) + "?"
-        bucketlist_data, error = bucketlist_schema.dump(bucketlist)
-        if error:
-            return msg.format_field_errors(error)
+        bucketlist_items = search_or_paginate(
+            BucketlistItem.query.filter_by(bucketlist_id=id),
+            BucketlistItem, page, limit, cursor, q, bucketlist_id=id)
         data = {
-            'bucketlist': bucketlist_data
+            'bucketlist': serializer.bucketlist(bucketlist)
         }
-        bucketlist_items_data, error = bucketlist_items_schema.dump(
-            bucketlist_items.items)
-        if error:
-            return msg.format_field_errors(error)
-        # bucketlist_items_schema.dump(bucketlist_items_data.items)
-        data['bucketlist']['items'] = bucketlist_items_data
-        return {"data": data,
-                "current_page": bucketlist_items.page,
-                "has_next": bucketlist_items.has_next,
-                "has_previous": bucketlist_items.has_prev,
-                "next_page": page_base_url + "page=" +
-                str(bucketlist_items.next_num),
-                "previous_page": page_base_url + "page=" +
-                str(bucketlist_items.prev_num),
-                "total": bucketlist_items.total
-                }
+        data['bucketlist']['items'] = serializer.items(bucketlist_items.items)
+        data = {"data": data}
+        data.update(pagination_data(
+            bucketlist_items, url_for("bucketlists.bucketlistdetails", id=id),
+            limit=limit, q=q))
+        return data, 200, {'ETag': quote_etag(etag)}
 
     @staticmethod
     def put(id):
@@ -324,16 +698,12 @@ class BucketlistItemDetails(Resource):
 
     @staticmethod
     def get(id, item_id):
-        abort_if_bucketlist_doesnt_exist(id)
-        abort_if_bucketlist_item_doesnt_exist(item_id)
-        bucket_list_items = BucketlistItem.query.filter_by(
-            bucketlist_id=id, id=item_id).first()
-        return bucketlist_item_schema.dump(bucket_list_items)
+        bucketlist_item = abort_if_bucketlist_item_doesnt_exist(id, item_id)
+        return bucketlist_item_schema.dump(bucketlist_item)
 
     @staticmethod
     def put(id, item_id):
-        abort_if_bucketlist_doesnt_exist(id)
-        bucketlist_item = abort_if_bucketlist_item_doesnt_exist(item_id)
+        bucketlist_item = abort_if_bucketlist_item_doesnt_exist(id, item_id)
         put_data = json.loads(request.data.decode())
         put_data['id'] = item_id
         put_data['bucketlist_id'] = id
@@ -360,13 +730,86 @@ class BucketlistItemDetails(Resource):
 
     @staticmethod
     def delete(id, item_id):
-        abort_if_bucketlist_doesnt_exist(id)
-        bucketlist_item = abort_if_bucketlist_item_doesnt_exist(item_id)
+        bucketlist_item = abort_if_bucketlist_item_doesnt_exist(id, item_id)
         bucketlist_item.delete_bucketlist_item()
         return msg.format_success_message(
             "Bucketlist item successfully deleted", 200)
 
 
+class BucketlistItemsBatch(Resource):
+    method_decorators = [jwt_required()]
+
+    @staticmethod
+    def post(id):
+        """
+        Add an array of Bucketlist Items to the bucketlist with specified id,
+        in a single transaction. Invalid items are reported by their index
+        and do not prevent the valid ones from being created.
+        :param id: Bucketlist id from url
+        :type id: integer
+        :return: Data containing the ids of the created bucketlist items
+        and the errors of the invalid ones
+        :rtype: JSON
+        """
+        abort_if_bucketlist_doesnt_exist(id)
+        post_data = json.loads(request.data.decode())
+        if not isinstance(post_data, list):
+            return msg.format_field_errors(
+                {'_schema': ['Expected an array of bucketlist items.']})
+        items, errors = load_bucketlist_items(post_data)
+        if errors and not items:
+            return msg.format_field_errors(errors)
+
+        created = BucketlistItem.create_bucketlist_items(id, items)
+        return {"created": created, "field_errors": errors}, 201
+
+    @staticmethod
+    def put(id):
+        """
+        Change the editable fields of many Bucketlist Items of the bucketlist
+        with specified id at once. The items are selected either by their
+        ids or by a filter on their field values, e.g.
+        {"ids": [1, 2], "values": {"done": true}} or
+        {"filter": {"done": false}, "values": {"done": true}}
+        :param id: Bucketlist id from url
+        :type id: integer
+        :return: Number of updated bucketlist items or an error message
+        :rtype: JSON
+        """
+        abort_if_bucketlist_doesnt_exist(id)
+        put_data = json.loads(request.data.decode())
+        if not isinstance(put_data, dict):
+            return msg.format_field_errors(
+                {'_schema': ['Expected an object.']})
+        errors = {}
+        values, error = editable_values(put_data.get('values'))
+        if error:
+            errors['values'] = error
+        elif not values:
+            errors['values'] = ['Expected at least one of {}.'.format(
+                ', '.join(bucketlist_item_schema.editable_fields()))]
+        ids = put_data.get('ids')
+        criteria = None
+        if 'filter' in put_data:
+            criteria, error = editable_values(put_data['filter'])
+            if error:
+                errors['filter'] = error
+        if (ids is None) == ('filter' not in put_data):
+            errors['_schema'] = ['Expected either ids or filter.']
+        elif ids is not None and (not isinstance(ids, list) or not all(
+                isinstance(item_id, int) for item_id in ids)):
+            errors['ids'] = ['Expected an array of bucketlist item ids.']
+        if errors:
+            return msg.format_field_errors(errors)
+
+        count = BucketlistItem.update_bucketlist_items(
+            id, values, ids=ids, criteria=criteria)
+        return {"updated": count}, 200
+
+
 api.add_resource(Bucketlists, '/')
+api.add_resource(BucketlistsExport, '/export')
+api.add_resource(BucketlistsImport, '/import')
 api.add_resource(BucketlistDetails, '/<int:id>')
 api.add_resource(BucketlistItemDetails, '/<int:id>/<int:item_id>')
+api.add_resource(BucketlistItemsBatch, '/<int:id>/batch')
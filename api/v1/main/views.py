@@ -1,6 +1,6 @@
 import json
 
-from flask import jsonify
+from flask import current_app, jsonify, request
 
 from . import main
 
@@ -31,7 +31,7 @@ def page_not_found(e):
         "error": "404",
         "message": "Page Not Found"
     }
-    print("Error: ", e)
+    current_app.logger.info("Not found: %s %s", request.method, request.path)
     return jsonify(data), 404
 
 
@@ -0,0 +1,191 @@
+import asyncio
+
+from flask import json, url_for
+
+from api import admission
+from api.asgi import AsyncAPI
+from api.models import Bucketlist
+from .base_testcases import BaseTestCase
+
+
+class AsyncAPITestCase(BaseTestCase):
+
+    def setUp(self):
+        super(AsyncAPITestCase, self).setUp()
+        self.asgi = AsyncAPI(self.app, threads=2)
+        self.loop = asyncio.new_event_loop()
+        self.headers = {'Authorization': 'JWT ' + self.jwt_token}
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.asgi.database.close())
+        self.loop.close()
+        self.asgi.executor.shutdown()
+        super(AsyncAPITestCase, self).tearDown()
+
+    def request(self, method, url, body=b'', headers=None):
+        """
+        Make a request to the ASGI application
+        :return: The status, headers and body of the response
+        :rtype: tuple
+        """
+        path, _, query = url.partition('?')
+        scope = {
+            'type': 'http', 'http_version': '1.1', 'method': method,
+            'scheme': 'http', 'path': path, 'root_path': '',
+            'query_string': query.encode(), 'server': ('localhost', 80),
+            'client': ('127.0.0.1', 50000),
+            'headers': [(name.lower().encode(), value.encode())
+                        for name, value in (headers or {}).items()]}
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body,
+                    'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        self.loop.run_until_complete(self.asgi(scope, receive, send))
+        headers = dict((name.decode(), value.decode())
+                       for name, value in messages[0]['headers'])
+        return (messages[0]['status'], headers,
+                b''.join(message.get('body', b'')
+                         for message in messages[1:]))
+
+    def assert_same_response(self, method, url, data=None, headers=None):
+        """
+        Test the ASGI and Flask applications answer a request identically
+        :return: The status, headers and body of the ASGI response
+        :rtype: tuple
+        """
+        headers = dict(self.headers, **(headers or {}))
+        body = b'' if data is None else json.dumps(data).encode()
+        response = self.request(method, url, body, headers)
+        expected = self.client.open(url, method=method, data=body,
+                                    headers=headers)
+        status, response_headers, response_body = response
+        self.assertEqual(status, expected.status_code)
+        self.assertEqual(response_body, expected.data)
+        for name in ('Content-Type', 'ETag', 'Content-Encoding',
+                     'Access-Control-Allow-Origin'):
+            self.assertEqual(response_headers.get(name.lower()),
+                             expected.headers.get(name))
+        return response
+
+    def test_reads(self):
+        """
+        Test the reads answered with the async driver match the Flask views
+        """
+        bucketlists = url_for('bucketlists.bucketlists')
+        details = url_for('bucketlists.bucketlistdetails', id=1)
+        status, headers, body = self.assert_same_response('GET', bucketlists)
+        self.assertEqual(status, 200)
+        self.assert_same_response('GET', bucketlists + '?limit=1&page=2')
+        self.assert_same_response('GET', bucketlists + '?ids=2,1,9')
+        self.assert_same_response(
+            'GET', bucketlists + '?include=items&items_limit=1')
+        cursor = json.loads(self.assert_same_response(
+            'GET', bucketlists + '?limit=1')[2])['next_page'].split('?')[1]
+        self.assert_same_response('GET', bucketlists + '?' + cursor)
+        self.assert_same_response('GET', bucketlists, headers={
+            'If-None-Match': headers['etag']})
+        self.assert_same_response('GET', details + '?limit=1')
+        self.assert_same_response('GET', details, headers={
+            'Accept-Encoding': 'gzip'})
+        self.assert_same_response('GET', url_for(
+            'bucketlists.bucketlistitemdetails', id=1, item_id=2))
+
+    def test_errors_answered_by_flask(self):
+        """
+        Test the requests the views answer with an error get the same error
+        """
+        paul = Bucketlist(description="Paul's", user=self.user2)
+        paul.create_bucketlist()
+        for url in (url_for('bucketlists.bucketlistdetails', id=9),
+                    url_for('bucketlists.bucketlistdetails', id=paul.id),
+                    url_for('bucketlists.bucketlistitemdetails', id=1,
+                            item_id=9),
+                    url_for('bucketlists.bucketlists', cursor='invalid')):
+            status, headers, body = self.assert_same_response('GET', url)
+            self.assertIn(status, (400, 403, 404))
+        self.headers = {}
+        status, headers, body = self.assert_same_response(
+            'GET', url_for('bucketlists.bucketlists'))
+        self.assertEqual(status, 401)
+
+    def test_login(self):
+        """
+        Test logging in through the async driver
+        """
+        status, headers, body = self.request(
+            'POST', url_for('auth.login'), json.dumps(
+                {'email': 'paul@andela.com', 'password': '12345678'}).encode())
+        self.assertEqual(status, 200)
+        token = json.loads(body)['token']
+        status, headers, body = self.request(
+            'GET', url_for('bucketlists.bucketlists'),
+            headers={'Authorization': 'JWT ' + token})
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)['total'], 0)
+        self.assert_same_response('POST', url_for('auth.login'), data={
+            'username': 'wcyn', 'password': 'wrong password'})
+
+    def test_writes_passed_to_flask(self):
+        """
+        Test writes and streamed responses go through the Flask app
+        """
+        status, headers, body = self.request(
+            'POST', url_for('bucketlists.bucketlists'), json.dumps(
+                {'description': 'Written'}).encode(), self.headers)
+        self.assertEqual(status, 201)
+        self.assertEqual(Bucketlist.query.filter_by(
+            description='Written').count(), 1)
+        self.assert_same_response('GET', url_for(
+            'bucketlists.bucketlistsexport'))
+
+    def test_rate_limit(self):
+        """
+        Test the reads answered here count against the user's rate limit
+        """
+        self.app.config.update(RATE_LIMIT_READS=0.5, RATE_LIMIT_READ_BURST=1)
+        admission.init_app(self.app)
+        url = url_for('bucketlists.bucketlists')
+        self.assertEqual(self.request('GET', url, headers=self.headers)[0],
+                         200)
+        status, headers, body = self.request('GET', url,
+                                             headers=self.headers)
+        self.assertEqual(status, 429)
+        self.assertEqual(headers['retry-after'], '2')
+
+    def test_requests_passed_to_flask_counted_once(self):
+        """
+        Test a request the Flask app answers is not rate limited again
+        """
+        self.app.config.update(RATE_LIMIT_READS=0.01, RATE_LIMIT_READ_BURST=2)
+        admission.init_app(self.app)
+        url = url_for('bucketlists.bucketlistdetails', id=9)
+        for _ in range(2):
+            self.assertEqual(self.request('GET', url, headers=self.headers)[0],
+                             404)
+        self.assertEqual(self.request('GET', url, headers=self.headers)[0],
+                         429)
+
+    def test_concurrency_cap(self):
+        """
+        Test the requests answered here take a slot of the cap
+        """
+        self.app.config.update(MAX_CONCURRENT_REQUESTS=1,
+                               ADMISSION_QUEUE_TIMEOUT=0.01)
+        admission.init_app(self.app)
+        slots = self.app.extensions['admission'][1]
+        url = url_for('bucketlists.bucketlists')
+        slots.acquire()
+        status, headers, body = self.request('GET', url,
+                                             headers=self.headers)
+        self.assertEqual(status, 503)
+        self.assertIn('retry-after', headers)
+        slots.release()
+        self.assertEqual(self.request('GET', url, headers=self.headers)[0],
+                         200)
+        # The slot was released after the response
+        self.assertTrue(slots.acquire(blocking=False))
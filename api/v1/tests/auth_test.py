@@ -0,0 +1,233 @@
+import time
+
+from flask import json
+from flask import url_for
+
+from api import bcrypt
+from api.hashing import PooledBcrypt, HashingBusy, hash_rounds
+from api.models import User, UserToken
+from api.revocation import RevocationList
+from .base_testcases import BaseTestCase, APIGetTestCase
+
+
+class IdentityTestCase(APIGetTestCase):
+
+    # JWT identity #
+    # ------------ #
+
+    def payload(self):
+        return {'id': self.user1.id, 'username': 'wcyn',
+                'email': 'cynthia.abura@andela.com'}
+
+    def test_identity_does_not_query_database(self):
+        """
+        Test the identity is built from the token claims
+        """
+        self.app.extensions['identity_cache'].clear()
+        with self.count_queries() as statements:
+            identity = User.identity(self.payload())
+        self.assertEqual(statements, [])
+        self.assertEqual((identity.id, identity.username), (1, 'wcyn'))
+
+    def test_deleted_user_tokens_revoked_everywhere(self):
+        """
+        Test the tokens of a deleted user are rejected by processes that
+        have no cached identity of them
+        """
+        self.db.session.delete(self.user1)
+        self.db.session.commit()
+        self.app.extensions['identity_cache'].clear()
+        self.app.extensions['revocation'].sync()
+        response = self.client.get(url_for('bucketlists.bucketlists'),
+                                   headers={'Authorization': 'JWT ' +
+                                            self.jwt_token})
+        self.assertEqual(response.status_code, 401)
+        token = UserToken.query.filter_by(user_id=1).one()
+        self.assertIsNotNone(token.not_before)
+        self.assertGreater(token.expires, token.not_before)
+
+    def test_identity_follows_user_updates(self):
+        """
+        Test the cached identity is replaced when the user changes
+        """
+        User.identity(self.payload())
+        self.user1.username = 'cynthia'
+        self.db.session.commit()
+        self.assertEqual(User.identity(self.payload()).username, 'cynthia')
+
+        self.db.session.delete(self.user1)
+        self.db.session.commit()
+        self.assertIsNone(User.identity(self.payload()))
+
+    def test_get_other_users_bucketlist(self):
+        """
+        Test it returns 403 Forbidden for another user's bucketlist
+        """
+        response = self.client.post(
+            url_for('auth.login'), data=json.dumps(
+                {"username": "paul", "password": "12345678"}))
+        self.token = json.loads(response.data)["token"]
+        self.url = url_for('bucketlists.bucketlistdetails', id=1)
+        self.expected_data = {
+            'message': "Forbidden. You may not view this data"}
+        self.status = 403
+        self.get_one()
+
+
+class PasswordHashingTestCase(BaseTestCase):
+
+    # Password hashing #
+    # ---------------- #
+
+    def pooled_bcrypt(self, pool_size, max_pending=0, timeout=5):
+        self.app.config.update(BCRYPT_POOL_SIZE=pool_size,
+                               BCRYPT_MAX_PENDING=max_pending,
+                               BCRYPT_QUEUE_TIMEOUT=timeout)
+        return PooledBcrypt(self.app)
+
+    def test_pool_hashes_and_checks_passwords(self):
+        """
+        Test passwords hashed in the process pool can be checked
+        """
+        pooled = self.pooled_bcrypt(1)
+        pw_hash = pooled.generate_password_hash('12345678')
+        self.assertEqual(hash_rounds(pw_hash), 4)
+        self.assertTrue(pooled.check_password_hash(pw_hash, '12345678'))
+        self.assertFalse(pooled.check_password_hash(pw_hash, '87654321'))
+
+    def test_pool_rejects_calls_when_busy(self):
+        """
+        Test it raises HashingBusy when no hashing slot frees up in time
+        """
+        pooled = self.pooled_bcrypt(1, timeout=0.01)
+        pooled._slots.acquire()
+        with self.assertRaises(HashingBusy):
+            pooled.generate_password_hash('12345678')
+
+    def test_login_rehashes_password_with_new_work_factor(self):
+        """
+        Test logging in replaces a hash made with another work factor
+        """
+        self.user1._password = bcrypt.generate_password_hash(
+            '12345678', rounds=5).decode()
+        self.db.session.commit()
+        response = self.client.post(
+            url_for('auth.login'), data=json.dumps(
+                {"username": "wcyn", "password": "12345678"}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(hash_rounds(User.query.get(1).password), 4)
+
+
+class RevocationTestCase(BaseTestCase):
+
+    # Token revocation #
+    # ---------------- #
+
+    def login(self):
+        response = self.client.post(
+            url_for('auth.login'), data=json.dumps(
+                {"username": "wcyn", "password": "12345678"}))
+        return json.loads(response.data)["token"]
+
+    def get_bucketlists(self, token):
+        return self.client.get(url_for('bucketlists.bucketlists'), headers={
+            'Authorization': 'JWT ' + token})
+
+    def test_logout_revokes_token(self):
+        """
+        Test a token cannot be used after logging out with it
+        """
+        other_token = self.login()
+        response = self.client.post(url_for('auth.logout'), headers={
+            'Authorization': 'JWT ' + self.jwt_token})
+        self.assertEqual(response.status_code, 200)
+        response = self.get_bucketlists(self.jwt_token)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(json.loads(response.data)['description'],
+                         'Token has been revoked')
+        self.assertEqual(self.get_bucketlists(other_token).status_code, 200)
+
+    def test_token_revoked_twice(self):
+        """
+        Test revoking a token another request just revoked succeeds
+        """
+        payload = self.app.extensions['jwt'].jwt_decode_callback(
+            self.jwt_token)
+        for _ in range(2):
+            UserToken.revoke(1, payload['jti'], payload['exp'])
+        self.assertEqual(UserToken.query.filter_by(
+            jti=payload['jti']).count(), 1)
+        self.assertEqual(self.get_bucketlists(self.jwt_token).status_code,
+                         401)
+
+    def test_revoke_all_tokens(self):
+        """
+        Test revoking revokes every token issued until then
+        """
+        other_token = self.login()
+        response = self.client.post(url_for('auth.revoketokens'), headers={
+            'Authorization': 'JWT ' + self.jwt_token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_bucketlists(self.jwt_token).status_code,
+                         401)
+        self.assertEqual(self.get_bucketlists(other_token).status_code, 401)
+        self.assertEqual(self.get_bucketlists(self.login()).status_code, 200)
+        self.assertEqual(UserToken.query.count(), 1)
+
+    def test_revocations_are_synced_from_database(self):
+        """
+        Test tokens are checked without queries, and revocations made by
+        other processes apply after the next sync
+        """
+        with self.count_queries() as statements:
+            self.assertEqual(self.get_bucketlists(self.jwt_token).status_code,
+                             200)
+        self.assertFalse([statement for statement in statements
+                          if 'user_token' in statement])
+
+        payload = self.app.extensions['jwt'].jwt_decode_callback(
+            self.jwt_token)
+        self.db.session.add(UserToken(user_id=1, jti=payload['jti']))
+        self.db.session.commit()
+        self.assertEqual(self.get_bucketlists(self.jwt_token).status_code,
+                         200)
+        self.app.extensions['revocation'].sync()
+        self.assertEqual(self.get_bucketlists(self.jwt_token).status_code,
+                         401)
+
+    def test_sync_reads_rows_committed_late(self):
+        """
+        Test a row committed after rows with higher ids were read is read by
+        the next sync
+        """
+        payload = self.app.extensions['jwt'].jwt_decode_callback(
+            self.jwt_token)
+        self.db.session.add(UserToken(id=10, user_id=2, jti='0' * 32))
+        self.db.session.commit()
+        self.app.extensions['revocation'].sync()
+        self.db.session.add(UserToken(id=5, user_id=1, jti=payload['jti']))
+        self.db.session.commit()
+        self.app.extensions['revocation'].sync()
+        self.assertEqual(self.get_bucketlists(self.jwt_token).status_code,
+                         401)
+
+    def test_revocations_synced_by_thread(self):
+        """
+        Test a thread reads the revocations made by other processes every
+        sync_interval seconds
+        """
+        revocation = RevocationList(sync_interval=0.05)
+        self.app.extensions['revocation'] = revocation
+        self.addCleanup(revocation.stop)
+        self.assertEqual(self.get_bucketlists(self.jwt_token).status_code,
+                         200)
+        payload = self.app.extensions['jwt'].jwt_decode_callback(
+            self.jwt_token)
+        self.db.session.add(UserToken(user_id=1, jti=payload['jti']))
+        self.db.session.commit()
+        for _ in range(100):
+            if len(revocation):
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.get_bucketlists(self.jwt_token).status_code,
+                         401)
@@ -1,6 +1,9 @@
+from contextlib import contextmanager
+
 from flask import json
 from flask import url_for
 from flask_testing import TestCase
+from sqlalchemy import event
 
 from api import db, create_app
 from api.models import User, Bucketlist, BucketlistItem
@@ -84,6 +87,8 @@ class BaseTestCase(TestCase):
         self.jwt_token = ""
         if "token" in response_data:
             self.jwt_token = response_data["token"]
+        # Load the revoked tokens, as a running server has already done
+        self.app.extensions['revocation'].sync()
 
     def tearDown(self):
         """
@@ -92,6 +97,25 @@ class BaseTestCase(TestCase):
         self.db.session.remove()
         self.db.drop_all()
 
+    @contextmanager
+    def count_queries(self):
+        """
+        Record the SQL statements executed inside the with block
+        :return: List that the executed statements are appended to
+        :rtype: list
+        """
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = self.db.get_engine(self.app)
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+
     @staticmethod
     def not_exists_message(id="", item_id="", item=False):
         original_item_id = item_id
@@ -101,14 +125,17 @@ class BaseTestCase(TestCase):
             return {'message':
                     "Bucketlist item '{}' does not exist. You have requested "
                     "this URI [/api/v1/bucketlists/{}{}] but did you mean "
-                    "/api/v1/bucketlists/<int:id> ?".format(
+                    "/api/v1/bucketlists/<int:id> or "
+                    "/api/v1/bucketlists/<int:id>/batch or "
+                    "/api/v1/bucketlists/import ?".format(
                         original_item_id, id, item_id)}
         else:
             return {'message':
                     "Bucketlist '{}' does not exist. You have requested "
                     "this URI [/api/v1/bucketlists/{}{}] but did you mean "
-                    "/api/v1/bucketlists/<int:id> or /api/v1/auth/register ?"
-                        .format(id, id, item_id)}
+                    "/api/v1/bucketlists/<int:id> or "
+                    "/api/v1/bucketlists/import or "
+                    "/api/v1/bucketlists/export ?".format(id, id, item_id)}
 
 
 class APIGetTestCase(BaseTestCase):
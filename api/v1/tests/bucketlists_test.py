@@ -1,5 +1,25 @@
+import gzip
+import threading
+from unittest import mock
+import zlib
+
+from flask import json
 from flask import url_for
 
+from api import admission, create_app, search
+from api.cache import TTLCache
+from api.config import TestingConfig
+from api.explain import (captured_queries, derived_tables,
+                         endpoint_requests, explain_endpoints,
+                         is_sequential_scan)
+from api.models import User, Bucketlist, BucketlistItem
+from api.seed import seed
+from api.server import Serve
+from api.v1.bucketlists.views import (serializer, bucketlist_schema,
+                                      bucketlists_schema,
+                                      bucketlist_details_schema,
+                                      bucketlist_item_schema,
+                                      bucketlist_items_schema)
 from .base_testcases import (BaseTestCase, APIGetTestCase,
                              APIPostTestCase, APIPutTestCase,
                              APIDeleteTestCase)
@@ -19,6 +39,152 @@ class BucketlistsGetTestCase(APIGetTestCase):
                               BaseTestCase.bucketlist2_dict]
         self.get_all()
 
+    def test_get_bucketlists_query_count_is_constant(self):
+        """
+        Test the number of queries does not grow with the page size
+        """
+        for index in range(10):
+            bucketlist = Bucketlist(description="List {}".format(index),
+                                    user=self.user1)
+            bucketlist.items.append(BucketlistItem(description="An item"))
+            self.db.session.add(bucketlist)
+        self.db.session.commit()
+
+        self.url = url_for("bucketlists.bucketlists", limit=2)
+        with self.count_queries() as small_page:
+            self.get_data()
+        self.url = url_for("bucketlists.bucketlists", limit=12)
+        with self.count_queries() as large_page:
+            self.get_data()
+        self.assertEqual(len(small_page), len(large_page))
+
+    def test_get_bucketlists_cursor_pagination(self):
+        """
+        Test following the next_page links returns every bucketlist once
+        """
+        for index in range(3):
+            self.db.session.add(Bucketlist(description="List {}".format(index),
+                                           user=self.user1))
+        self.db.session.commit()
+
+        self.url = url_for("bucketlists.bucketlists", limit=2)
+        ids, totals = [], []
+        while self.url:
+            data = json.loads(self.get_data().data)
+            ids.extend(bucketlist['id'] for bucketlist in data['data'][0])
+            totals.append(data['total'])
+            self.url = data['has_next'] and data['next_page']
+        self.assertEqual(ids, [1, 2, 3, 4, 5])
+        # Cursor pages are not counted
+        self.assertEqual(totals, [5, None, None])
+
+    def test_get_bucketlists_page_links_past_the_ends(self):
+        """
+        Test the links past the first and last pages are still strings
+        """
+        self.url = url_for("bucketlists.bucketlists")
+        data = json.loads(self.get_data().data)
+        self.assertEqual(data['next_page'], "/api/v1/bucketlists/?page=None")
+        self.assertEqual(data['previous_page'],
+                         "/api/v1/bucketlists/?page=None")
+        self.url = url_for('bucketlists.bucketlistdetails', id=2)
+        data = json.loads(self.get_data().data)
+        self.assertEqual(data['next_page'],
+                         "/api/v1/bucketlists/2?page=None")
+
+    def test_get_bucketlists_page_still_supported(self):
+        """
+        Test the page argument still returns the requested page
+        """
+        self.url = url_for("bucketlists.bucketlists", page=2, limit=1)
+        self.expected_data = [BaseTestCase.bucketlist2_dict]
+        self.get_all()
+
+    def test_get_bucketlists_invalid_cursor(self):
+        """
+        Test it returns 400 Bad Request error on an invalid cursor
+        """
+        self.url = url_for("bucketlists.bucketlists", cursor="invalid")
+        self.expected_data = {'message': "Invalid cursor 'invalid'"}
+        self.status = 400
+        self.get_one()
+
+    def test_get_bucketlists_search(self):
+        """
+        Test q returns the matching bucketlists, best match first
+        """
+        self.db.session.add(Bucketlist(description="Travel travel travel",
+                                       user=self.user1))
+        self.db.session.add(Bucketlist(description="Travelling the world",
+                                       user=self.user1))
+        self.db.session.add(Bucketlist(description="Travel to Cairo",
+                                       user=self.user2))
+        self.db.session.commit()
+
+        self.url = url_for("bucketlists.bucketlists", q="travel")
+        data = json.loads(self.get_data().data)
+        self.assertEqual([bucketlist['id'] for bucketlist in data['data'][0]],
+                         [3, 4])
+        self.assertEqual(data['total'], 2)
+
+        self.url = url_for("bucketlists.bucketlists", q="bucket 2")
+        data = json.loads(self.get_data().data)
+        self.assertEqual([bucketlist['id'] for bucketlist in data['data'][0]],
+                         [2])
+
+    def test_get_bucketlists_search_follows_writes(self):
+        """
+        Test the search index is updated when bucketlists change
+        """
+        self.bucketlist.description = "Go skydiving"
+        self.db.session.commit()
+        self.bucketlist2.delete_bucketlist()
+
+        self.url = url_for("bucketlists.bucketlists", q="bucketlist")
+        data = json.loads(self.get_data().data)
+        self.assertEqual(data['data'][0], [])
+        self.url = url_for("bucketlists.bucketlists", q="sky")
+        data = json.loads(self.get_data().data)
+        self.assertEqual([bucketlist['id'] for bucketlist in data['data'][0]],
+                         [1])
+
+    def test_get_bucketlists_search_with_cursor(self):
+        """
+        Test it returns 400 Bad Request when q is given with a cursor
+        """
+        self.url = url_for("bucketlists.bucketlists", q="bucket",
+                           cursor="MQ")
+        self.expected_data = {
+            'message': "Search results cannot be paged with a cursor"}
+        self.status = 400
+        self.get_one()
+        self.url = url_for("bucketlists.bucketlistdetails", id=1, q="2",
+                           cursor="MQ")
+        self.get_one()
+
+    def test_search_index_built_when_empty(self):
+        """
+        Test an empty index is built from the database, and a filled one
+        left as it is
+        """
+        storage = self.app.extensions['search']['storage']
+        self.app.extensions['search']['indexes']['Bucketlist'] = \
+            storage.create_index(search.schema(Bucketlist), 'Bucketlist')
+        self.url = url_for("bucketlists.bucketlists", q="bucketlist")
+        self.assertEqual(json.loads(self.get_data().data)['total'], 0)
+        self.assertEqual(search.index_if_empty(Bucketlist), 2)
+        self.url = url_for("bucketlists.bucketlists", q="bucket")
+        self.assertEqual(json.loads(self.get_data().data)['total'], 2)
+        self.assertEqual(search.index_if_empty(Bucketlist), 0)
+
+    def test_get_bucketlists_items_search(self):
+        """
+        Test q returns the matching items of the bucketlist
+        """
+        self.url = url_for('bucketlists.bucketlistdetails', id=1, q="2")
+        self.expected_data = [BaseTestCase.bucketlist_item2_dict]
+        self.get_all(container=["bucketlist", "items"])
+
     # GET /bucketlists/<id> #
     # --------------------- #
 
@@ -87,6 +253,42 @@ class BucketlistsGetTestCase(APIGetTestCase):
         self.status = 404
         self.get_one()
 
+    def test_get_bucketlists_item_single_query(self):
+        """
+        Test the item and its bucketlist are resolved with one statement
+        """
+        self.url = url_for('bucketlists.bucketlistitemdetails', id=1,
+                           item_id=1)
+        with self.count_queries() as statements:
+            response = self.get_data()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(statements), 1)
+
+    def test_get_bucketlists_item_other_bucketlist(self):
+        """
+        Test it returns 404 Not Found Error for an item of another bucketlist
+        """
+        self.url = url_for('bucketlists.bucketlistitemdetails', id=2,
+                           item_id=1)
+        self.expected_data = self.not_exists_message("2", "1", item=True)
+        self.status = 404
+        self.get_one()
+
+    def test_get_bucketlists_item_other_user(self):
+        """
+        Test it returns 403 Forbidden for an item of another user
+        """
+        response = self.client.post(
+            url_for('auth.login'), data=json.dumps(
+                {"username": "paul", "password": "12345678"}))
+        self.token = json.loads(response.data)["token"]
+        self.url = url_for('bucketlists.bucketlistitemdetails', id=1,
+                           item_id=1)
+        self.expected_data = {
+            'message': "Forbidden. You may not view this data"}
+        self.status = 403
+        self.get_one()
+
     def test_get_bucketlists_item_bucketlist_not_exists(self):
         """
         Test it returns 404 Bad Request error when bucketlist does not exist
@@ -96,7 +298,9 @@ class BucketlistsGetTestCase(APIGetTestCase):
             'message':
                 "Bucketlist '{}' does not exist. You have requested "
                 "this URI [/api/v1/bucketlists/{}/{}] but did you mean "
-                "/api/v1/bucketlists/<int:id> ?"
+                "/api/v1/bucketlists/<int:id> or "
+                "/api/v1/bucketlists/<int:id>/batch or "
+                "/api/v1/bucketlists/import ?"
                 .format(4, 4, 1)}
         self.status = 404
         self.get_one()
@@ -204,6 +408,164 @@ class BucketlistsPostTestCase(APIPostTestCase):
         self.create()
 
 
+class BucketlistItemsBatchTestCase(APIPostTestCase):
+
+    # POST /bucketlists/<id>/batch #
+    # ---------------------------- #
+
+    def test_post_bucketlist_items_batch(self):
+        """
+        Test it creates the valid items and reports the invalid ones
+        """
+        self.post_data = [{"description": "Travel to Cairo", "done": True},
+                          {"done": True},
+                          {"description": "Climb Kilimanjaro"}]
+        self.url = url_for('bucketlists.bucketlistitemsbatch', id=1)
+        with self.count_queries() as statements:
+            response = self.post()
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(data['created'], [3, 4])
+        self.assertEqual(BucketlistItem.get_bucketlist_item(4).description,
+                         'Climb Kilimanjaro')
+        self.assertEqual(data['field_errors'], {
+            '1': {'description': ['Description is required.']}})
+        inserts = [statement for statement in statements
+                   if statement.startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+
+        bucketlist = Bucketlist.get_bucketlist(1)
+        self.assertEqual((bucketlist.item_count, bucketlist.done_count),
+                         (4, 1))
+
+    def test_concurrent_batches_return_their_own_items(self):
+        """
+        Test batches posted at the same time each return only the items they
+        created
+        """
+        results = []
+
+        def post_batches(name):
+            with self.app.app_context():
+                for index in range(5):
+                    descriptions = ['{} {} {}'.format(name, index, number)
+                                    for number in range(3)]
+                    ids = BucketlistItem.create_bucketlist_items(
+                        1, [{'description': description}
+                            for description in descriptions])
+                    results.append((ids, descriptions))
+                self.db.session.remove()
+
+        self.db.session.commit()
+        threads = [threading.Thread(target=post_batches, args=(name,))
+                   for name in ('first', 'second')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 10)
+        for ids, descriptions in results:
+            self.assertEqual(
+                [BucketlistItem.get_bucketlist_item(item_id).description
+                 for item_id in ids], descriptions)
+        self.assertEqual(Bucketlist.get_bucketlist(1).item_count, 32)
+
+    def test_post_bucketlist_items_batch_all_invalid(self):
+        """
+        Test it returns 400 Bad Request error when no item is valid
+        """
+        self.post_data = [{"description": ""}]
+        self.expected_data = {'field_errors': {'0': {'description': [
+            'Description cannot be empty.']}}}
+        self.url = url_for('bucketlists.bucketlistitemsbatch', id=1)
+        self.status = 400
+        self.create()
+
+    def test_post_bucketlist_items_batch_not_array(self):
+        """
+        Test it returns 400 Bad Request error when the body is not an array
+        """
+        self.post_data = {"description": "Travel to Cairo"}
+        self.expected_data = {'field_errors': {'_schema': [
+            'Expected an array of bucketlist items.']}}
+        self.url = url_for('bucketlists.bucketlistitemsbatch', id=1)
+        self.status = 400
+        self.create()
+
+
+class BucketlistItemsBatchPutTestCase(APIPutTestCase):
+
+    # PUT /bucketlists/<id>/batch #
+    # --------------------------- #
+
+    def test_put_bucketlist_items_batch_ids(self):
+        """
+        Test it updates the items with the given ids in one statement
+        """
+        self.put_data = {"ids": [1, 2], "values": {"done": True}}
+        self.url = url_for('bucketlists.bucketlistitemsbatch', id=1)
+        with self.count_queries() as statements:
+            response = self.put()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), {'updated': 2})
+        updates = [statement for statement in statements
+                   if statement.startswith('UPDATE bucketlist_item')]
+        self.assertEqual(len(updates), 1)
+        bucketlist = Bucketlist.get_bucketlist(1)
+        self.assertEqual((bucketlist.item_count, bucketlist.done_count),
+                         (2, 2))
+        self.assertEqual(Bucketlist.check_counters(), [])
+
+    def test_put_bucketlist_items_batch_filter(self):
+        """
+        Test it updates the items matching the filter and reindexes them
+        """
+        self.put_data = {"filter": {"done": False},
+                         "values": {"description": "Skydive"}}
+        self.url = url_for('bucketlists.bucketlistitemsbatch', id=1)
+        response = self.put()
+        self.assertEqual(json.loads(response.data), {'updated': 2})
+        self.assertEqual(BucketlistItem.get_bucketlist_item(2).description,
+                         'Skydive')
+        response = self.client.get(
+            url_for('bucketlists.bucketlistdetails', id=1, q="skydive"),
+            headers=self.headers)
+        items = json.loads(response.data)['data']['bucketlist']['items']
+        self.assertEqual(sorted(item['id'] for item in items), [1, 2])
+
+    def test_put_bucketlist_items_batch_other_bucketlist(self):
+        """
+        Test it leaves the items of other bucketlists untouched
+        """
+        self.put_data = {"ids": [1, 2], "values": {"done": True}}
+        self.url = url_for('bucketlists.bucketlistitemsbatch', id=2)
+        response = self.put()
+        self.assertEqual(json.loads(response.data), {'updated': 0})
+        self.assertFalse(BucketlistItem.get_bucketlist_item(1).done)
+
+    def test_put_bucketlist_items_batch_not_editable(self):
+        """
+        Test it returns 400 Bad Request error on fields that are not editable
+        """
+        self.put_data = {"ids": [1], "values": {"bucketlist_id": 1}}
+        self.expected_data = {'field_errors': {'values': [
+            'Fields bucketlist_id cannot be changed.']}}
+        self.url = url_for('bucketlists.bucketlistitemsbatch', id=1)
+        self.status = 400
+        self.modify()
+
+    def test_put_bucketlist_items_batch_no_selection(self):
+        """
+        Test it returns 400 Bad Request error without ids or a filter
+        """
+        self.put_data = {"values": {"done": True}}
+        self.expected_data = {'field_errors': {'_schema': [
+            'Expected either ids or filter.']}}
+        self.url = url_for('bucketlists.bucketlistitemsbatch', id=1)
+        self.status = 400
+        self.modify()
+
+
 class BucketlistsPutTestCase(APIPutTestCase):
 
     # PUT /bucketlists/<id> #
@@ -278,3 +640,659 @@ class BucketlistsDeleteTestCase(APIDeleteTestCase):
         self.status = 404
         self.remove()
         pass
+
+
+class BucketlistCountersTestCase(APIPostTestCase):
+
+    # Bucketlist item_count and done_count #
+    # ------------------------------------ #
+
+    def counters(self, bucketlist_id=1):
+        self.db.session.expire_all()
+        bucketlist = Bucketlist.get_bucketlist(bucketlist_id)
+        return bucketlist.item_count, bucketlist.done_count
+
+    def test_counters_follow_item_writes(self):
+        """
+        Test the counters change as items are created, updated and deleted
+        """
+        self.assertEqual(self.counters(), (2, 0))
+        self.post_data = {"description": "Travel to Cairo", "done": True}
+        self.url = url_for('bucketlists.bucketlists') + "1"
+        self.post()
+        self.assertEqual(self.counters(), (3, 1))
+
+        item = BucketlistItem.get_bucketlist_item(1)
+        item.done = True
+        item.update_bucketlist_item()
+        self.assertEqual(self.counters(), (3, 2))
+
+        BucketlistItem.get_bucketlist_item(3).delete_bucketlist_item()
+        self.assertEqual(self.counters(), (2, 1))
+
+    def test_delete_bucketlist_removes_items(self):
+        """
+        Test deleting a bucketlist deletes its items
+        """
+        Bucketlist.get_bucketlist(1).delete_bucketlist()
+        self.assertEqual(BucketlistItem.query.count(), 0)
+
+    def test_check_counters_repairs_drift(self):
+        """
+        Test check_counters reports drifted counters and repairs them
+        """
+        Bucketlist.query.filter_by(id=1).update({'item_count': 7})
+        self.db.session.commit()
+        self.assertEqual(Bucketlist.check_counters(), [(1, 7, 2, 0, 0)])
+        Bucketlist.check_counters(repair=True)
+        self.assertEqual(Bucketlist.check_counters(), [])
+        self.assertEqual(self.counters(), (2, 0))
+
+
+class SeedTestCase(BaseTestCase):
+
+    def test_seed(self):
+        """
+        Test generated users own consistent bucketlists and can log in
+        """
+        users, bucketlists, items = seed(5, '2', '0-6', done_ratio=0.5,
+                                         password='seeded12', batch_size=2,
+                                         random_seed=1)
+        self.assertEqual((users, bucketlists), (5, 10))
+        self.assertEqual(User.query.count(), 7)
+        self.assertEqual(Bucketlist.query.count(), 12)
+        self.assertEqual(BucketlistItem.query.count(), items + 2)
+        self.assertEqual(Bucketlist.check_counters(), [])
+        user = User.query.order_by(User.id.desc()).first()
+        self.assertIsInstance(
+            User.authenticate(user.username, 'seeded12', method='username'),
+            User)
+        # Rows created afterwards continue after the seeded ids
+        bucketlist = Bucketlist(description="New", user=user)
+        self.assertIsInstance(bucketlist.create_bucketlist(), Bucketlist)
+
+
+class FastSerializerTestCase(BaseTestCase):
+
+    def test_serializer_matches_schemas(self):
+        """
+        Test the fast serializer outputs the same JSON as the schemas
+        """
+        item = BucketlistItem.get_bucketlist_item(2)
+        item.done = True
+        item.update_bucketlist_item()
+        bucketlists = Bucketlist.query.order_by(Bucketlist.id).all()
+        items = BucketlistItem.query.order_by(BucketlistItem.id).all()
+        with self.app.test_request_context():
+            pairs = [
+                (bucketlist_schema.dump(bucketlists[0]).data,
+                 serializer.bucketlist(bucketlists[0])),
+                (bucketlists_schema.dump(bucketlists).data,
+                 serializer.bucketlists(bucketlists)),
+                (bucketlist_item_schema.dump(items[1]).data,
+                 serializer.item(items[1])),
+                (bucketlist_items_schema.dump(items).data,
+                 serializer.items(items)),
+                (bucketlist_details_schema.dump(bucketlists[0]).data,
+                 serializer.details(bucketlists[0], items))]
+        for expected, data in pairs:
+            self.assertEqual(json.dumps(expected, sort_keys=False),
+                             json.dumps(data, sort_keys=False))
+
+
+class QueryPlanTestCase(BaseTestCase):
+
+    def test_endpoint_queries_use_indexes(self):
+        """
+        Test no query of the GET endpoints or of logging in scans a table
+        """
+        bucketlist = Bucketlist.get_bucketlist(1)
+        with self.app.test_request_context():
+            plans = explain_endpoints(bucketlist.user, bucketlist,
+                                      bucketlist.items[0])
+        self.assertTrue(plans)
+        for name, statement, plan in plans:
+            derived = derived_tables(plan)
+            self.assertFalse(any(is_sequential_scan(step, derived)
+                                 for step in plan),
+                             "{}: {}".format(name, plan))
+
+    def test_endpoint_requests_succeed(self):
+        """
+        Test the explained requests are answered, and the cursor requests
+        run the keyset queries
+        """
+        bucketlist = Bucketlist.get_bucketlist(1)
+        headers = {'Authorization': 'JWT ' + self.jwt_token}
+        for name, url in endpoint_requests(bucketlist,
+                                           bucketlist.items[0]):
+            with captured_queries(self.db.engine) as queries:
+                response = self.client.get(url, headers=headers)
+                response.get_data()
+            self.assertLess(response.status_code, 300, name)
+            if 'cursor' in name:
+                self.assertTrue(any('.id > ' in statement
+                                    for statement, parameters in queries),
+                                "{}: {}".format(name, queries))
+
+    def test_is_sequential_scan(self):
+        self.assertTrue(is_sequential_scan("SCAN bucketlist"))
+        self.assertTrue(is_sequential_scan("SCAN TABLE bucketlist_item"))
+        self.assertTrue(is_sequential_scan(
+            "  ->  Seq Scan on bucketlist  (cost=0.00..1.01 rows=1)"))
+        self.assertFalse(is_sequential_scan(
+            "SEARCH bucketlist USING INDEX ix_bucketlist_user_id_id "
+            "(user_id=?)"))
+        self.assertFalse(is_sequential_scan(
+            "SCAN bucketlist USING INDEX ix_bucketlist_user_id_id"))
+        plan = ["CO-ROUTINE numbered", "SEARCH bucketlist_item USING INDEX "
+                "ix_bucketlist_item_bucketlist_id_id (bucketlist_id=?)",
+                "SCAN numbered"]
+        self.assertEqual(derived_tables(plan), {'numbered'})
+        self.assertFalse(is_sequential_scan(plan[2], derived_tables(plan)))
+
+
+class ConditionalGetTestCase(APIGetTestCase):
+
+    def get_with_etag(self, url, etag=None):
+        self.url = url
+        # Copied, as the class attribute is shared with the other tests
+        self.headers = dict(self.headers)
+        if etag:
+            self.headers['If-None-Match'] = etag
+        else:
+            self.headers.pop('If-None-Match', None)
+        return self.get_data()
+
+    def test_get_bucketlists_not_modified(self):
+        """
+        Test the list answers 304 until a bucketlist on the page changes
+        """
+        url = url_for('bucketlists.bucketlists')
+        etag = self.get_with_etag(url).headers['ETag']
+        response = self.get_with_etag(url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+
+        BucketlistItem(description="Skydive").create_bucketlist_item(1)
+        response = self.get_with_etag(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_get_bucketlists_id_not_modified(self):
+        """
+        Test the detail answers 304 without loading the items
+        """
+        url = url_for('bucketlists.bucketlistdetails', id=1)
+        etag = self.get_with_etag(url).headers['ETag']
+        with self.count_queries() as statements:
+            response = self.get_with_etag(url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([statement for statement in statements
+                          if 'FROM bucketlist_item' in statement])
+
+        item = BucketlistItem.get_bucketlist_item(1)
+        item.description = "Skydive"
+        item.update_bucketlist_item()
+        response = self.get_with_etag(url, etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+
+        bucketlist = Bucketlist.get_bucketlist(1)
+        bucketlist.description = "Travel"
+        bucketlist.update_bucketlist()
+        self.assertEqual(self.get_with_etag(url, etag).status_code, 200)
+
+    def test_get_bucketlists_id_etag_follows_query(self):
+        """
+        Test other pages of the same bucketlist have other ETags
+        """
+        etag = self.get_with_etag(url_for(
+            'bucketlists.bucketlistdetails', id=1)).headers['ETag']
+        response = self.get_with_etag(url_for(
+            'bucketlists.bucketlistdetails', id=1, limit=1), etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class ResponseCacheTestCase(APIGetTestCase):
+
+    def setUp(self):
+        super(ResponseCacheTestCase, self).setUp()
+        self.app.extensions['response_cache'] = TTLCache(100, 60)
+
+    def get_bucketlists(self):
+        self.url = url_for('bucketlists.bucketlists')
+        response = self.get_data()
+        return json.loads(response.data)['data'][0]
+
+    def item_counts(self):
+        return dict((bucketlist['id'], bucketlist['item_count'])
+                    for bucketlist in self.get_bucketlists())
+
+    def test_get_bucketlists_cached(self):
+        """
+        Test a repeated list request is answered without any query
+        """
+        self.get_bucketlists()
+        with self.count_queries() as statements:
+            self.get_bucketlists()
+        self.assertEqual(statements, [])
+
+    def test_cache_follows_writes(self):
+        """
+        Test item and bucketlist writes invalidate the owner's responses
+        """
+        self.assertEqual(self.item_counts(), {1: 2, 2: 0})
+        BucketlistItem(description="Skydive").create_bucketlist_item(2)
+        self.assertEqual(self.item_counts(), {1: 2, 2: 1})
+        BucketlistItem.create_bucketlist_items(1, [{'description': 'Dive'}])
+        self.assertEqual(self.item_counts(), {1: 3, 2: 1})
+        BucketlistItem.get_bucketlist_item(1).delete_bucketlist_item()
+        self.assertEqual(self.item_counts(), {1: 2, 2: 1})
+        Bucketlist.get_bucketlist(2).delete_bucketlist()
+        self.assertEqual(self.item_counts(), {1: 2})
+
+    def test_serve_refuses_process_cache_with_workers(self):
+        """
+        Test the server does not start several workers with a cache each
+        """
+        self.app.config['RESPONSE_CACHE_BACKEND'] = 'api.cache.TTLCache'
+        with self.assertRaises(SystemExit):
+            Serve()(self.app, 'localhost', 5000, 2, 1, 30, False)
+
+    def test_cache_not_invalidated_by_other_users(self):
+        """
+        Test writes to another user's bucketlists keep the cached responses
+        """
+        self.get_bucketlists()
+        Bucketlist(description="Paul's", user=self.user2).create_bucketlist()
+        with self.count_queries() as statements:
+            self.get_bucketlists()
+        self.assertEqual(statements, [])
+
+
+class CompressionTestCase(APIGetTestCase):
+
+    def get_with_encoding(self, url, encoding, etag=None):
+        self.url = url
+        self.headers = dict(self.headers, **{'Accept-Encoding': encoding})
+        if etag:
+            self.headers['If-None-Match'] = etag
+        return self.get_data()
+
+    def test_response_compressed(self):
+        """
+        Test large responses are compressed with the accepted coding
+        """
+        BucketlistItem.create_bucketlist_items(
+            1, [{'description': 'Item {}'.format(index)}
+                for index in range(20)])
+        url = url_for('bucketlists.bucketlistdetails', id=1, limit=20)
+        identity = self.get_with_encoding(url, 'identity')
+        self.assertNotIn('Content-Encoding', identity.headers)
+        self.assertIn('Accept-Encoding', identity.headers['Vary'])
+
+        for encoding, decompress in (('gzip', gzip.decompress),
+                                     ('deflate', zlib.decompress)):
+            response = self.get_with_encoding(url, encoding)
+            self.assertEqual(response.headers['Content-Encoding'], encoding)
+            self.assertIn('Accept-Encoding', response.headers['Vary'])
+            self.assertEqual(decompress(response.data), identity.data)
+            self.assertEqual(response.headers['ETag'],
+                             identity.headers['ETag'][:-1] + '-' +
+                             encoding + '"')
+            self.assertLess(len(response.data), len(identity.data))
+
+        etag = response.headers['ETag']
+        response = self.get_with_encoding(url, 'deflate', etag=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_small_response_not_compressed(self):
+        """
+        Test responses smaller than COMPRESS_MIN_SIZE are sent as they are
+        """
+        response = self.get_with_encoding(
+            url_for('bucketlists.bucketlistitemdetails', id=1, item_id=1),
+            'gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response.headers)
+
+
+class InstrumentationTestCase(APIGetTestCase):
+
+    def setUp(self):
+        super(InstrumentationTestCase, self).setUp()
+        self.url = url_for('bucketlists.bucketlistdetails', id=1)
+
+    def test_query_headers(self):
+        """
+        Test the query count and database time headers in dev mode only
+        """
+        self.assertNotIn('X-Query-Count', self.get_data().headers)
+        self.app.config['SQL_STATS_HEADERS'] = True
+        with self.count_queries() as statements:
+            response = self.get_data()
+        self.assertEqual(response.headers['X-Query-Count'],
+                         str(len(statements)))
+        self.assertGreater(float(response.headers['X-DB-Time']), 0)
+
+    def test_slow_request_logged(self):
+        """
+        Test requests over the threshold are logged with their SQL
+        """
+        with self.assertLogs('api.slow_requests', 'WARNING') as logs:
+            self.app.config['SLOW_REQUEST_THRESHOLD'] = 0
+            self.get_data()
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('GET /api/v1/bucketlists/1 200', logs.output[0])
+        self.assertIn('Slowest query', logs.output[0])
+        self.assertIn('FROM bucketlist_item', logs.output[0])
+
+    def test_slow_request_log_leaves_out_parameters(self):
+        """
+        Test the values bound to the logged statements are not logged
+        """
+        with self.assertLogs('api.slow_requests', 'WARNING') as logs:
+            self.app.config['SLOW_REQUEST_THRESHOLD'] = 0
+            self.client.post(url_for('auth.login'), data=json.dumps(
+                {"username": "paul", "password": "12345678"}))
+        self.assertIn('FROM user', logs.output[0])
+        self.assertIn('(3 parameters)', logs.output[0])
+        self.assertNotIn('paul', logs.output[0])
+
+
+class BucketlistsMultiGetTestCase(APIGetTestCase):
+
+    def test_get_bucketlists_by_id(self):
+        """
+        Test the bucketlists are returned in the order of the ids with their
+        first items, and the other ids reported
+        """
+        paul = Bucketlist(description="Paul's", user=self.user2)
+        paul.create_bucketlist()
+        self.url = url_for("bucketlists.bucketlists", items_limit=1,
+                           ids="2,1,9,{},1".format(paul.id))
+        response = self.get_data()
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data["data"], [
+            serializer.details(self.bucketlist2, []),
+            serializer.details(self.bucketlist, [self.bucketlist_item])])
+        self.assertEqual(data["errors"], {
+            "9": "Bucketlist '9' does not exist",
+            str(paul.id): "Forbidden. You may not view this data"})
+
+    def test_get_bucketlists_by_id_query_count_is_constant(self):
+        """
+        Test the bucketlists and their items are fetched with two queries
+        """
+        for index in range(5):
+            bucketlist = Bucketlist(description="List {}".format(index),
+                                    user=self.user1)
+            bucketlist.items.append(BucketlistItem(description="An item"))
+            self.db.session.add(bucketlist)
+        self.db.session.commit()
+
+        self.url = url_for("bucketlists.bucketlists", ids="1")
+        with self.count_queries() as one:
+            self.get_data()
+        self.url = url_for("bucketlists.bucketlists", ids="1,2,3,4,5,6,7")
+        with self.count_queries() as seven:
+            self.assertEqual(len(json.loads(self.get_data().data)["data"]),
+                             7)
+        self.assertEqual(len(one), 2)
+        self.assertEqual(len(seven), 2)
+
+    def test_get_bucketlists_by_invalid_id(self):
+        """
+        Test invalid or too many ids are rejected
+        """
+        self.url = url_for("bucketlists.bucketlists", ids="1,a")
+        response = self.get_data()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)["message"],
+                         "Invalid bucketlist id 'a'")
+        self.url = url_for("bucketlists.bucketlists", ids="1,\u00b2")
+        self.assertEqual(self.get_data().status_code, 400)
+        self.app.config['MULTI_GET_MAX_IDS'] = 2
+        self.url = url_for("bucketlists.bucketlists", ids="1,2,3")
+        self.assertEqual(self.get_data().status_code, 400)
+
+
+class BucketlistsEmbeddedItemsTestCase(APIGetTestCase):
+
+    def test_get_bucketlists_with_items(self):
+        """
+        Test each bucketlist of the page has its first items_limit items
+        """
+        self.url = url_for("bucketlists.bucketlists", include="items",
+                           items_limit=1, limit=1)
+        data = json.loads(self.get_data().data)
+        self.assertEqual(data["data"][0], [
+            serializer.details(self.bucketlist, [self.bucketlist_item])])
+        self.assertIn("include=items", data["next_page"])
+        self.assertIn("items_limit=1", data["next_page"])
+        self.url = data["next_page"]
+        data = json.loads(self.get_data().data)
+        self.assertEqual(data["data"][0], [
+            serializer.details(self.bucketlist2, [])])
+
+    def test_get_bucketlists_with_items_query_count_is_constant(self):
+        """
+        Test the items of the whole page are fetched with one query
+        """
+        for index in range(10):
+            bucketlist = Bucketlist(description="List {}".format(index),
+                                    user=self.user1)
+            for item in range(3):
+                bucketlist.items.append(BucketlistItem(
+                    description="Item {}".format(item)))
+            self.db.session.add(bucketlist)
+        self.db.session.commit()
+
+        self.url = url_for("bucketlists.bucketlists", limit=12)
+        with self.count_queries() as without_items:
+            self.get_data()
+        self.url = url_for("bucketlists.bucketlists", limit=12,
+                           include="items", items_limit=2)
+        with self.count_queries() as with_items:
+            data = json.loads(self.get_data().data)["data"][0]
+        self.assertEqual(len(with_items), len(without_items) + 1)
+        self.assertEqual([len(row["items"]) for row in data],
+                         [2, 0] + [2] * 10)
+
+    def test_get_bucketlists_with_items_after_write(self):
+        """
+        Test the embedded items follow item writes
+        """
+        self.url = url_for("bucketlists.bucketlists", include="items")
+        self.get_data()
+        BucketlistItem(description="Added").create_bucketlist_item(2)
+        data = json.loads(self.get_data().data)["data"][0]
+        self.assertEqual(data[1]["items"][0]["description"], "Added")
+
+    def test_get_bucketlists_with_unknown_include(self):
+        self.url = url_for("bucketlists.bucketlists", include="tags")
+        response = self.get_data()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)["message"],
+                         "Unknown include 'tags'")
+
+
+class AdmissionTestCase(APIGetTestCase):
+
+    def setUp(self):
+        super(AdmissionTestCase, self).setUp()
+        self.url = url_for('bucketlists.bucketlists')
+
+    def configure(self, **config):
+        self.app.config.update(config)
+        admission.init_app(self.app)
+
+    def test_reads_rate_limited_per_user(self):
+        """
+        Test reads over the budget get 429, without using up the writes or
+        other users' budgets
+        """
+        self.configure(RATE_LIMIT_READS=0.5, RATE_LIMIT_READ_BURST=2)
+        self.assertEqual(self.get_data().status_code, 200)
+        self.assertEqual(self.get_data().status_code, 200)
+        response = self.get_data()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '2')
+        self.assertEqual(json.loads(response.data)['message'],
+                         "Too many requests. Try again later")
+
+        response = self.client.post(self.url, data=json.dumps(
+            {'description': 'Written'}), headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(url_for('auth.login'), data=json.dumps(
+            {"username": "paul", "password": "12345678"}))
+        self.token = json.loads(response.data)["token"]
+        self.assertEqual(self.get_data().status_code, 200)
+
+    def test_anonymous_clients_rate_limited_per_forwarded_address(self):
+        """
+        Test clients without a token behind a trusted proxy each get their
+        own budget
+        """
+        with mock.patch.multiple(TestingConfig, TRUSTED_PROXIES=1,
+                                 RATE_LIMIT_WRITES=0.5,
+                                 RATE_LIMIT_WRITE_BURST=1):
+            client = create_app('test').test_client()
+
+        def login(address):
+            return client.post(url_for('auth.login'), data=json.dumps(
+                {"username": "paul", "password": "12345678"}), headers={
+                'X-Forwarded-For': address}).status_code
+
+        self.assertEqual(login('203.0.113.1'), 200)
+        self.assertEqual(login('203.0.113.1'), 429)
+        self.assertEqual(login('203.0.113.2'), 200)
+
+    def test_requests_over_concurrency_cap_shed(self):
+        """
+        Test requests get 503 while every slot is taken, and release theirs
+        """
+        self.configure(MAX_CONCURRENT_REQUESTS=1, ADMISSION_QUEUE_TIMEOUT=0)
+        self.assertEqual(self.get_data().status_code, 200)
+        self.assertEqual(self.get_data().status_code, 200)
+        limiters, slots = self.app.extensions['admission']
+        slots.acquire()
+        response = self.get_data()
+        slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(self.get_data().status_code, 200)
+
+    def test_page_limit_clamped(self):
+        """
+        Test pages hold at most MAX_PAGE_LIMIT items
+        """
+        self.configure(MAX_PAGE_LIMIT=1)
+        self.url = url_for('bucketlists.bucketlists', limit=100000)
+        data = json.loads(self.get_data().data)
+        self.assertEqual(len(data['data'][0]), 1)
+        self.assertIn('limit=1', data['next_page'])
+
+
+class BucketlistsExportTestCase(APIGetTestCase):
+
+    # GET /bucketlists/export #
+    # ----------------------- #
+
+    def test_export_bucketlists(self):
+        """
+        Test it streams one line per bucketlist in the details layout
+        """
+        Bucketlist(description="Paul's", user=self.user2).create_bucketlist()
+        self.url = url_for('bucketlists.bucketlistsexport')
+        response = self.get_data()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = response.get_data(as_text=True).splitlines()
+        with self.app.test_request_context():
+            expected = [
+                json.dumps(bucketlist_details_schema.dump(bucketlist).data,
+                           sort_keys=False)
+                for bucketlist in Bucketlist.query.filter_by(
+                    user_id=self.user1.id).order_by(Bucketlist.id)]
+        self.assertEqual(lines, expected)
+        self.assertEqual([len(json.loads(line)['items']) for line in lines],
+                         [2, 0])
+
+
+class BucketlistsImportTestCase(APIPostTestCase):
+
+    # POST /bucketlists/import #
+    # ------------------------ #
+
+    def import_data(self, data):
+        self.headers.update({"Authorization": "JWT " + self.jwt_token})
+        response = self.client.post(url_for('bucketlists.bucketlistsimport'),
+                                    data=data, headers=self.headers)
+        return response.status_code, json.loads(response.data)
+
+    def test_import_export(self):
+        """
+        Test the lines of the export can be imported as they are
+        """
+        item = BucketlistItem.get_bucketlist_item(1)
+        item.done = True
+        item.update_bucketlist_item()
+        self.headers.update({"Authorization": "JWT " + self.jwt_token})
+        export = self.client.get(url_for('bucketlists.bucketlistsexport'),
+                                 headers=self.headers).data
+        status, data = self.import_data(export)
+        self.assertEqual(status, 201)
+        self.assertEqual(data, {'bucketlists': 2, 'items': 2, 'chunks': 1,
+                                'field_errors': {}})
+        imported = Bucketlist.query.filter(Bucketlist.id > 2).order_by(
+            Bucketlist.id).all()
+        self.assertEqual(
+            [(bucketlist.description, bucketlist.item_count,
+              bucketlist.done_count) for bucketlist in imported],
+            [('My Bucketlist', 2, 1), ('My Bucketlist 2', 0, 0)])
+        self.assertEqual(Bucketlist.check_counters(), [])
+
+        response = self.client.get(
+            url_for('bucketlists.bucketlistdetails', id=imported[0].id,
+                    q="item"), headers=self.headers)
+        self.assertEqual(len(json.loads(
+            response.data)['data']['bucketlist']['items']), 2)
+
+    def test_import_reports_errors(self):
+        """
+        Test invalid records are reported by index and the others imported
+        in chunks
+        """
+        self.app.config['IMPORT_CHUNK_SIZE'] = 2
+        status, data = self.import_data(json.dumps([
+            {"description": "Travel", "items": [{"description": "Cairo"},
+                                                {"done": True}]},
+            {"description": ""},
+            "Dive",
+            {"description": "Climb", "items": [{"description": "Kili"}]}]))
+        self.assertEqual(status, 201)
+        self.assertEqual(data['field_errors'], {
+            '0': {'items': {'1': {'description': [
+                'Description is required.']}}},
+            '1': {'description': ['Description cannot be empty.']},
+            '2': {'_schema': ['Expected a bucketlist object.']}})
+        self.assertEqual((data['bucketlists'], data['items'],
+                          data['chunks']), (2, 2, 2))
+
+    def test_import_malformed(self):
+        """
+        Test it returns 400 Bad Request error on malformed JSON, after
+        importing the records before it
+        """
+        status, data = self.import_data(
+            '{"description": "Travel"}\n{"description": ')
+        self.assertEqual(status, 400)
+        self.assertEqual(data['bucketlists'], 1)
+        self.assertIn('Invalid JSON in record 1', data['message'])
@@ -0,0 +1,164 @@
+"""
+Compare the throughput of the WSGI server (gunicorn threads) and the ASGI
+one (api.asgi.AsyncAPI under a uvicorn worker) as the number of concurrent
+connections grows. Both run one worker process against the same database.
+
+    python -m benchmarks.asgi
+    python -m benchmarks.asgi --database-url postgresql://localhost/scratch
+
+The database given with --database-url is emptied first. SQLite answers
+from the page cache, so it shows the cost of each path rather than the
+waits an asyncio driver saves on a remote PostgreSQL server.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from flask import url_for
+
+from benchmarks.utils import create_benchmark_app, seed_user, auth_headers
+
+CONCURRENCY = (1, 8, 32, 128)
+DURATION = 5
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database_uri, port, asgi, threads):
+    # Workers are not recycled, and the single user not rate limited,
+    # during the measurements. Neither server answers from the response
+    # cache, which AsyncAPI does not use.
+    env = dict(os.environ, BUCKETLIST_ENV='prod', DATABASE_URL=database_uri,
+               WHOOSH_BASE=tempfile.mkdtemp(prefix='bucketlist-whoosh-'),
+               SERVER_MAX_REQUESTS='0', RATE_LIMIT_READS='0',
+               RESPONSE_CACHE_BACKEND='')
+    command = [sys.executable, 'manage.py', 'serve', '--host', '127.0.0.1',
+               '--port', str(port), '--workers', '1', '--threads',
+               str(threads)]
+    if asgi:
+        command.append('--asgi')
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("The server did not start")
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    length, close = 0, False
+    for line in head.decode('latin-1').split('\r\n')[1:]:
+        name, _, value = line.partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection' and value.strip().lower() == 'close':
+            close = True
+    await reader.readexactly(length)
+    return int(head.split(b' ', 2)[1]), close
+
+
+async def client(port, request, deadline, latencies, errors):
+    """
+    Make requests on a keep-alive connection until the deadline
+    """
+    loop = asyncio.get_event_loop()
+    reader = writer = None
+    while loop.time() < deadline:
+        if writer is None:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        start = time.perf_counter()
+        writer.write(request)
+        try:
+            status, close = await read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            errors.append(None)
+            writer.close()
+            writer = None
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+        if status != 200:
+            errors.append(status)
+        if close:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+def load(port, request, concurrency, duration):
+    """
+    Keep concurrency connections busy for duration seconds
+    :return: Requests per second, p50 and p99 latency in milliseconds and
+    the number of failed requests
+    :rtype: tuple
+    """
+    loop = asyncio.new_event_loop()
+    latencies, errors = [], []
+    deadline = loop.time() + duration
+    loop.run_until_complete(asyncio.gather(*[
+        client(port, request, deadline, latencies, errors)
+        for _ in range(concurrency)], loop=loop))
+    loop.close()
+    latencies.sort()
+    return (len(latencies) / duration, statistics.median(latencies),
+            latencies[int(len(latencies) * 0.99) - 1], len(errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url',
+                        help='throwaway database to use instead of SQLite')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='threads of the WSGI worker, also used by the '
+                             'ASGI one for the requests it passes to the '
+                             'Flask app (default: %(default)s)')
+    parser.add_argument('--duration', type=int, default=DURATION,
+                        help='seconds per measurement (default: %(default)s)')
+    args = parser.parse_args()
+
+    app = create_benchmark_app(args.database_url)
+    database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+    user = seed_user('benchmark', bucketlists=100, items_per_bucketlist=10)
+    with app.test_request_context():
+        path = url_for('bucketlists.bucketlists', limit=10)
+    headers = auth_headers(app, user)
+    request = "GET {} HTTP/1.1\r\nHost: localhost\r\n{}\r\n".format(
+        path, ''.join('{}: {}\r\n'.format(name, value)
+                      for name, value in headers.items())).encode()
+
+    print("{:>6} {:>12} {:>10} {:>10} {:>10} {:>7}".format(
+        "server", "connections", "req/s", "p50 ms", "p99 ms", "errors"))
+    for name, asgi in (('wsgi', False), ('asgi', True)):
+        port = free_port()
+        server = start_server(database_uri, port, asgi, args.threads)
+        try:
+            load(port, request, 4, 1)
+            for concurrency in CONCURRENCY:
+                rate, p50, p99, errors = load(port, request, concurrency,
+                                              args.duration)
+                print("{:>6} {:>12} {:>10.0f} {:>10.2f} {:>10.2f} "
+                      "{:>7}".format(name, concurrency, rate, p50, p99,
+                                     errors))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Report the bytes saved by compressing a bucketlist detail response against
+the time spent compressing it, for each content coding and level.
+
+    python -m benchmarks.compression
+"""
+from flask import url_for
+
+from api.compression import ENCODINGS, compress
+from benchmarks.utils import (create_benchmark_app, seed_user, auth_headers,
+                              time_call)
+
+ITEMS = (10, 100, 500)
+LEVELS = (1, 6, 9)
+
+
+def main():
+    app = create_benchmark_app()
+    user = seed_user('benchmark', bucketlists=1,
+                     items_per_bucketlist=max(ITEMS))
+    headers = auth_headers(app, user)
+    client = app.test_client()
+
+    print("{:>6} {:>8} {:>6} {:>10} {:>10} {:>8} {:>10}".format(
+        "items", "coding", "level", "raw (B)", "sent (B)", "saved",
+        "cpu (ms)"))
+    for items in ITEMS:
+        with app.test_request_context():
+            url = url_for('bucketlists.bucketlistdetails', id=1,
+                          limit=items)
+        data = client.get(url, headers=dict(
+            headers, **{'Accept-Encoding': 'identity'})).data
+        for encoding in ENCODINGS:
+            for level in LEVELS:
+                sent = len(compress(data, encoding, level))
+                cpu = time_call(lambda: compress(data, encoding, level))
+                print("{:>6} {:>8} {:>6} {:>10} {:>10} {:>7.0%} {:>10.3f}"
+                      .format(items, encoding, level, len(data), sent,
+                              1 - sent / len(data), cpu))
+
+
+if __name__ == '__main__':
+    main()
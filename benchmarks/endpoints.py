@@ -0,0 +1,329 @@
+"""
+Time every API route on SQLite databases seeded at several scales, and
+report the p50, p95 and p99 latency and the queries made per request.
+The results are written as JSON, and the results of an earlier run can be
+given to compare against, e.g. between commits:
+
+    python -m benchmarks.endpoints --scales 1k 100k 1m --output new.json
+    python -m benchmarks.endpoints --baseline old.json
+
+The list response cache is disabled unless --cache is given, so that the
+database work of the list endpoints is measured.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+from flask import url_for
+from sqlalchemy import event
+
+from api import db, search
+from api.cache import TTLCache
+from api.models import Bucketlist, BucketlistItem
+from benchmarks.utils import create_benchmark_app, seed_user, auth_headers
+
+# Total rows of the user, bucketlist and bucketlist_item tables
+SCALES = OrderedDict([('1k', 1000), ('100k', 100000), ('1m', 1000000)])
+# The rows are owned by users of ROWS_PER_USER rows each: their user row,
+# USER_BUCKETLISTS bucketlists and USER_ITEMS items in each, 1 + 9 + 990.
+# The user the requests are made as owns BUCKETLISTS bucketlists of ITEMS
+# items each besides.
+ROWS_PER_USER = 1000
+USER_BUCKETLISTS = 9
+USER_ITEMS = (ROWS_PER_USER - 1 - USER_BUCKETLISTS) // USER_BUCKETLISTS
+BUCKETLISTS = 100
+ITEMS = 10
+# Blueprints of the api/v1 views whose routes must all be benchmarked
+BLUEPRINTS = ('main', 'auth', 'bucketlists')
+
+Case = namedtuple('Case', 'name method endpoint prepare')
+
+
+def percentile(durations, percent):
+    """
+    Nearest rank percentile of sorted durations
+    """
+    rank = int(math.ceil(percent / 100.0 * len(durations)))
+    return durations[max(rank, 1) - 1]
+
+
+def seed(scale):
+    """
+    Fill the database with about scale rows
+    :return: The user the requests are made as
+    :rtype: User
+    """
+    for number in range(max(scale // ROWS_PER_USER, 1)):
+        seed_user('user{}'.format(number), bucketlists=USER_BUCKETLISTS,
+                  items_per_bucketlist=USER_ITEMS)
+    user = seed_user('benchmark', bucketlists=BUCKETLISTS,
+                     items_per_bucketlist=ITEMS)
+    # Only the benchmark user's rows are indexed for the searches
+    search.reindex(Bucketlist, Bucketlist.query.filter_by(user_id=user.id))
+    search.reindex(BucketlistItem, BucketlistItem.query.join(
+        Bucketlist).filter(Bucketlist.user_id == user.id))
+    return user
+
+
+def cases(app, user):
+    """
+    The requests to time. prepare is called before each timed request,
+    and returns its url, JSON body and the headers to send instead of those
+    of the benchmark user's token, or None.
+    :rtype: list
+    """
+    bucketlist = Bucketlist.query.filter_by(user_id=user.id).order_by(
+        Bucketlist.id).first()
+    item_ids = [item.id for item in BucketlistItem.query.filter_by(
+        bucketlist_id=bucketlist.id)]
+    numbers = itertools.count()
+
+    def url(endpoint, **values):
+        with app.test_request_context():
+            return url_for(endpoint, **values)
+
+    def request(endpoint, body=None, **values):
+        return lambda: (url(endpoint, **values), body, None)
+
+    def new_token(endpoint):
+        # Each request revokes the token it is made with
+        return lambda: (url(endpoint), None, auth_headers(app, user))
+
+    def new_bucketlist():
+        row = Bucketlist(description='Deleted', user_id=user.id)
+        db.session.add(row)
+        db.session.commit()
+        return url('bucketlists.bucketlistdetails', id=row.id), None, None
+
+    def new_item():
+        row = BucketlistItem(description='Deleted',
+                             bucketlist_id=bucketlist.id)
+        db.session.add(row)
+        db.session.commit()
+        return url('bucketlists.bucketlistitemdetails', id=bucketlist.id,
+                   item_id=row.id), None, None
+
+    def new_user():
+        number = next(numbers)
+        return url('auth.register'), {
+            'username': 'new{}'.format(number),
+            'email': 'new{}@example.com'.format(number),
+            'password': 'benchmark'}, None
+
+    details = dict(id=bucketlist.id)
+    item = dict(id=bucketlist.id, item_id=item_ids[0])
+    return [
+        Case('index', 'GET', 'main.index', request('main.index')),
+        Case('register', 'POST', 'auth.register', new_user),
+        Case('login', 'POST', 'auth.login', request(
+            'auth.login', {'username': 'benchmark',
+                           'password': 'benchmark'})),
+        Case('list', 'GET', 'bucketlists.bucketlists',
+             request('bucketlists.bucketlists')),
+        Case('list last page', 'GET', 'bucketlists.bucketlists',
+             request('bucketlists.bucketlists', page=BUCKETLISTS // 10)),
+        Case('list with items', 'GET', 'bucketlists.bucketlists',
+             request('bucketlists.bucketlists', include='items')),
+        Case('search', 'GET', 'bucketlists.bucketlists',
+             request('bucketlists.bucketlists', q='bucketlist 1')),
+        Case('create bucketlist', 'POST', 'bucketlists.bucketlists',
+             request('bucketlists.bucketlists', {'description': 'Created'})),
+        Case('export', 'GET', 'bucketlists.bucketlistsexport',
+             request('bucketlists.bucketlistsexport')),
+        Case('import', 'POST', 'bucketlists.bucketlistsimport',
+             request('bucketlists.bucketlistsimport', [
+                 {'description': 'Imported', 'items': [
+                     {'description': 'Item {}'.format(number)}
+                     for number in range(ITEMS)]}])),
+        Case('details', 'GET', 'bucketlists.bucketlistdetails',
+             request('bucketlists.bucketlistdetails', **details)),
+        Case('update bucketlist', 'PUT', 'bucketlists.bucketlistdetails',
+             request('bucketlists.bucketlistdetails',
+                     {'description': 'Updated'}, **details)),
+        Case('create item', 'POST', 'bucketlists.bucketlistdetails',
+             request('bucketlists.bucketlistdetails',
+                     {'description': 'Created'}, **details)),
+        Case('delete bucketlist', 'DELETE', 'bucketlists.bucketlistdetails',
+             new_bucketlist),
+        Case('item', 'GET', 'bucketlists.bucketlistitemdetails',
+             request('bucketlists.bucketlistitemdetails', **item)),
+        Case('update item', 'PUT', 'bucketlists.bucketlistitemdetails',
+             request('bucketlists.bucketlistitemdetails',
+                     {'description': 'Updated', 'done': True}, **item)),
+        Case('delete item', 'DELETE', 'bucketlists.bucketlistitemdetails',
+             new_item),
+        Case('create items', 'POST', 'bucketlists.bucketlistitemsbatch',
+             request('bucketlists.bucketlistitemsbatch', [
+                 {'description': 'Item {}'.format(number)}
+                 for number in range(ITEMS)], **details)),
+        Case('update items', 'PUT', 'bucketlists.bucketlistitemsbatch',
+             request('bucketlists.bucketlistitemsbatch', {
+                 'ids': item_ids, 'values': {'done': False}}, **details)),
+        Case('logout', 'POST', 'auth.logout', new_token('auth.logout')),
+        # Last, as it also revokes the token the other cases are made with
+        Case('revoke tokens', 'POST', 'auth.revoketokens',
+             new_token('auth.revoketokens')),
+    ]
+
+
+def missing_routes(app, benchmarked):
+    """
+    Return the (endpoint, method) pairs of the api/v1 routes no case covers
+    """
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint.split('.')[0] not in BLUEPRINTS:
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if (rule.endpoint, method) not in benchmarked:
+                missing.append((rule.endpoint, method))
+    return missing
+
+
+def run_case(app, case, headers, repeat):
+    """
+    Make the case's request repeat times
+    :return: Sorted durations in milliseconds, queries per request and the
+    status codes
+    :rtype: tuple
+    """
+    client = app.test_client()
+    statements = []
+
+    def count(*args):
+        statements.append(None)
+
+    durations, queries, statuses = [], [], set()
+    engine = db.get_engine(app)
+    for _ in range(repeat):
+        url, body, case_headers = case.prepare()
+        data = None if body is None else json.dumps(body)
+        # Requests do not share the objects loaded by the previous ones
+        db.session.remove()
+        del statements[:]
+        event.listen(engine, 'before_cursor_execute', count)
+        start = time.perf_counter()
+        response = client.open(url, method=case.method, data=data,
+                               headers=case_headers or headers)
+        response.get_data()
+        durations.append((time.perf_counter() - start) * 1000)
+        event.remove(engine, 'before_cursor_execute', count)
+        queries.append(len(statements))
+        statuses.add(response.status_code)
+    return sorted(durations), sorted(queries), sorted(statuses)
+
+
+def benchmark(scale_name, repeat, cache):
+    app = create_benchmark_app()
+    if cache:
+        app.extensions['response_cache'] = TTLCache(
+            app.config['RESPONSE_CACHE_SIZE'],
+            app.config['RESPONSE_CACHE_TTL'])
+    path = app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):]
+    start = time.perf_counter()
+    user = seed(SCALES[scale_name])
+    print("Seeded {} rows in {:.1f}s".format(
+        scale_name, time.perf_counter() - start))
+    headers = auth_headers(app, user)
+    all_cases = cases(app, user)
+    for endpoint, method in missing_routes(
+            app, set((case.endpoint, case.method) for case in all_cases)):
+        print("Not benchmarked: {} {}".format(method, endpoint))
+
+    results = []
+    for case in all_cases:
+        durations, queries, statuses = run_case(app, case, headers, repeat)
+        results.append(OrderedDict([
+            ('scale', scale_name),
+            ('case', case.name),
+            ('method', case.method),
+            ('endpoint', case.endpoint),
+            ('requests', repeat),
+            ('p50_ms', round(percentile(durations, 50), 3)),
+            ('p95_ms', round(percentile(durations, 95), 3)),
+            ('p99_ms', round(percentile(durations, 99), 3)),
+            ('queries', percentile(queries, 50)),
+            ('max_queries', queries[-1]),
+            ('statuses', statuses),
+        ]))
+    db.session.remove()
+    db.get_engine(app).dispose()
+    os.remove(path)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    previous = {}
+    if baseline:
+        previous = dict(((result['scale'], result['case']), result)
+                        for result in baseline['results'])
+    print("{:>5} {:<18} {:>9} {:>9} {:>9} {:>8} {:>8}".format(
+        "scale", "case", "p50 ms", "p95 ms", "p99 ms", "queries",
+        "p50 diff" if baseline else ""))
+    for result in results:
+        change = ""
+        before = previous.get((result['scale'], result['case']))
+        if before and before['p50_ms']:
+            change = "{:+.0%}".format(
+                result['p50_ms'] / before['p50_ms'] - 1)
+        print("{:>5} {:<18} {:>9.2f} {:>9.2f} {:>9.2f} {:>8} {:>8}".format(
+            result['scale'], result['case'], result['p50_ms'],
+            result['p95_ms'], result['p99_ms'], result['queries'], change))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES),
+                        default=list(SCALES))
+    parser.add_argument('--repeat', type=int, default=200,
+                        help='requests per case (default: %(default)s)')
+    parser.add_argument('--output', default='benchmark-results.json',
+                        help='file to write the results to '
+                             '(default: %(default)s)')
+    parser.add_argument('--baseline',
+                        help='results of an earlier run to compare with')
+    parser.add_argument('--cache', action='store_true',
+                        help='enable the list response cache')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    results = []
+    for scale_name in args.scales:
+        results.extend(benchmark(scale_name, args.repeat, args.cache))
+    print_results(results, baseline)
+
+    with open(args.output, 'w') as output:
+        json.dump(OrderedDict([
+            ('commit', git_commit()),
+            ('date', datetime.utcnow().isoformat()),
+            ('python', platform.python_version()),
+            ('sqlite', sqlite3.sqlite_version),
+            ('repeat', args.repeat),
+            ('cache', args.cache),
+            ('results', results),
+        ]), output, indent=2)
+    print("Wrote {}".format(args.output))
+
+
+if __name__ == '__main__':
+    main()
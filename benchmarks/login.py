@@ -0,0 +1,62 @@
+"""
+Measure login throughput at several bcrypt work factors, with passwords
+checked in the request thread and in the process pool.
+
+    python -m benchmarks.login
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import json, url_for
+
+from api import bcrypt, db
+from api.models import User
+from benchmarks.utils import create_benchmark_app
+
+ROUNDS = (4, 8, 10, 12)
+CLIENTS = 8
+LOGINS = 48
+
+
+def logins_per_second(app, rounds, pool_size):
+    app.config.update(BCRYPT_LOG_ROUNDS=rounds, BCRYPT_POOL_SIZE=pool_size,
+                      BCRYPT_MAX_PENDING=CLIENTS)
+    bcrypt.init_app(app)
+    user = User.query.filter_by(username='benchmark').first()
+    user.password = 'benchmark'
+    db.session.commit()
+    with app.test_request_context():
+        url = url_for('auth.login')
+    body = json.dumps({'username': 'benchmark', 'password': 'benchmark'})
+
+    def login(_):
+        with app.app_context():
+            response = app.test_client().post(url, data=body)
+            assert response.status_code == 200, response.data
+
+    with ThreadPoolExecutor(CLIENTS) as clients:
+        start = time.perf_counter()
+        list(clients.map(login, range(LOGINS)))
+        return LOGINS / (time.perf_counter() - start)
+
+
+def main():
+    app = create_benchmark_app()
+    db.session.add(User(username='benchmark', email='benchmark@example.com',
+                        password='benchmark'))
+    db.session.commit()
+
+    pool_size = os.cpu_count()
+    print("{} concurrent clients, {} logins".format(CLIENTS, LOGINS))
+    print("{:>6} {:>16} {:>16}".format(
+        "rounds", "inline (login/s)", "pool of {} (login/s)".format(
+            pool_size)))
+    for rounds in ROUNDS:
+        inline = logins_per_second(app, rounds, 0)
+        pooled = logins_per_second(app, rounds, pool_size)
+        print("{:>6} {:>16.1f} {:>16.1f}".format(rounds, inline, pooled))
+
+
+if __name__ == '__main__':
+    main()
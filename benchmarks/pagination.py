@@ -0,0 +1,40 @@
+"""
+Compare OFFSET pagination against cursor pagination on the bucketlist list
+endpoint, at page 1 and page 10,000.
+
+    python -m benchmarks.pagination
+"""
+from flask import url_for
+
+from api.models import Bucketlist
+from api.pagination import encode_cursor
+from benchmarks.utils import (create_benchmark_app, seed_user, auth_headers,
+                              time_call)
+
+LIMIT = 10
+PAGES = (1, 10, 100, 1000, 10000)
+
+
+def main():
+    app = create_benchmark_app()
+    user = seed_user('benchmark', bucketlists=max(PAGES) * LIMIT + LIMIT)
+    headers = auth_headers(app, user)
+    client = app.test_client()
+    first_id = Bucketlist.query.order_by(Bucketlist.id).first().id
+
+    def get(**args):
+        with app.test_request_context():
+            url = url_for('bucketlists.bucketlists', limit=LIMIT, **args)
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.data
+
+    print("{:>8} {:>12} {:>12}".format("page", "offset (ms)", "cursor (ms)"))
+    for page in PAGES:
+        offset = time_call(lambda: get(page=page))
+        cursor = encode_cursor(first_id + (page - 1) * LIMIT - 1)
+        keyset = time_call(lambda: get(cursor=cursor))
+        print("{:>8} {:>12.2f} {:>12.2f}".format(page, offset, keyset))
+
+
+if __name__ == '__main__':
+    main()
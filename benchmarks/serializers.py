@@ -0,0 +1,40 @@
+"""
+Compare the rows per second of the marshmallow schemas against the fast
+serializer used by the list and detail endpoints.
+
+    python -m benchmarks.serializers
+"""
+from api.models import Bucketlist, BucketlistItem
+from api.v1.bucketlists.views import (serializer, bucketlists_schema,
+                                      bucketlist_items_schema)
+from benchmarks.utils import create_benchmark_app, seed_user, time_call
+
+ROWS = 1000
+
+
+def main():
+    app = create_benchmark_app()
+    seed_user('benchmark', bucketlists=ROWS, items_per_bucketlist=1)
+    bucketlists = Bucketlist.query.order_by(Bucketlist.id).all()
+    items = BucketlistItem.query.order_by(BucketlistItem.id).all()
+    for bucketlist in bucketlists:
+        bucketlist.user
+
+    cases = [
+        ('bucketlists', lambda: bucketlists_schema.dump(bucketlists),
+         lambda: serializer.bucketlists(bucketlists)),
+        ('items', lambda: bucketlist_items_schema.dump(items),
+         lambda: serializer.items(items)),
+    ]
+    print("{:>12} {:>16} {:>16}".format(
+        "rows", "schema (rows/s)", "fast (rows/s)"))
+    with app.test_request_context():
+        for name, schema_dump, fast_dump in cases:
+            schema = time_call(schema_dump, repeat=5)
+            fast = time_call(fast_dump, repeat=5)
+            print("{:>12} {:>16.0f} {:>16.0f}".format(
+                name, ROWS / schema * 1000, ROWS / fast * 1000))
+
+
+if __name__ == '__main__':
+    main()
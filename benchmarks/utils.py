@@ -0,0 +1,85 @@
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from api import bcrypt, create_app, db
+from api.models import User, Bucketlist, BucketlistItem
+
+
+def create_benchmark_app(database_uri=None):
+    """
+    Create the application on a throwaway SQLite database
+    :param database_uri: Database to use instead of a temporary SQLite file
+    :type database_uri: str
+    The list response cache is disabled, so repeated requests are timed
+    against the database rather than the cache.
+    :return: The application, with its context pushed
+    :rtype: flask.Flask
+    """
+    if not database_uri:
+        handle, path = tempfile.mkstemp(suffix='.db', prefix='bucketlist-')
+        os.close(handle)
+        database_uri = 'sqlite:///' + path
+    app = create_app('test')
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.extensions['response_cache'] = None
+    app.app_context().push()
+    db.drop_all()
+    db.create_all()
+    return app
+
+
+def insert_rows(table, rows, chunk_size=5000):
+    """
+    Insert rows into table with multi-row INSERT statements
+    """
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(table.insert(), rows[start:start + chunk_size])
+    db.session.commit()
+
+
+def seed_user(username, bucketlists=0, items_per_bucketlist=0,
+              password='benchmark'):
+    """
+    Create a user owning the given number of bucketlists and items
+    :return: The created user
+    :rtype: User
+    """
+    user = User(username=username, email=username + '@example.com')
+    user._password = bcrypt.generate_password_hash(password).decode()
+    db.session.add(user)
+    db.session.commit()
+
+    now = datetime.utcnow()
+    first_id = (db.session.query(db.func.max(Bucketlist.id)).scalar() or 0) + 1
+    insert_rows(Bucketlist.__table__, [
+        {'id': first_id + index, 'date': now, 'user_id': user.id,
+         'description': 'Bucketlist {}'.format(index),
+         'item_count': items_per_bucketlist, 'done_count': 0}
+        for index in range(bucketlists)])
+    insert_rows(BucketlistItem.__table__, [
+        {'bucketlist_id': first_id + index, 'date': now, 'done': False,
+         'description': 'Item {}'.format(item)}
+        for index in range(bucketlists)
+        for item in range(items_per_bucketlist)])
+    return user
+
+
+def auth_headers(app, user):
+    token = user.generate_auth_token(app.config.get('SECRET_KEY'))
+    return {"Content-Type": "application/json",
+            "Authorization": "JWT " + token}
+
+
+def time_call(func, repeat=20):
+    """
+    Call func repeat times and return the median duration in milliseconds
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
@@ -4,8 +4,12 @@ from flask_migrate import Migrate, MigrateCommand
 from flask_script import Manager, prompt_bool
 from flask_script import Server
 
-from api import create_app, db
+from api import create_app, db, search
+from api.explain import (explain_endpoints, derived_tables,
+                         is_sequential_scan)
 from api.models import User, Bucketlist, BucketlistItem
+from api.seed import RateReport, seed as seed_rows
+from api.server import Serve
 
 app = create_app(os.getenv('BUCKETLIST_ENV') or 'dev')
 manager = Manager(app)
@@ -13,6 +17,7 @@ migrate = Migrate(app, db)
 
 manager.add_command('db', MigrateCommand)
 manager.add_command('runserver', Server(host=app.config.get('HOST')))
+manager.add_command('serve', Serve(host=app.config.get('HOST')))
 
 
 @manager.command
@@ -38,6 +43,94 @@ def create_tables():
     print("Created model tables")
 
 
+@manager.option('-u', '--users', type=int, default=1000,
+                help='number of users (default: 1000)')
+@manager.option('-b', '--bucketlists', default='0-10',
+                help='bucketlists per user, a count or a range such as 0-10')
+@manager.option('-i', '--items', default='0-20',
+                help='items per bucketlist, a count or a range such as 0-20')
+@manager.option('-d', '--done', dest='done_ratio', type=float, default=0.3,
+                help='share of the items that are done (default: 0.3)')
+@manager.option('-p', '--password', default='password',
+                help='password of every user (default: password)')
+@manager.option('--batch-size', type=int, default=1000,
+                help='users inserted per transaction (default: 1000)')
+@manager.option('--seed', dest='random_seed', type=int,
+                help='random seed, to generate the same counts again')
+def seed(users, bucketlists, items, done_ratio, password, batch_size,
+         random_seed):
+    """
+    Generate users, bucketlists and items in bulk for load tests
+    """
+    report = RateReport()
+    counts = seed_rows(users, bucketlists, items, done_ratio, password,
+                       batch_size, random_seed, report=report)
+    rows = sum(counts)
+    print("Inserted {} rows at {:.0f} rows/s. Run reindex to make them "
+          "searchable".format(rows, report.rows_per_second(rows)))
+
+
+@manager.command
+def check_counters(repair=False):
+    """
+    Check the bucketlist item and done counters against the item rows
+    """
+    drifted = Bucketlist.check_counters(repair=repair)
+    for bucketlist_id, items, actual_items, done, actual_done in drifted:
+        print("Bucketlist {}: item_count {} (actual {}), done_count {} "
+              "(actual {})".format(bucketlist_id, items, actual_items, done,
+                                   actual_done))
+    if not drifted:
+        print("All bucketlist counters are correct")
+    elif repair:
+        print("Repaired {} bucketlist counters".format(len(drifted)))
+    else:
+        print("{} bucketlist counters have drifted. Run with --repair to "
+              "fix them".format(len(drifted)))
+
+
+@manager.command
+def reindex():
+    """
+    Rebuild the full text search indexes from the database
+    """
+    for model in (Bucketlist, BucketlistItem):
+        count = search.reindex(model, model.query.order_by(model.id))
+        print("Indexed {} {} rows".format(count, model.__tablename__))
+
+
+@manager.command
+def explain(username=None):
+    """
+    Explain the queries of the GET endpoints and of logging in, and flag the
+    sequential scans. Run it against a database seeded with enough rows for
+    the planner to prefer indexes where they exist.
+    """
+    query = db.session.query(User).join(Bucketlist)
+    if username:
+        query = query.filter(User.username == username)
+    # The user with the largest bucketlist
+    row = query.add_entity(Bucketlist).order_by(
+        Bucketlist.item_count.desc()).first()
+    if row is None:
+        print("No user with bucketlists to make the requests as")
+        return
+    user, bucketlist = row
+    item = BucketlistItem.query.filter_by(
+        bucketlist_id=bucketlist.id).order_by(BucketlistItem.id).first()
+    scans = 0
+    for name, statement, plan in explain_endpoints(user, bucketlist, item):
+        print("{}:\n{}".format(name, statement))
+        derived = derived_tables(plan)
+        for step in plan:
+            flagged = is_sequential_scan(step, derived)
+            scans += flagged
+            print("  {}{}".format(step, "  <-- sequential scan" if flagged
+                                  else ""))
+        print("")
+    print("{} sequential scans".format(scans))
+
+
 @manager.command
 def dropdb():
     if prompt_bool("Are you sure you want to lose all your data?"):
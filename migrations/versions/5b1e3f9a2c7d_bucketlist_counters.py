@@ -0,0 +1,36 @@
+"""bucketlist item and done counters
+
+Revision ID: 5b1e3f9a2c7d
+Revises: ebcc92fc4d27
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e3f9a2c7d'
+down_revision = 'ebcc92fc4d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('bucketlist', sa.Column('item_count', sa.Integer(),
+                                          server_default='0', nullable=False))
+    op.add_column('bucketlist', sa.Column('done_count', sa.Integer(),
+                                          server_default='0', nullable=False))
+    # Backfill the counters from the existing items
+    op.execute(
+        "UPDATE bucketlist SET "
+        "item_count = (SELECT count(*) FROM bucketlist_item "
+        "WHERE bucketlist_item.bucketlist_id = bucketlist.id), "
+        "done_count = (SELECT count(*) FROM bucketlist_item "
+        "WHERE bucketlist_item.bucketlist_id = bucketlist.id "
+        "AND bucketlist_item.done)")
+
+
+def downgrade():
+    op.drop_column('bucketlist', 'done_count')
+    op.drop_column('bucketlist', 'item_count')
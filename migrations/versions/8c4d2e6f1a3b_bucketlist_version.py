@@ -0,0 +1,25 @@
+"""bucketlist version
+
+Revision ID: 8c4d2e6f1a3b
+Revises: 5b1e3f9a2c7d
+Create Date: 2026-10-18 14:03:52.407316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4d2e6f1a3b'
+down_revision = '5b1e3f9a2c7d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('bucketlist', sa.Column('version', sa.Integer(),
+                                          server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('bucketlist', 'version')
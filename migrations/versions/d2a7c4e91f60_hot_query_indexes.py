@@ -0,0 +1,31 @@
+"""indexes for the bucketlist and item list queries
+
+Revision ID: d2a7c4e91f60
+Revises: 8c4d2e6f1a3b
+Create Date: 2026-10-18 19:48:10.552831
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a7c4e91f60'
+down_revision = '8c4d2e6f1a3b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # WHERE user_id = :id [AND id > :cursor] ORDER BY id
+    op.create_index('ix_bucketlist_user_id_id', 'bucketlist',
+                    ['user_id', 'id'])
+    # WHERE bucketlist_id = :id [AND id > :cursor] ORDER BY id, and the
+    # item lookups, counts and deletes by bucketlist
+    op.create_index('ix_bucketlist_item_bucketlist_id_id', 'bucketlist_item',
+                    ['bucketlist_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_bucketlist_item_bucketlist_id_id',
+                  table_name='bucketlist_item')
+    op.drop_index('ix_bucketlist_user_id_id', table_name='bucketlist')
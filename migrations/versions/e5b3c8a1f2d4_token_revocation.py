@@ -0,0 +1,43 @@
+"""user_token rows record revoked tokens
+
+Revision ID: e5b3c8a1f2d4
+Revises: d2a7c4e91f60
+Create Date: 2026-10-18 20:12:37.204118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b3c8a1f2d4'
+down_revision = 'd2a7c4e91f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A user may have any number of revocations
+    op.drop_constraint('user_token_user_id_key', 'user_token', type_='unique')
+    op.create_index('ix_user_token_user_id', 'user_token', ['user_id'])
+    op.drop_column('user_token', 'token')
+    op.add_column('user_token', sa.Column('jti', sa.String(length=32),
+                                          nullable=True))
+    op.add_column('user_token', sa.Column('not_before', sa.DateTime(),
+                                          nullable=True))
+    op.add_column('user_token', sa.Column('expires', sa.DateTime(),
+                                          nullable=True))
+    op.create_unique_constraint('user_token_jti_key', 'user_token', ['jti'])
+
+
+def downgrade():
+    op.execute('DELETE FROM user_token')
+    op.drop_constraint('user_token_jti_key', 'user_token', type_='unique')
+    op.drop_column('user_token', 'expires')
+    op.drop_column('user_token', 'not_before')
+    op.drop_column('user_token', 'jti')
+    op.add_column('user_token', sa.Column('token', sa.String(length=300),
+                                          nullable=True))
+    op.drop_index('ix_user_token_user_id', table_name='user_token')
+    op.create_unique_constraint('user_token_user_id_key', 'user_token',
+                                ['user_id'])
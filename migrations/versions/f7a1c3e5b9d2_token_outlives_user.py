@@ -0,0 +1,28 @@
+"""user_token rows outlive their user
+
+Revision ID: f7a1c3e5b9d2
+Revises: e5b3c8a1f2d4
+Create Date: 2026-10-18 21:40:12.518304
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7a1c3e5b9d2'
+down_revision = 'e5b3c8a1f2d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The row revoking a deleted user's tokens is kept until they expire
+    op.drop_constraint('user_token_user_id_fkey', 'user_token',
+                       type_='foreignkey')
+
+
+def downgrade():
+    op.execute('DELETE FROM user_token WHERE user_id NOT IN '
+               '(SELECT id FROM "user")')
+    op.create_foreign_key('user_token_user_id_fkey', 'user_token', 'user',
+                          ['user_id'], ['id'])